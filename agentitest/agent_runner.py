@@ -1,17 +1,36 @@
+from __future__ import annotations
+
 import asyncio
 import os
 import logging
-from typing import Any, Optional, Dict, List
-import json # Added for script generation
-from browser_use import (
-    Agent,
-    BrowserProfile,
-    BrowserSession,
-    ChatGoogle,
-)
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Optional, Dict
+
+from browser_utils import apply_storage_state, capture_storage_state, navigate
+from llm_client import get_llm
+from login_cache import remember_login, restore_login
+from network_archive import NetworkArchiveStore
+from request_interceptor import intercept_requests
+from run_supervisor import RunBudget, RunSupervisor, TimeBudgets
+from trajectory_store import TrajectoryStore, continuation_task, merge_histories, replay_trajectory
+
+# browser_use is imported inside the functions that use it: importing it is
+# slow and this module is loaded by pytest's conftest at collection time. The
+# same goes for the server-only modules (job queue, step streaming, memory
+# sampling) and for telemetry and resource blocking, which pull in
+# prometheus_client and psutil.
+if TYPE_CHECKING:
+    from browser_use import BrowserProfile, BrowserSession, ChatGoogle
+    from login_cache import LoginStateCache
+    from resource_policy import BlockingStats, ResourcePolicy
+    from session_pool import BrowserSessionPool
 
 logger = logging.getLogger(__name__)
 LLM_TEMPERATURE = 0.2
+# Task given to the agent that signs a batch in before its prompts run.
+BATCH_LOGIN_TASK = "Stop as soon as you are signed in and report that the sign-in succeeded."
 
 def extract_done_text_and_status(final_step):
     model_output = getattr(final_step, "model_output", None)
@@ -36,13 +55,107 @@ def extract_done_text_and_status(final_step):
     return text, success
 
 
-async def run_agent_task(full_task: str, llm: ChatGoogle, browser_session: BrowserSession, on_step_end=None) -> str:
+@dataclass
+class AgentRunResult:
+    """Outcome of a single agent run."""
+
+    text: str
+    success: Optional[bool]
+    history: Any = None  # The AgentHistoryList returned by Agent.run()
+
+
+async def execute_agent_task(
+    full_task: str,
+    llm: ChatGoogle,
+    browser_session: BrowserSession,
+    on_step_end=None,
+    start_url: Optional[str] = None,
+) -> AgentRunResult:
+    from telemetry import run_trace
+
+    # Spans for this run (LLM calls, browser actions, steps) go to one JSONL trace.
+    with run_trace():
+        return await _execute_agent_task(full_task, llm, browser_session, on_step_end, start_url)
+
+
+def _create_agent(task: str, llm: Any, browser_session: BrowserSession):
+    from browser_use import Agent
+    from telemetry import instrument_agent
+
+    agent = Agent(task=task, llm=llm, browser_session=browser_session)
+    instrument_agent(agent)
+    return agent
+
+
+async def _execute_agent_task(
+    full_task: str,
+    llm: ChatGoogle,
+    browser_session: BrowserSession,
+    on_step_end=None,
+    start_url: Optional[str] = None,
+) -> AgentRunResult:
     #Initializes and runs the browser agent for a given task.
+    from telemetry import InstrumentedLLM, record_history_spans
+
     logger.info(f"Running task: {full_task}")
-    agent = Agent(task=full_task, llm=llm, browser_session=browser_session)
+    # The run is stopped early when it loops, runs over its step or token budget,
+    # or takes longer than this task usually does (see run_supervisor.py).
+    budget = RunBudget.from_env()
+    time_budgets = TimeBudgets.from_env()
+    time_limit = time_budgets.budget(full_task, start_url)
+    started = time.perf_counter()
+    if not isinstance(llm, InstrumentedLLM):
+        llm = InstrumentedLLM(llm)
+    agent = _create_agent(full_task, llm, browser_session)
+
+    # With AGENT_TRAJECTORY_MODE=replay, a recorded run of the same task is
+    # re-executed without the LLM; the live agent only takes over where it diverges.
+    trajectories = TrajectoryStore.from_env()
+    recorded = None
+    steps_replayed = 0
+    if trajectories is not None and trajectories.replay_enabled:
+        recorded = trajectories.load(full_task, start_url, agent.AgentOutput)
+    if recorded is not None:
+        outcome = await replay_trajectory(agent, recorded, time_budgets.budget(full_task, start_url, replayed=True))
+        if outcome.completed:
+            logger.info(f"Replayed {outcome.steps_replayed} recorded step(s) without the LLM.")
+            text, success = extract_done_text_and_status(recorded.history[-1])
+            if success is True:
+                _record_duration(time_budgets, full_task, start_url, time.perf_counter() - started, replayed=True)
+            return AgentRunResult(
+                text=text or "Agent completed, but no textual result was available.",
+                success=success,
+                history=recorded,
+            )
+        logger.info(f"Replay diverged ({outcome.reason}); continuing with the live agent.")
+        steps_replayed = outcome.steps_replayed
+        agent = _create_agent(continuation_task(full_task, recorded, steps_replayed), llm, browser_session)
 
     # Run the agent and get the history of steps.
-    history = await asyncio.wait_for(agent.run(on_step_end=on_step_end), timeout=180)
+    supervisor = RunSupervisor(budget, on_step_end)
+    remaining = max(time_limit - (time.perf_counter() - started), 1.0)
+    try:
+        history = await asyncio.wait_for(
+            agent.run(max_steps=budget.max_steps, on_step_end=supervisor), timeout=remaining
+        )
+    except asyncio.TimeoutError:
+        record_history_spans(agent.history)
+        reason = f"Exceeded the time budget of {time_limit:.0f}s."
+        logger.warning(f"Stopping the agent: {reason}")
+        history = agent.history
+        if recorded is not None and steps_replayed:
+            history = merge_histories(recorded, steps_replayed, history)
+        return AgentRunResult(text=f"Run stopped: {reason}", success=False, history=history)
+    record_history_spans(history)
+    out_of_steps = not history.is_done() and len(history.history) >= budget.max_steps
+    if recorded is not None and steps_replayed:
+        history = merge_histories(recorded, steps_replayed, history)
+
+    if supervisor.failure_reason is not None:
+        return AgentRunResult(text=f"Run stopped: {supervisor.failure_reason}", success=False, history=history)
+    if out_of_steps:
+        reason = f"Used all {budget.max_steps} steps without finishing."
+        return AgentRunResult(text=f"Run stopped: {reason}", success=False, history=history)
 
     # The 'history' is an iterable AgentHistoryList. We need to get the last step
     # to determine the final outcome of the task.
@@ -51,85 +164,411 @@ async def run_agent_task(full_task: str, llm: ChatGoogle, browser_session: Brows
 
     result_text, success = extract_done_text_and_status(final_step)
 
+    if trajectories is not None and success is True:
+        trajectories.save(full_task, start_url, history)
+    if success is True:
+        # Includes any replayed prefix: the time limit covers the whole run.
+        _record_duration(time_budgets, full_task, start_url, time.perf_counter() - started)
 
     if not result_text:
         result_text = "Agent completed, but no textual result was available."
 
+    return AgentRunResult(text=result_text, success=success, history=history)
+
+
+def _record_duration(
+    time_budgets: TimeBudgets, task: str, start_url: Optional[str], seconds: float, replayed: bool = False
+) -> None:
+    try:
+        time_budgets.record(task, start_url, seconds, replayed=replayed)
+    except OSError as e:
+        logger.warning(f"Could not record the run duration: {e}")
+
+
+def format_result_html(result: AgentRunResult) -> str:
     # Wrap the result in HTML with an icon and a class for color styling based on the success flag.
-    if success is True:
+    if result.success is True:
         icon = "👍"
-        ui_text = f'{icon}<p class="success-text">{result_text}</p>'
-    elif success is False:
+        ui_text = f'{icon}<p class="success-text">{result.text}</p>'
+    elif result.success is False:
         icon = "❌"
-        ui_text = f'{icon}<p class="error-text">{result_text}</p>'
+        ui_text = f'{icon}<p class="error-text">{result.text}</p>'
     else:
-        ui_text = f'<p>{result_text}</p>'  # Default styling if success is unknown
+        ui_text = f'<p>{result.text}</p>'  # Default styling if success is unknown
 
     logger.info("Agent task completed. Final UI text: %r", ui_text)
     return ui_text
 
-async def run_agent_on_task(task_instruction: str, url: str, login_url: str) -> str:
+
+async def run_agent_task(
+    full_task: str,
+    llm: ChatGoogle,
+    browser_session: BrowserSession,
+    on_step_end=None,
+    start_url: Optional[str] = None,
+) -> str:
+    result = await execute_agent_task(
+        full_task, llm, browser_session, on_step_end=on_step_end, start_url=start_url
+    )
+    return format_result_html(result)
+
+def build_browser_profile(**overrides: Any) -> BrowserProfile:
+    """Builds the browser profile used for agent runs outside of pytest."""
+    from browser_use import BrowserProfile
+
+    headless_mode = os.getenv("HEADLESS", "False").lower() in ("true", "1", "t")
+    settings: Dict[str, Any] = {"headless": headless_mode, "keep_alive": False}
+    settings.update(overrides)
+    return BrowserProfile(**settings)
+
+
+@asynccontextmanager
+async def _checkout_session(pool: Optional["BrowserSessionPool"], run_info: Optional[Dict[str, Any]] = None):
+    """Yields a pooled session when a pool is given, otherwise a freshly started one.
+
+    With `run_info`, the browser's memory when the session is given back is
+    stored in it under "browser_memory": the pool's own sample, or for a fresh
+    browser one taken before it is stopped.
+    """
+    if pool is not None:
+        async with pool.acquire(run_info) as session:
+            yield session
+        return
+
+    from browser_use import BrowserSession
+
+    session = BrowserSession(browser_profile=build_browser_profile())
+    await session.start()
+    try:
+        yield session
+    finally:
+        if run_info is not None:
+            from memory_monitor import sample_session
+
+            try:
+                run_info["browser_memory"] = (await sample_session(session)).to_dict()
+            except Exception as e:
+                logger.warning(f"Could not sample browser memory: {e}")
+        await session.stop()
+
+
+@asynccontextmanager
+async def intercept_network(
+    session: BrowserSession,
+    resource_policy: Optional["ResourcePolicy"] = None,
+    archive_key: Optional[str] = None,
+) -> AsyncIterator[Optional["BlockingStats"]]:
+    """Applies the resource policy and, with NETWORK_ARCHIVE_MODE, records or replays
+    the run's traffic under `archive_key`. Yields what the policy blocked."""
+    from resource_policy import ResourceBlocker
+
+    blocker = ResourceBlocker(resource_policy) if resource_policy is not None else None
+    archives = NetworkArchiveStore.from_env() if archive_key else None
+    archive = archives.handler(archive_key) if archives is not None else None
+    try:
+        # Blocked requests are failed before the archive sees them.
+        async with intercept_requests(session, [blocker, archive]):
+            yield blocker.stats if blocker is not None else None
+    finally:
+        if blocker is not None and blocker.stats.requests:
+            logger.info(blocker.stats.summary())
+        if archive is not None:
+            archive.close()
+
+
+def resolve_credentials(username: Optional[str] = None, password: Optional[str] = None) -> tuple[str, str]:
+    """The given credentials, falling back to USERNAME and PASSWORD from the environment."""
+    return (
+        username or os.getenv("USERNAME", "ram+teacher+11@ck12.org"),
+        password or os.getenv("PASSWORD", "test123456"),
+    )
+
+
+async def run_agent_on_task(
+    task_instruction: str,
+    url: str,
+    login_url: str,
+    pool: Optional["BrowserSessionPool"] = None,
+    login_cache: Optional["LoginStateCache"] = None,
+    llm: Optional[ChatGoogle] = None,
+    on_step_end=None,
+    resource_policy: Optional["ResourcePolicy"] = None,
+    run_info: Optional[Dict[str, Any]] = None,
+) -> str:
     """
     Initializes a browser, runs an agent task, and returns the result.
     This function is designed to be called from outside the pytest framework.
+    When a `pool` is given, a warm session is checked out of it instead of
+    launching a new browser. When a `login_cache` is given, a cached login is
+    reused and the agent only signs in if that state has expired. `llm`
+    defaults to the process-wide, rate-governed Gemini client (GEMINI_MODEL).
+    `on_step_end` is called with the agent after every step, as in pytest runs.
+    Requests blocked by `resource_policy` are failed for the whole run, and
+    NETWORK_ARCHIVE_MODE records or replays its traffic per task and URL.
+    When a `run_info` dict is given, the browser's memory after the run is
+    stored in it under "browser_memory".
     """
-    # Configure browser profile
-    headless_mode = os.getenv("HEADLESS", "False").lower() in ("true", "1", "t")
-    browser_profile = BrowserProfile(headless=headless_mode, keep_alive=False)
+    if llm is None:
+        llm = get_llm(temperature=LLM_TEMPERATURE)
 
-    # Initialize the language model
-    llm = ChatGoogle(
-        model=os.getenv("GEMINI_MODEL", "gemini-2.5-flash"),
-        temperature=LLM_TEMPERATURE,
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
+    archive_key = f"{task_instruction}\n{url}"
+    async with _checkout_session(pool, run_info) as session, intercept_network(session, resource_policy, archive_key):
+        username, password = resolve_credentials()
 
-    # Start a new browser session
-    session = BrowserSession(browser_profile=browser_profile)
-    await session.start()
+        logged_in = False
+        if login_cache is not None:
+            logged_in = await restore_login(login_cache, session, login_url, username)
 
-    try:
-        username = os.getenv("USERNAME", "ram+teacher+11@ck12.org")
-        password = os.getenv("PASSWORD", "test123456")
-        
-        agent_rules = """
-        You are controlling a web browser to sign-in or log in and perform a task.
-        
-        Critical rules for Assignment:
-        - Any pop-up appears in-between which is not part of the main task flow, close it by clicking 'X' or 'Close' button.
-        - If a due date is required, click the due date field, open the calendar, select any valid future date (2–7 days from today), confirm it so the field is filled, and only then submit the form."
-        """
-        
-        login_steps = f"""
-        Follow these steps to log in:
-
-        1. Navigate to {login_url}.
-        """
-
-        if "/flexi/" in login_url:
-            login_steps += """
-        2. If a popup appears with a 'Next' button, repeatedly click 'Next' until a 'Got it' button appears, then click 'Got it'.
-        3. After dismissing the popup, continue with the sign-in steps.
-        """
-        
-        login_part = (
-            f"Go to {login_url}, open the sign-in form, enter username {username} and password {password}, "
-            "then press Enter in the password field to submit the form. "
+        main_task_part = build_task_prompt(task_instruction, login_url, username, password, logged_in)
+
+        logger.info("--- Starting Combined Agent Task ---")
+        result = await execute_agent_task(
+            main_task_part, llm, session, on_step_end=on_step_end, start_url=login_url
         )
+        if login_cache is not None and not logged_in and result.success:
+            await remember_login(login_cache, session, login_url, username)
+        result_text = format_result_html(result)
+    if run_info is not None and "browser_memory" in run_info:
+        logger.info(f"Browser memory after the run: {run_info['browser_memory']}")
+    return result_text or "Task completed, but no final text was returned."
+
+
+async def run_test_request(
+    payload: Dict[str, Any],
+    pool: Optional["BrowserSessionPool"] = None,
+    login_cache: Optional["LoginStateCache"] = None,
+    resource_policy: Optional["ResourcePolicy"] = None,
+) -> str:
+    """Runs one queued /run-test request, in server.py or in a worker.py process.
+
+    Streamed requests publish every finished step on the current job, and the
+    browser's memory after the run is added to the job's details.
+    """
+    from job_queue import current_job
+    from step_stream import step_publisher
+
+    job = current_job()
+    on_step_end = step_publisher(job) if payload.get("stream") and job is not None else None
+    policy = resource_policy
+    if policy is not None:
+        policy = policy.allowing(payload.get("allow_resource_types") or (), payload.get("allow_domains") or ())
+    # The user's prompt will contain the target URL for the main task.
+    # The current page URL is used for the initial login.
+    run_info: Dict[str, Any] = {}
+    result = await run_agent_on_task(
+        task_instruction=payload["prompt"],
+        url=payload["url"],
+        login_url=payload["url"],
+        pool=pool,
+        login_cache=login_cache,
+        on_step_end=on_step_end,
+        resource_policy=policy,
+        run_info=run_info,
+    )
+    if job is not None:
+        job.details.update(run_info)
+    return result
+
+
+async def _sign_in_once(
+    session: BrowserSession,
+    login_url: str,
+    username: str,
+    password: str,
+    llm: ChatGoogle,
+    login_cache: Optional["LoginStateCache"] = None,
+    resource_policy: Optional["ResourcePolicy"] = None,
+) -> Dict[str, Any]:
+    """Signs the session in, from the login cache when possible, and returns its storage state."""
+    logged_in = False
+    if login_cache is not None:
+        logged_in = await restore_login(login_cache, session, login_url, username)
+    if not logged_in:
+        login_task = build_task_prompt(BATCH_LOGIN_TASK, login_url, username, password)
+        async with intercept_network(session, resource_policy, archive_key=f"{BATCH_LOGIN_TASK}\n{login_url}"):
+            result = await execute_agent_task(login_task, llm, session, start_url=login_url)
+        if not result.success:
+            raise RuntimeError(f"Could not sign in as {username} at {login_url}: {result.text}")
+        if login_cache is not None:
+            await remember_login(login_cache, session, login_url, username)
+    return await capture_storage_state(session)
+
+
+async def run_agent_batch(
+    prompts: list[str],
+    login_url: str,
+    username: Optional[str] = None,
+    password: Optional[str] = None,
+    pool: Optional["BrowserSessionPool"] = None,
+    login_cache: Optional["LoginStateCache"] = None,
+    llm: Optional[ChatGoogle] = None,
+    resource_policy: Optional["ResourcePolicy"] = None,
+    parallel: int = 1,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> list[Dict[str, Any]]:
+    """
+    Runs several prompts as one user at `login_url`, signing in only once.
+    With `parallel` 1 the prompts run one after another in the signed-in
+    session. Otherwise up to `parallel` prompts run at once, each in its own
+    session seeded with the signed-in storage state: a browser_use agent drives
+    the session's focused tab, so two agents cannot share one session.
+    Each prompt's result (index, prompt, status, result, duration_seconds) is
+    passed to `on_result` as soon as it finishes; all of them are returned in
+    prompt order. If the sign-in fails, every prompt fails with that error.
+    """
+    if llm is None:
+        llm = get_llm(temperature=LLM_TEMPERATURE)
+    username, password = resolve_credentials(username, password)
+    results: list[Dict[str, Any]] = []
+
+    def finish(index: int, status: str, text: str, started: float) -> None:
+        entry = {
+            "index": index,
+            "prompt": prompts[index],
+            "status": status,
+            "result": text,
+            "duration_seconds": round(time.perf_counter() - started, 2),
+        }
+        results.append(entry)
+        if on_result is not None:
+            on_result(entry)
 
-        main_task_part = (
+    async def run_prompt(index: int, session: BrowserSession, started: float) -> None:
+        prompt = prompts[index]
+        try:
+            # Every prompt starts from the login page, as a single /run-test would.
+            await navigate(session, login_url)
+            async with intercept_network(session, resource_policy, archive_key=f"{prompt}\n{login_url}"):
+                result = await execute_agent_task(
+                    build_task_prompt(prompt, login_url, username, password, logged_in=True),
+                    llm,
+                    session,
+                    start_url=login_url,
+                )
+        except Exception as e:
+            logger.error(f"Batch prompt {index} failed: {e}", exc_info=True)
+            finish(index, "error", str(e), started)
+            return
+        text = format_result_html(result) or "Task completed, but no final text was returned."
+        finish(index, "success" if result.success is not False else "error", text, started)
+
+    started = time.perf_counter()
+    async with _checkout_session(pool) as session:
+        try:
+            storage_state = await _sign_in_once(
+                session, login_url, username, password, llm, login_cache, resource_policy
+            )
+        except Exception as e:
+            logger.error(f"Batch sign-in failed: {e}", exc_info=True)
+            for index in range(len(prompts)):
+                finish(index, "error", f"Sign-in failed: {e}", started)
+            return results
+        logger.info(f"Signed in as {username}; running {len(prompts)} prompt(s).")
+        if parallel <= 1:
+            for index in range(len(prompts)):
+                await run_prompt(index, session, time.perf_counter())
+
+    if parallel > 1:
+        # The sign-in session is back in the pool first, so no task waits for a
+        # second session while holding one.
+        slots = asyncio.Semaphore(parallel)
+
+        async def run_in_own_session(index: int) -> None:
+            async with slots, _checkout_session(pool) as own_session:
+                started = time.perf_counter()
+                try:
+                    await apply_storage_state(own_session, storage_state)
+                except Exception as e:
+                    finish(index, "error", f"Could not share the sign-in: {e}", started)
+                    return
+                await run_prompt(index, own_session, started)
+
+        await asyncio.gather(*(run_in_own_session(index) for index in range(len(prompts))))
+    return sorted(results, key=lambda entry: entry["index"])
+
+
+async def run_batch_request(
+    payload: Dict[str, Any],
+    pool: Optional["BrowserSessionPool"] = None,
+    login_cache: Optional["LoginStateCache"] = None,
+    resource_policy: Optional["ResourcePolicy"] = None,
+) -> Dict[str, Any]:
+    """Runs one queued /run-batch request, publishing a `prompt_result` event per finished prompt."""
+    from job_queue import current_job
+
+    job = current_job()
+    policy = resource_policy
+    if policy is not None:
+        policy = policy.allowing(payload.get("allow_resource_types") or (), payload.get("allow_domains") or ())
+
+    def publish(entry: Dict[str, Any]) -> None:
+        if job is not None:
+            job.publish({"type": "prompt_result", **entry})
+
+    results = await run_agent_batch(
+        payload["prompts"],
+        login_url=payload["url"],
+        username=payload.get("username"),
+        password=payload.get("password"),
+        pool=pool,
+        login_cache=login_cache,
+        resource_policy=policy,
+        parallel=payload.get("parallel") or 1,
+        on_result=publish,
+    )
+    succeeded = sum(1 for entry in results if entry["status"] == "success")
+    return {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
+
+
+def build_task_prompt(
+    task_instruction: str,
+    login_url: str,
+    username: str,
+    password: str,
+    logged_in: bool = False,
+) -> str:
+    """Builds the full agent prompt, skipping the sign-in steps when already logged in."""
+    agent_rules = """
+    You are controlling a web browser to sign-in or log in and perform a task.
+    
+    Critical rules for Assignment:
+    - Any pop-up appears in-between which is not part of the main task flow, close it by clicking 'X' or 'Close' button.
+    - If a due date is required, click the due date field, open the calendar, select any valid future date (2–7 days from today), confirm it so the field is filled, and only then submit the form."
+    """
+
+    if logged_in:
+        return (
             agent_rules
-            + login_steps
-            + "\n"
-            + login_part
+            + f"\nThe browser is already open at {login_url} and you are already signed in as {username}. "
+            "Do not sign in again."
             + "\n\nNow perform the following task on that page:\n"
             + task_instruction
             + "\nDo not log out during this task."
         )
 
+    login_steps = f"""
+    Follow these steps to log in:
 
-        logger.info("--- Starting Combined Agent Task ---")
-        result_text = await run_agent_task(main_task_part, llm, session)
-        return result_text or "Task completed, but no final text was returned."
-    finally:
-        await session.stop()
+    1. Navigate to {login_url}.
+    """
+
+    if "/flexi/" in login_url:
+        login_steps += """
+    2. If a popup appears with a 'Next' button, repeatedly click 'Next' until a 'Got it' button appears, then click 'Got it'.
+    3. After dismissing the popup, continue with the sign-in steps.
+    """
+    
+    login_part = (
+        f"Go to {login_url}, open the sign-in form, enter username {username} and password {password}, "
+        "then press Enter in the password field to submit the form. "
+    )
+
+    return (
+        agent_rules
+        + login_steps
+        + "\n"
+        + login_part
+        + "\n\nNow perform the following task on that page:\n"
+        + task_instruction
+        + "\nDo not log out during this task."
+    )
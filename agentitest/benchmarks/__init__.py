@@ -0,0 +1,4 @@
+"""Offline benchmarks: a local fixture site, a scripted LLM and load generators.
+
+Run with ``python -m benchmarks.run`` from the ``agentitest`` directory.
+"""
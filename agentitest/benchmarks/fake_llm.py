@@ -0,0 +1,114 @@
+"""A deterministic stand-in for ``ChatGoogle``.
+
+``ScriptedChatModel`` answers every agent step with the next entry of a fixed
+script instead of calling Gemini, so runs are repeatable and need no network.
+Each script step is a list of browser_use actions, e.g.::
+
+    [{"click_element_by_index": {"element": "Looker"}}]
+
+Element indices change between page loads, so an action may name the
+element by its visible text or attributes with ``"element"``; it is resolved to
+the ``index`` of the first matching element in the browser state the agent
+sent. Once the script is exhausted the model answers with ``done``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+from typing import Any
+
+# Interactive elements appear in the agent's browser state as "[<index>]<tag ...".
+_ELEMENT_MARKER = re.compile(r"\[(\d+)\]<")
+
+
+def _message_text(message: Any) -> str:
+    content = getattr(message, "content", message)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(str(getattr(part, "text", "")) for part in content)
+    return str(content or "")
+
+
+def resolve_element_index(state_text: str, text: str) -> int:
+    """Index of the first element whose serialized form contains ``text``."""
+    markers = list(_ELEMENT_MARKER.finditer(state_text))
+    needle = text.lower()
+    for marker, following in zip(markers, markers[1:] + [None]):
+        end = following.start() if following else len(state_text)
+        if needle in state_text[marker.start():end].lower():
+            return int(marker.group(1))
+    raise ValueError(f"No interactive element matching {text!r} in the browser state.")
+
+
+class ScriptedChatModel:
+    """Replays scripted agent steps; implements the browser_use chat model interface."""
+
+    provider = "scripted"
+
+    def __init__(
+        self,
+        steps: list[list[dict[str, Any]]],
+        result: str = "done",
+        success: bool = True,
+        latency: float = 0.0,
+        model: str = "scripted-fake",
+    ) -> None:
+        self.steps = steps
+        self.result = result
+        self.success = success
+        self.latency = latency  # Simulated time to first token, in seconds
+        self.model = model
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return self.model
+
+    @property
+    def model_name(self) -> str:
+        return self.model
+
+    def _next_actions(self, state_text: str) -> list[dict[str, Any]]:
+        step = self.calls - 1
+        if step >= len(self.steps):
+            return [{"done": {"text": self.result, "success": self.success}}]
+        actions = []
+        for action in self.steps[step]:
+            name, params = next(iter(action.items()))
+            params = dict(params)
+            if "element" in params:
+                params["index"] = resolve_element_index(state_text, params.pop("element"))
+            actions.append({name: params})
+        return actions
+
+    async def ainvoke(self, messages: list[Any], output_format: type | None = None) -> Any:
+        from browser_use.llm.views import ChatInvokeCompletion, ChatInvokeUsage
+
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        usage = ChatInvokeUsage(
+            prompt_tokens=0,
+            prompt_cached_tokens=None,
+            prompt_cache_creation_tokens=None,
+            prompt_image_tokens=None,
+            completion_tokens=0,
+            total_tokens=0,
+        )
+        if output_format is None:
+            return ChatInvokeCompletion(completion=self.result, usage=usage)
+
+        state_text = _message_text(messages[-1]) if messages else ""
+        output = {
+            "thinking": f"Scripted step {self.calls}.",
+            "evaluation_previous_goal": "Success",
+            "memory": f"Completed {self.calls - 1} scripted step(s).",
+            "next_goal": f"Run scripted step {self.calls}.",
+            "action": self._next_actions(state_text),
+        }
+        # Only pass the fields this AgentOutput variant declares (flash mode drops some).
+        fields = getattr(output_format, "model_fields", output)
+        completion = output_format.model_validate({k: v for k, v in output.items() if k in fields})
+        return ChatInvokeCompletion(completion=completion, usage=usage)
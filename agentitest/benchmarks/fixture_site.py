@@ -0,0 +1,46 @@
+"""Local stand-in for the sites the agent tests visit.
+
+``site/community`` mimics the discuss.google.dev pages used by
+``test_community_website.py`` (main navigation, search, empty results) and
+``site/ck12`` the CK-12 sign-in, dashboard and Flexi onboarding flow used by
+``run_agent_on_task``. The pages are static; the little state they need
+(search results, the signed-in user) lives in inline JavaScript.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+SITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "site")
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format % args)
+
+
+@contextmanager
+def serve_fixture_site(host: str = "127.0.0.1", port: int = 0) -> Iterator[str]:
+    """Serves the fixture site on a background thread and yields its base URL.
+
+    ``port=0`` picks a free port.
+    """
+    server = ThreadingHTTPServer((host, port), partial(_QuietHandler, directory=SITE_DIR))
+    thread = threading.Thread(target=server.serve_forever, name="fixture-site", daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_address[1]}"
+    logger.info(f"Serving fixture site from {SITE_DIR} at {base_url}")
+    try:
+        yield base_url
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
@@ -0,0 +1,307 @@
+"""Offline benchmarks for the framework's own overhead.
+
+Every benchmark runs against the local fixture site with a scripted LLM, so
+no network access or API key is needed and results are comparable between
+runs. Measured operations:
+
+* ``run_agent_task``: one agent run on a pooled browser session.
+* ``record_step``: the Allure step hook (``StepReporter``), timed inside those
+  runs; each run's final flush counts as one more sample.
+* ``run_test``: ``POST /run-test`` on the agent server (in process).
+* ``run_tests``: ``POST /run-tests`` on the ai-test-framework recorder server.
+
+Usage (from ``agentitest/``)::
+
+    python -m benchmarks.run --iterations 12 --concurrency 2 --output bench.json
+    python -m benchmarks.run --baseline bench.json --max-regression 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any
+
+from benchmarks.fixture_site import serve_fixture_site
+from benchmarks.scenarios import SCENARIOS, runner_script
+from benchmarks.stats import Measurement, generate_load, process_tree_rss_mb
+
+logger = logging.getLogger(__name__)
+
+BENCHMARKS = ("run_agent_task", "run_test", "run_tests")
+FRAMEWORK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "ai-test-framework")
+
+
+def _configure_env(work_dir: str, concurrency: int) -> None:
+    """Points every on-disk artefact at ``work_dir``; must run before the agent modules are imported."""
+    os.environ.setdefault("HEADLESS", "true")
+    os.environ.setdefault("SCREENSHOT_DIR", os.path.join(work_dir, "screenshots"))
+    os.environ.setdefault("AGENT_TRACE_DIR", os.path.join(work_dir, "traces"))
+    os.environ.setdefault("RUN_TIME_BUDGET_DIR", os.path.join(work_dir, "run_budgets"))
+    os.environ.setdefault("BROWSER_POOL_SIZE", str(concurrency))
+    os.environ.setdefault("MAX_CONCURRENT_RUNS", str(concurrency))
+    # Each run must execute the full scripted flow.
+    os.environ["AGENT_TRAJECTORY_MODE"] = "off"
+    os.environ["LOGIN_CACHE"] = "false"
+    # The /run-test benchmark swaps the in-process scheduler's runner.
+    os.environ["JOB_QUEUE"] = "memory"
+
+
+def _scenario(i: int):
+    return SCENARIOS[i % len(SCENARIOS)]
+
+
+# --- Agent Benchmarks ---
+
+
+async def bench_agent(base_url: str, args: argparse.Namespace) -> list[Measurement]:
+    """Times ``run_agent_task`` and, inside it, every ``record_step`` call."""
+    from agent_runner import build_browser_profile, run_agent_task
+    from conftest import screenshot_writer
+    from session_pool import BrowserSessionPool
+    from step_reporter import StepReporter
+
+    record_steps = Measurement("record_step")
+
+    pool = BrowserSessionPool(build_browser_profile(), min_size=args.concurrency, max_size=args.concurrency)
+    await pool.start()
+    try:
+        async def call(i: int) -> None:
+            scenario = _scenario(i)
+            reporter = StepReporter(screenshot_writer)
+
+            async def timed_record_step(agent: Any) -> None:
+                start = time.perf_counter()
+                await reporter(agent)
+                record_steps.latencies.append(time.perf_counter() - start)
+
+            async with pool.acquire() as session:
+                try:
+                    result = await run_agent_task(
+                        scenario.full_task(base_url),
+                        scenario.llm(base_url, args.llm_latency),
+                        session,
+                        on_step_end=timed_record_step,
+                        start_url=scenario.url(base_url),
+                    )
+                finally:
+                    start = time.perf_counter()
+                    reporter.flush()
+                    record_steps.latencies.append(time.perf_counter() - start)
+            if scenario.expected not in result:
+                raise AssertionError(f"{scenario.name} returned {result!r}")
+
+        agent_runs = await generate_load("run_agent_task", call, args.iterations, args.concurrency)
+    finally:
+        await pool.close()
+        screenshot_writer.flush()
+
+    record_steps.wall_seconds = agent_runs.wall_seconds
+    record_steps.memory = dict(agent_runs.memory)
+    return [agent_runs, record_steps]
+
+
+async def bench_run_test(base_url: str, args: argparse.Namespace) -> list[Measurement]:
+    """Drives ``POST /run-test`` through the agent server's ASGI app."""
+    import httpx
+
+    import server
+    from agent_runner import run_agent_on_task
+
+    scenarios = {scenario.task: scenario for scenario in SCENARIOS}
+
+    async def run_job(payload: dict) -> str:
+        # Same as server.run_job, with the scripted model instead of Gemini.
+        scenario = scenarios[payload["prompt"]]
+        return await run_agent_on_task(
+            task_instruction=payload["prompt"],
+            url=payload["url"],
+            login_url=payload["url"],
+            pool=server.browser_pool,
+            llm=scenario.llm(base_url, args.llm_latency),
+        )
+
+    server.scheduler.runner = run_job
+    async with server.lifespan(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://agentitest", timeout=None) as client:
+            async def call(i: int) -> None:
+                scenario = _scenario(i)
+                response = await client.post("/run-test", json={"prompt": scenario.task, "url": scenario.url(base_url)})
+                response.raise_for_status()
+                body = response.json()
+                if body["status"] != "success" or scenario.expected not in body["result"]:
+                    raise AssertionError(f"{scenario.name} returned {body}")
+
+            return [await generate_load("run_test", call, args.iterations, args.concurrency)]
+
+
+# --- Recorder Server Benchmark ---
+
+
+def _log_tail(path: str, size: int = 2000) -> str:
+    with open(path, "rb") as f:
+        return f.read()[-size:].decode(errors="replace")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _track_peak_rss(pid: int, peak: dict[str, float | None], interval: float = 0.5) -> None:
+    while True:
+        rss = process_tree_rss_mb(pid)
+        if rss is not None:
+            peak["server_peak_rss_mb"] = max(rss, peak.get("server_peak_rss_mb") or 0.0)
+        await asyncio.sleep(interval)
+
+
+async def bench_run_tests(base_url: str, args: argparse.Namespace, work_dir: str) -> list[Measurement]:
+    """Starts the recorder server with the scenarios as test files and drives ``POST /run-tests``."""
+    import httpx
+
+    tests_dir = os.path.join(work_dir, "runner-tests")
+    os.makedirs(tests_dir, exist_ok=True)
+    for scenario in SCENARIOS:
+        with open(os.path.join(tests_dir, f"{scenario.name}.json"), "w") as f:
+            json.dump(runner_script(scenario, base_url), f, indent=2)
+
+    port = _free_port()
+    env = {
+        **os.environ,
+        "TESTS_DIR": tests_dir,
+        "HEADLESS": "true",
+        "RUNNER_VISUAL_DELAY_MS": "0",
+        "RUNNER_WORKERS": str(args.concurrency),
+    }
+    log_path = os.path.join(work_dir, "recorder-server.log")
+    with open(log_path, "wb") as log_file:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+            cwd=FRAMEWORK_DIR, env=env, stdout=log_file, stderr=log_file,
+        )
+    peak: dict[str, float | None] = {}
+    tracker = asyncio.create_task(_track_peak_rss(process.pid, peak))
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            for _ in range(120):
+                try:
+                    if (await client.get("/get-tests")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if process.returncode is not None:
+                    raise RuntimeError(f"Recorder server exited with {process.returncode}:\n{_log_tail(log_path)}")
+                await asyncio.sleep(0.5)
+            else:
+                raise RuntimeError(f"Recorder server did not start:\n{_log_tail(log_path)}")
+
+            async def call(i: int) -> None:
+                scenario = _scenario(i)
+                response = await client.post("/run-tests", json={"files": [f"{scenario.name}.json"]})
+                response.raise_for_status()
+                body = response.json()
+                if not body["success"]:
+                    raise AssertionError(f"{scenario.name}: {body['message']}")
+
+            measurement = await generate_load("run_tests", call, args.iterations, args.concurrency)
+    finally:
+        tracker.cancel()
+        if process.returncode is None:
+            process.terminate()
+            await process.wait()
+    measurement.memory.update(peak)
+    return [measurement]
+
+
+# --- Reporting ---
+
+
+def compare(results: dict[str, dict[str, Any]], baseline: dict[str, dict[str, Any]], max_regression: float) -> list[str]:
+    """Lists the measurements whose p95 latency or throughput regressed beyond the threshold."""
+    regressions = []
+    for name, current in results.items():
+        if current["errors"]:
+            regressions.append(f"{name}: {current['errors']} error(s)")
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if previous.get("p95_ms") and current.get("p95_ms") and current["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms vs baseline {previous['p95_ms']}ms")
+        if (
+            previous.get("throughput_per_s")
+            and current.get("throughput_per_s")
+            and current["throughput_per_s"] < previous["throughput_per_s"] * (1 - max_regression)
+        ):
+            regressions.append(
+                f"{name}: throughput {current['throughput_per_s']}/s vs baseline {previous['throughput_per_s']}/s"
+            )
+    return regressions
+
+
+def print_table(results: dict[str, dict[str, Any]]) -> None:
+    columns = ("count", "errors", "throughput_per_s", "p50_ms", "p95_ms", "max_ms", "max_rss_mb")
+    print(f"{'benchmark':<16}" + "".join(f"{c:>18}" for c in columns))
+    for name, summary in results.items():
+        print(f"{name:<16}" + "".join(f"{str(summary.get(c, '')):>18}" for c in columns))
+
+
+async def run_benchmarks(args: argparse.Namespace, work_dir: str) -> dict[str, dict[str, Any]]:
+    measurements: list[Measurement] = []
+    with serve_fixture_site() as base_url:
+        if "run_agent_task" in args.only:
+            measurements += await bench_agent(base_url, args)
+        if "run_test" in args.only:
+            measurements += await bench_run_test(base_url, args)
+        if "run_tests" in args.only:
+            measurements += await bench_run_tests(base_url, args, work_dir)
+    return {m.name: m.summary() for m in measurements}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS), help="Benchmarks to run (default: all).")
+    parser.add_argument("--iterations", type=int, default=12, help="Requests or runs per benchmark (default 12).")
+    parser.add_argument("--concurrency", type=int, default=2, help="Requests in flight at once (default 2).")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per LLM call (default 0).")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report peak Python heap (slows runs down).")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Allowed p95/throughput regression (default 0.25).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    with tempfile.TemporaryDirectory(prefix="agentitest-bench-") as work_dir:
+        _configure_env(work_dir, args.concurrency)
+        results = asyncio.run(run_benchmarks(args, work_dir))
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Wrote results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        return 1 if regressions else 0
+    return 1 if any(summary["errors"] for summary in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Scripted agent runs against the fixture site.
+
+Each scenario pairs a task, written the way the real tests phrase it, with the
+actions ``ScriptedChatModel`` answers with and the text the run must return.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any
+
+from benchmarks.fake_llm import ScriptedChatModel
+
+USERNAME = "bench-teacher@example.com"
+PASSWORD = "bench-password"
+
+
+@dataclass
+class Scenario:
+    name: str
+    path: str  # Start page, relative to the fixture site's base URL
+    task: str
+    steps: list[list[dict[str, Any]]]
+    expected: str
+    runner_steps: list[dict[str, Any]] = field(default_factory=list)  # ai-test-framework script
+
+    def url(self, base_url: str) -> str:
+        return f"{base_url}{self.path}"
+
+    def full_task(self, base_url: str) -> str:
+        """The task as ``BaseAgentTest.validate_task`` phrases it."""
+        return f"Go to {self.url(base_url)}, then {self.task}"
+
+    def llm(self, base_url: str, latency: float = 0.0) -> ScriptedChatModel:
+        """A fresh scripted model; it is stateful, so use one per run."""
+        steps = [
+            [{"go_to_url": {"url": self.url(base_url), "new_tab": False}}],
+            *self.steps,
+        ]
+        return ScriptedChatModel(steps, result=self.expected, latency=latency)
+
+
+def _runner_step(action: str, step_name: str, selector: str | None = None, value: str | None = None) -> dict[str, Any]:
+    step = {"action": action, "selector": selector, "value": value, "stepName": step_name, "key": None, "url": None}
+    if action == "expect":
+        step["assertion"] = "toBeVisible"
+    return step
+
+
+SCENARIOS = [
+    Scenario(
+        name="community_navigation",
+        path="/community/",
+        task="click on the 'Looker' link in the main navigation, and then return the final URL of the page.",
+        steps=[[{"click_element_by_index": {"element": "Looker"}}]],
+        expected="/c/looker/19",
+        runner_steps=[
+            _runner_step("click", "click on Looker", selector='nav a[href="/community/c/looker/19/"]'),
+            _runner_step("expect", "Looker heading is visible", selector="h1"),
+        ],
+    ),
+    Scenario(
+        name="community_search",
+        path="/community/",
+        task=(
+            "click the search icon, then type 'Looker' into the search bar that appears, and then press Enter. "
+            "Finally, confirm that text containing 'results for Looker' is visible. If it is, return 'search_results_visible'."
+        ),
+        steps=[
+            [{"click_element_by_index": {"element": "search"}}],
+            [{"input_text": {"element": "search-term", "text": "Looker"}}],
+            [{"send_keys": {"keys": "Enter"}}],
+        ],
+        expected="search_results_visible",
+        runner_steps=[
+            _runner_step("click", "click on the search icon", selector="#search-button"),
+            _runner_step("fill", 'fill "Looker" into the search bar', selector="#search-term", value="Looker"),
+            _runner_step("press", "press Enter", selector="#search-term", value="Enter"),
+            _runner_step("expect", "results are visible", selector="#results li"),
+        ],
+    ),
+    Scenario(
+        name="ck12_signin_assignment",
+        path="/ck12/auth/signin.html",
+        task="close the What's new popup, click 'Create Assignment' and enter the title 'Benchmark'. Return 'assignment_form_filled'.",
+        steps=[
+            [{"input_text": {"element": "username", "text": USERNAME}}],
+            [{"input_text": {"element": "password", "text": PASSWORD}}],
+            [{"send_keys": {"keys": "Enter"}}],
+            [{"click_element_by_index": {"element": "close"}}],
+            [{"click_element_by_index": {"element": "create assignment"}}],
+            [{"input_text": {"element": "assignment-title", "text": "Benchmark"}}],
+        ],
+        expected="assignment_form_filled",
+        runner_steps=[
+            _runner_step("fill", "fill the username", selector="#username", value=USERNAME),
+            _runner_step("fill", "fill the password", selector="#password", value=PASSWORD),
+            _runner_step("press", "press Enter", selector="#password", value="Enter"),
+            _runner_step("click", "close the popup", selector='[aria-label="Close"]'),
+            _runner_step("click", "click Create Assignment", selector="#create-assignment"),
+            _runner_step("fill", "fill the title", selector="#assignment-title", value="Benchmark"),
+        ],
+    ),
+]
+
+
+def runner_script(scenario: Scenario, base_url: str) -> dict[str, Any]:
+    """The scenario as an ai-test-framework test file."""
+    goto = _runner_step("goto", f"Navigate to {scenario.url(base_url)}", value=scenario.url(base_url))
+    return {"name": scenario.name, "variables": {}, "steps": [goto, *scenario.runner_steps]}
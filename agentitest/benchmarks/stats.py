@@ -0,0 +1,112 @@
+"""Latency, throughput and memory bookkeeping for the benchmarks."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import resource
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile; ``None`` for an empty sample."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def max_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def process_tree_rss_mb(pid: int) -> float | None:
+    """Current RSS of a process and its children, or ``None`` without psutil."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    try:
+        process = psutil.Process(pid)
+        processes = [process, *process.children(recursive=True)]
+    except psutil.NoSuchProcess:
+        return None
+    total = 0
+    for p in processes:
+        try:
+            total += p.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return total / (1024 * 1024)
+
+
+@dataclass
+class Measurement:
+    """Timings collected for one benchmarked operation."""
+
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    wall_seconds: float = 0.0
+    memory: dict[str, float | None] = field(default_factory=dict)
+
+    def summary(self) -> dict[str, Any]:
+        def ms(value: float | None) -> float | None:
+            return round(value * 1000, 2) if value is not None else None
+
+        completed = len(self.latencies)
+        return {
+            "count": completed,
+            "errors": self.errors,
+            "throughput_per_s": round(completed / self.wall_seconds, 3) if self.wall_seconds else None,
+            "p50_ms": ms(percentile(self.latencies, 50)),
+            "p95_ms": ms(percentile(self.latencies, 95)),
+            "max_ms": ms(max(self.latencies, default=None)),
+            **{key: round(value, 2) if value is not None else None for key, value in self.memory.items()},
+        }
+
+
+async def generate_load(
+    name: str,
+    call: Callable[[int], Awaitable[Any]],
+    total: int,
+    concurrency: int,
+) -> Measurement:
+    """Runs ``call(i)`` ``total`` times with at most ``concurrency`` in flight.
+
+    A call that raises counts as an error and is left out of the latencies.
+    """
+    measurement = Measurement(name)
+    slots = asyncio.Semaphore(concurrency)
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+    async def one(i: int) -> None:
+        async with slots:
+            start = time.perf_counter()
+            try:
+                await call(i)
+            except Exception as e:
+                measurement.errors += 1
+                logger.warning(f"[{name}] call {i} failed: {e}")
+                return
+            measurement.latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    measurement.wall_seconds = time.perf_counter() - start
+    measurement.memory["max_rss_mb"] = max_rss_mb()
+    if tracemalloc.is_tracing():
+        measurement.memory["python_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    return measurement
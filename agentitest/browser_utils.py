@@ -0,0 +1,171 @@
+"""Small CDP helpers shared by the session pool and other browser plumbing.
+
+These talk to the focused target of a ``BrowserSession`` directly over CDP so
+they stay cheap and never involve the agent or the LLM.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from browser_use import BrowserSession
+
+logger = logging.getLogger(__name__)
+
+
+async def evaluate(session: BrowserSession, expression: str) -> Any:
+    """Evaluates a JavaScript expression in the focused page and returns its value."""
+    cdp_session = await session.get_or_create_cdp_session()
+    response = await cdp_session.cdp_client.send.Runtime.evaluate(
+        params={"expression": expression, "returnByValue": True, "awaitPromise": True},
+        session_id=cdp_session.session_id,
+    )
+    if response.get("exceptionDetails"):
+        raise RuntimeError(f"JavaScript evaluation failed: {response['exceptionDetails']}")
+    return response.get("result", {}).get("value")
+
+
+async def navigate(session: BrowserSession, url: str, timeout: float = 15.0) -> None:
+    """Navigates the focused page to ``url`` and waits until the document is ready."""
+    cdp_session = await session.get_or_create_cdp_session()
+    await cdp_session.cdp_client.send.Page.navigate(
+        params={"url": url}, session_id=cdp_session.session_id
+    )
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        try:
+            if await evaluate(session, "document.readyState") == "complete":
+                return
+        except Exception:
+            # The execution context is torn down while the navigation commits.
+            pass
+        await asyncio.sleep(0.1)
+    logger.warning(f"Timed out waiting for {url} to finish loading.")
+
+
+async def capture_thumbnail(session: BrowserSession, width: int = 320, quality: int = 60) -> str:
+    """Captures the visible viewport as a base64 JPEG scaled down to ``width`` pixels.
+
+    The browser does the scaling and encoding, so no image library is needed.
+    """
+    cdp_session = await session.get_or_create_cdp_session()
+    client = cdp_session.cdp_client
+    metrics = await client.send.Page.getLayoutMetrics(session_id=cdp_session.session_id)
+    viewport = metrics["cssLayoutViewport"]
+    scale = min(1.0, width / max(viewport["clientWidth"], 1))
+    response = await client.send.Page.captureScreenshot(
+        params={
+            "format": "jpeg",
+            "quality": quality,
+            "clip": {
+                "x": viewport["pageX"],
+                "y": viewport["pageY"],
+                "width": viewport["clientWidth"],
+                "height": viewport["clientHeight"],
+                "scale": scale,
+            },
+        },
+        session_id=cdp_session.session_id,
+    )
+    return response["data"]
+
+
+async def page_target_ids(session: BrowserSession) -> list[str]:
+    """Returns the target ids of all open pages (tabs) in the browser."""
+    targets = await session.cdp_client.send.Target.getTargets()
+    return [
+        info["targetId"]
+        for info in targets.get("targetInfos", [])
+        if info.get("type") == "page"
+    ]
+
+
+async def open_origins(session: BrowserSession) -> set[str]:
+    """Returns the origins of every open page, ignoring non-http(s) pages."""
+    targets = await session.cdp_client.send.Target.getTargets()
+    origins: set[str] = set()
+    for info in targets.get("targetInfos", []):
+        parts = urlsplit(info.get("url", ""))
+        if info.get("type") == "page" and parts.scheme in ("http", "https"):
+            origins.add(f"{parts.scheme}://{parts.netloc}")
+    return origins
+
+
+async def reset_browser_state(session: BrowserSession) -> None:
+    """Returns a session to a clean slate: one blank tab, no cookies or site storage.
+
+    Storage is cleared for every origin that is currently open, which covers what
+    the previous task left behind on the pages it was working on.
+    """
+    cdp_session = await session.get_or_create_cdp_session()
+    client = cdp_session.cdp_client
+
+    for origin in await open_origins(session):
+        await client.send.Storage.clearDataForOrigin(
+            params={"origin": origin, "storageTypes": "all"}
+        )
+    await client.send.Storage.clearCookies(params={})
+
+    for target_id in await page_target_ids(session):
+        if target_id != cdp_session.target_id:
+            await client.send.Target.closeTarget(params={"targetId": target_id})
+
+    await navigate(session, "about:blank")
+
+
+# --- Storage state (cookies + localStorage) ---
+
+# Fields accepted by CDP's CookieParam; Storage.getCookies returns a few more.
+_COOKIE_PARAM_FIELDS = (
+    "name", "value", "domain", "path", "secure", "httpOnly", "sameSite",
+    "expires", "priority", "sourceScheme", "sourcePort", "partitionKey",
+)
+
+
+async def capture_storage_state(session: BrowserSession) -> dict[str, Any]:
+    """Captures all cookies plus the localStorage of the current page's origin.
+
+    The result uses the Playwright ``storage_state`` layout so it can also be fed
+    to ``BrowserProfile(storage_state=...)``.
+    """
+    client = session.cdp_client
+    cookies = (await client.send.Storage.getCookies(params={})).get("cookies", [])
+
+    origins: list[dict[str, Any]] = []
+    current_origin = await evaluate(session, "location.origin")
+    if current_origin and current_origin != "null":
+        items = await evaluate(
+            session,
+            "Object.entries(localStorage).map(([name, value]) => ({name, value}))",
+        )
+        origins.append({"origin": current_origin, "localStorage": items or []})
+
+    return {"cookies": cookies, "origins": origins}
+
+
+async def apply_storage_state(session: BrowserSession, state: dict[str, Any]) -> None:
+    """Seeds a session with cookies and localStorage captured by ``capture_storage_state``."""
+    cookies = []
+    for cookie in state.get("cookies", []):
+        param = {k: cookie[k] for k in _COOKIE_PARAM_FIELDS if k in cookie}
+        if cookie.get("session") or param.get("expires", -1) < 0:
+            param.pop("expires", None)
+        cookies.append(param)
+    if cookies:
+        await session.cdp_client.send.Storage.setCookies(params={"cookies": cookies})
+
+    # localStorage can only be written from a page on the owning origin.
+    for entry in state.get("origins", []):
+        items = entry.get("localStorage") or []
+        if not items:
+            continue
+        await navigate(session, entry["origin"])
+        await evaluate(
+            session,
+            f"(items => items.forEach(i => localStorage.setItem(i.name, i.value)))({json.dumps(items)})",
+        )
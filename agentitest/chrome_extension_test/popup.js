@@ -4,6 +4,7 @@ document.addEventListener('DOMContentLoaded', () => {
   const resultMsg = document.getElementById('resultMsg');
   const micBtn = document.getElementById('micBtn');
   const clearBtn = document.getElementById('clearBtn');
+  const cancelBtn = document.getElementById('cancelBtn');
 
   let isListening = false;
   let recognition;
@@ -113,6 +114,99 @@ document.addEventListener('DOMContentLoaded', () => {
     micBtn.style.display = 'none';
   }
 
+  // Renders the final result, shaped like the /run-test response.
+  const showFinalResult = (data) => {
+    // If the server provides a 'logs' array, display each log message
+    if (data.logs && Array.isArray(data.logs)) {
+      data.logs.forEach(log => {
+        appendMessage(log.message, log.type || 'info'); // Use type from log or default to 'info'
+      });
+    }
+
+    // Display the final status and result from the server
+    if (data.status && data.result) {
+      if (data.status === 'success') {
+        // Format the final result with a header and footer for clarity
+        const finalResultHtml = `</span><p>${data.result}</p>`;
+        appendMessage(finalResultHtml, 'flex items-start gap-2');
+      } else {
+        appendMessage(`Result: ${data.result}`, 'error flex items-start gap-2');
+      }
+    } else {
+      appendMessage(`Error: Server returned valid JSON but missing 'status' or 'result' fields.`, 'error flex items-start gap-2');
+    }
+  };
+
+  // Renders one finished agent step: its actions, URL, duration, thought and thumbnail.
+  const showStep = (step) => {
+    const wrapper = document.createElement('div');
+    wrapper.className = 'report-item step-item';
+
+    const title = document.createElement('strong');
+    const actions = step.actions.map(action => action.name).join(', ') || 'No action';
+    const duration = step.duration_seconds != null ? ` (${step.duration_seconds.toFixed(1)}s)` : '';
+    title.textContent = `Step ${step.step}: ${actions}${duration}`;
+    wrapper.appendChild(title);
+
+    if (step.thought) {
+      const thought = document.createElement('span');
+      thought.textContent = step.thought;
+      wrapper.appendChild(thought);
+    }
+    if (step.error) {
+      const error = document.createElement('span');
+      error.className = 'error-text';
+      error.textContent = step.error;
+      wrapper.appendChild(error);
+    }
+    if (step.url) {
+      const url = document.createElement('span');
+      url.className = 'step-meta';
+      url.textContent = step.url;
+      wrapper.appendChild(url);
+    }
+    if (step.thumbnail_jpeg) {
+      const thumbnail = document.createElement('img');
+      thumbnail.className = 'step-thumbnail';
+      thumbnail.src = `data:image/jpeg;base64,${step.thumbnail_jpeg}`;
+      thumbnail.alt = `Step ${step.step}`;
+      wrapper.appendChild(thumbnail);
+    }
+
+    resultMsg.appendChild(wrapper);
+    resultMsg.scrollTop = resultMsg.scrollHeight; // Scroll to bottom
+  };
+
+  // Reads a text/event-stream response, calling onEvent(name, data) for each event.
+  const readEventStream = async (response, onEvent) => {
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += value;
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let name = 'message';
+        const dataLines = [];
+        block.split('\n').forEach(line => {
+          if (line.startsWith('event:')) name = line.slice(6).trim();
+          else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+        });
+        // Lines starting with ':' are keep-alive comments and carry no data.
+        if (dataLines.length > 0) onEvent(name, JSON.parse(dataLines.join('\n')));
+      }
+    }
+  };
+
+  // Aborts the running request; the server cancels the agent run when the stream closes.
+  let runController = null;
+  cancelBtn.addEventListener('click', () => {
+    if (runController) runController.abort();
+  });
+
   // Listener for the submit button
   submitBtn.addEventListener('click', async () => {
     // Clear previous results and disable button
@@ -126,57 +220,51 @@ document.addEventListener('DOMContentLoaded', () => {
       return;
     }
 
+    runController = new AbortController();
+    cancelBtn.classList.remove('hidden');
     try {
       // Get the URL of the currently active tab to send to the server
       const [tab] = await chrome.tabs.query({ active: true, currentWindow: true });
 
-      // Send the prompt and URL to the local server
-      const serverResponse = await fetch('http://localhost:8000/run-test', {
+      // Send the prompt and URL to the local server; each agent step is streamed back as it finishes.
+      const serverResponse = await fetch('http://localhost:8000/run-test/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ prompt: promptText, url: tab.url }),
+        signal: runController.signal,
       });
 
-      const responseText = await serverResponse.text();
+      if (!serverResponse.ok) {
+        const error = await serverResponse.json().catch(() => ({}));
+        appendMessage(`Error: ${error.detail || serverResponse.statusText}`, 'error flex items-start gap-2');
+        return;
+      }
 
-      // Check for specific agent failure messages first.
-      if (responseText.includes('Stopping due to 3 consecutive failures')) {
-        appendMessage(responseText, 'error flex items-start gap-2');
-      } else if (responseText.includes('API call failed')) {
-        appendMessage(responseText, 'error flex items-start gap-2');
-      } else {
-        try {
-          const data = JSON.parse(responseText);
-          // If the server provides a 'logs' array, display each log message
-          if (data.logs && Array.isArray(data.logs)) {
-            data.logs.forEach(log => {
-              appendMessage(log.message, log.type || 'info'); // Use type from log or default to 'info'
-            });
-          }
-          
-          // Display the final status and result from the server
-          if (data.status && data.result) {
-            if (data.status === 'success') {
-              // Format the final result with a header and footer for clarity
-              const finalResultHtml = `</span><p>${data.result}</p>`;
-              appendMessage(finalResultHtml, 'flex items-start gap-2');
-            } else {
-              appendMessage(`Result: ${data.result}`, 'error flex items-start gap-2');
-            }
-          } else {
-            appendMessage(`Error: Server returned valid JSON but missing 'status' or 'result' fields.`, 'error flex items-start gap-2');
-          }
-          
-        } catch (jsonError) {
-          // Handle cases where the response is not the specific error and not valid JSON.
-          appendMessage(`Error: Unexpected non-JSON response from server.`, 'error flex items-start gap-2');
+      let finished = false;
+      await readEventStream(serverResponse, (event, data) => {
+        if (event === 'queued' && data.status === 'queued') {
+          appendMessage('Waiting for a free browser...', 'info');
+        } else if (event === 'step') {
+          showStep(data);
+        } else if (event === 'result') {
+          finished = true;
+          showFinalResult(data);
         }
+      });
+      if (!finished) {
+        appendMessage('Error: The server closed the connection before the run finished.', 'error flex items-start gap-2');
       }
     } catch (error) {
-      appendMessage(`Error: ${error.message}. Is the local server running?`, 'error');
-      console.error('Error communicating with the server:', error);
+      if (error.name === 'AbortError') {
+        appendMessage('Test run cancelled.', 'error');
+      } else {
+        appendMessage(`Error: ${error.message}. Is the local server running?`, 'error');
+        console.error('Error communicating with the server:', error);
+      }
     } finally {
       // Re-enable the button
+      runController = null;
+      cancelBtn.classList.add('hidden');
       submitBtn.disabled = false;
     }
   });
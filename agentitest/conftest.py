@@ -1,30 +1,37 @@
 from __future__ import annotations
 
-import asyncio
-import base64
-import binascii
+import time
+
+# Taken before the remaining imports so the startup report includes them.
+CONFTEST_IMPORT_STARTED: float = time.perf_counter()
+
 import logging
 import os
 import sys
+import weakref
 from importlib.metadata import version
-import time
 from typing import TYPE_CHECKING, Any
 
-from agent_runner import run_agent_task
-import allure
 import pytest
-from browser_use import (
-    Agent,
-    BrowserProfile,
-    BrowserSession,
-    ChatGoogle,
-)
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright, Error as PlaywrightError
+from screenshot_writer import ScreenshotWriter
 
+# browser_use, Playwright, Allure and the agent runner (with prometheus_client
+# and psutil behind it) are slow to import, so they are only imported inside the
+# fixtures and hooks that need them. This keeps collection and `pytest --co` fast.
 if TYPE_CHECKING:
     from collections.abc import AsyncGenerator
 
+    from browser_use import Agent, BrowserProfile, BrowserSession
+    from llm_client import GovernedLLM
+    from resource_policy import ResourcePolicy
+    from session_pool import BrowserSessionPool
+    from step_reporter import StepReporter
+
+
+# suite_scheduler orders tests from their run history (last failures first,
+# then longest first); incremental skips unchanged tests with --incremental.
+pytest_plugins = ("suite_scheduler", "incremental")
 
 # Load environment variables from .env file
 load_dotenv()
@@ -41,25 +48,93 @@ if FLEXI_ROOT not in sys.path:
 
 LLM_TEMPERATURE = 0.2
 
+# Writes step screenshots to disk in the background (see screenshot_writer.py).
+screenshot_writer = ScreenshotWriter.from_env(os.path.join(PROJECT_ROOT, "screenshots"))
+
+
+def pytest_sessionfinish(session: pytest.Session, exitstatus: int) -> None:
+    """Waits for queued screenshots to reach the disk before pytest exits."""
+    screenshot_writer.close()
+
+
+# --- Startup Time Measurement ---
+
+_startup_timings: dict[str, float] = {}
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addini(
+        "startup_budget_seconds",
+        help="Warn when conftest import plus collection takes longer than this.",
+        default="5",
+    )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.addinivalue_line(
+        "markers",
+        "allow_resources(types=(), domains=()): resource types and domains this test must load "
+        "despite the resource-blocking policy",
+    )
+    _startup_timings["conftest_import"] = time.perf_counter() - CONFTEST_IMPORT_STARTED
+    _startup_timings["configured_at"] = time.perf_counter()
+
+
+def pytest_collection_finish(session: pytest.Session) -> None:
+    _startup_timings["collection"] = time.perf_counter() - _startup_timings["configured_at"]
+
+
+def pytest_terminal_summary(terminalreporter: Any, config: pytest.Config) -> None:
+    """Reports how long startup took, so slow imports or collection get noticed."""
+    if "collection" not in _startup_timings:
+        return
+    total = _startup_timings["conftest_import"] + _startup_timings["collection"]
+    budget = float(config.getini("startup_budget_seconds"))
+    line = (
+        f"startup: {total:.2f}s (conftest import {_startup_timings['conftest_import']:.2f}s, "
+        f"collection {_startup_timings['collection']:.2f}s, budget {budget:.0f}s)"
+    )
+    terminalreporter.write_line(line, red=total > budget, yellow=total <= budget)
+
+
 # --- Fixtures for Setup and Configuration ---
 
 
+def _probe_browser_version(browser_type_name: str) -> str:
+    """Launches the browser once just to read its version string."""
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as p:
+        browser = p[browser_type_name].launch()
+        try:
+            return browser.version
+        finally:
+            browser.close()
+
+
 @pytest.fixture(scope="session")
-def browser_version_info(browser_profile: BrowserProfile) -> dict[str, str]:
-    """Fixture to get Playwright and browser version info."""
+def browser_version_info(
+    request: pytest.FixtureRequest, browser_profile: BrowserProfile
+) -> dict[str, str]:
+    """Fixture to get Playwright and browser version info.
+
+    Launching a browser only to read its version is slow, so the result is
+    cached in pytest's cache directory, keyed by Playwright version and channel.
+    """
     try:
-        with sync_playwright() as p:
-            playwright_version: str = version("playwright")
-            browser_type_name: str = (
-                browser_profile.channel if browser_profile.channel else "chromium"
-            )
-            browser = p[browser_type_name].launch()
-            browser_version: str = browser.version
-            browser.close()
-            return {
-                "playwright_version": playwright_version,
-                "browser_version": f"{browser_type_name} {browser_version}",
-            }
+        playwright_version: str = version("playwright")
+        browser_type_name: str = (
+            browser_profile.channel if browser_profile.channel else "chromium"
+        )
+        cache_key = f"agentitest/browser_version/{playwright_version}/{browser_type_name}"
+        browser_version: str | None = request.config.cache.get(cache_key, None)
+        if browser_version is None:
+            browser_version = _probe_browser_version(browser_type_name)
+            request.config.cache.set(cache_key, browser_version)
+        return {
+            "playwright_version": playwright_version,
+            "browser_version": f"{browser_type_name} {browser_version}",
+        }
     except Exception as e:
         logger.warning(f"Could not determine Playwright/browser version: {e}")
         return {
@@ -69,17 +144,16 @@ def browser_version_info(browser_profile: BrowserProfile) -> dict[str, str]:
 
 
 @pytest.fixture(scope="session", autouse=True)
-def allure_environment(
-    request: pytest.FixtureRequest,
-    browser_version_info: dict[str, str],
-) -> None:
+def allure_environment(request: pytest.FixtureRequest) -> None:
     """Fixture to write environment details to a properties file for reporting.
     This runs once per session and is automatically used.
     By default, this creates `environment.properties` for Allure.
+    The browser version probe only runs when Allure output is enabled.
     """
-    allure_dir: str | None = request.config.getoption("--alluredir")
+    allure_dir: str | None = request.config.getoption("--alluredir", None)
     if not allure_dir:
         return
+    browser_version_info: dict[str, str] = request.getfixturevalue("browser_version_info")
 
     ENVIRONMENT_PROPERTIES_FILENAME: str = "environment.properties"
     properties_file: str = os.path.join(allure_dir, ENVIRONMENT_PROPERTIES_FILENAME)
@@ -105,152 +179,102 @@ def allure_environment(
 
 
 @pytest.fixture
-async def llm() -> ChatGoogle:
-    """Function-scoped fixture to initialize the language model."""
+async def llm() -> GovernedLLM:
+    """Function-scoped fixture returning the session's shared, rate-governed model.
+
+    All tests in the process share one client, so concurrent agents are
+    throttled and retried together (see llm_client.py).
+    """
+    from llm_client import get_llm
+
     DEFAULT_MODEL: str = "gemini-2.5-pro"
     model_name: str = os.getenv("GEMINI_MODEL", DEFAULT_MODEL)
-    # Configure retry mechanism for API calls to handle transient errors like 503
-    retry_config = {
-        "max_retries": 5,  # Maximum number of retries
-        "initial_delay": 2,  # Initial delay in seconds
-        "backoff_factor": 2,  # Multiplier for delay (e.g., 2s, 4s, 8s, ...)
-    }
-    return ChatGoogle(
-        model=model_name,
-        temperature=LLM_TEMPERATURE,
-        api_key=os.getenv("GEMINI_API_KEY"),
-        retry_config=retry_config,
-    )
+    return get_llm(model_name, temperature=LLM_TEMPERATURE)
 
 
 @pytest.fixture(scope="session")
 def browser_profile() -> BrowserProfile:
     """Session-scoped fixture for browser profile configuration."""
+    from browser_use import BrowserProfile
+
     headless_mode: bool = os.getenv("HEADLESS", "True").lower() in ("true", "1", "t")
     return BrowserProfile(headless=headless_mode, keep_alive=True)
 
 
-@pytest.fixture
-async def browser_session(
+@pytest.fixture(scope="session")
+async def browser_pool(
     browser_profile: BrowserProfile,
-) -> AsyncGenerator[BrowserSession, None]:
-    """Function-scoped fixture to manage the browser session's lifecycle."""
-    session: BrowserSession = BrowserSession(browser_profile=browser_profile)
-    await session.start()
+) -> AsyncGenerator[BrowserSessionPool, None]:
+    """Session-scoped browser owned by this process (one per xdist worker)."""
+    from session_pool import BrowserSessionPool
+
+    pool = BrowserSessionPool(browser_profile, min_size=1, max_size=1)
+    await pool.start()
     try:
-        yield session
+        yield pool
     finally:
-        # Ensure proper cleanup of any pending tasks
-        await asyncio.sleep(0.1)  # Allow pending operations to complete
-        for task in asyncio.all_tasks():
-            if not task.done() and 'aiohttp' in str(task):
-                task.cancel()
-        await session.stop()
-        # Force close any remaining connections
-        if hasattr(session, '_client_session'):
-            await session._client_session.close()
+        await pool.close()
+
+
+@pytest.fixture(scope="session")
+def resource_policy() -> ResourcePolicy | None:
+    """Session-scoped resource-blocking policy from the ``RESOURCE_*`` variables."""
+    from resource_policy import ResourcePolicy
+
+    return ResourcePolicy.from_env()
+
+
+@pytest.fixture
+async def browser_session(
+    request: pytest.FixtureRequest,
+    browser_pool: BrowserSessionPool,
+    resource_policy: ResourcePolicy | None,
+) -> AsyncGenerator[BrowserSession, None]:
+    """Function-scoped fixture handing each test a clean session.
+
+    The browser itself is shared for the whole session; between tests its
+    cookies, site storage and extra tabs are cleared so tests stay isolated.
+    Requests the resource policy blocks are failed, except for what the
+    test's ``allow_resources`` marker lets through. With NETWORK_ARCHIVE_MODE
+    the test's traffic is recorded to, or replayed from, its own HAR file.
+    """
+    from agent_runner import intercept_network
+
+    policy = resource_policy
+    marker = request.node.get_closest_marker("allow_resources")
+    if policy is not None and marker is not None:
+        policy = policy.allowing(marker.kwargs.get("types", ()), marker.kwargs.get("domains", ()))
+
+    async with browser_pool.acquire() as session:
+        async with intercept_network(session, policy, archive_key=request.node.nodeid) as blocked:
+            yield session
+    if blocked is not None and blocked.requests:
+        import allure
+
+        allure.attach(
+            blocked.summary(),
+            name="Blocked Resources",
+            attachment_type=allure.attachment_type.TEXT,
+        )
 
 
 # --- Allure Hook for Step-by-Step Reporting ---
 
 
+_step_reporters: weakref.WeakKeyDictionary[Agent, StepReporter] = weakref.WeakKeyDictionary()
+
+
 async def record_step(agent: Agent) -> None:
-    """Hook function that captures and records agent activity at each step."""
-    history = agent.history
+    """Hook function that captures and records agent activity at each step.
+
+    Writes every step to the report right away. Runs that can flush at the end
+    should pass their own ``StepReporter(screenshot_writer)`` as the hook
+    instead, which batches the report writes (see step_reporter.py).
+    """
+    from step_reporter import StepReporter
+
+    reporter = _step_reporters.get(agent)
+    if reporter is None:
+        reporter = _step_reporters[agent] = StepReporter(screenshot_writer, flush_every=1)
+    await reporter.record(agent)
 
-    last_action: dict[str, Any] = (
-        history.model_actions()[-1] if history.model_actions() else {}
-    )
-    action_name: str = next(iter(last_action)) if last_action else "No action"
-    action_params: dict[str, Any] = last_action.get(action_name, {})
-    step_title: str = f"Action: {action_name}"
-    param_str: str = ", ".join(f"{k}={v}" for k, v in action_params.items())
-    if param_str:
-        step_title += f"({param_str})"
-
-    with allure.step(step_title):
-        thoughts = history.model_thoughts()
-        if thoughts:
-            allure.attach(
-                str(thoughts[-1]),
-                name="Agent Thoughts",
-                attachment_type=allure.attachment_type.TEXT,
-            )
-
-        url: str | None = history.urls()[-1] if history.urls() else "N/A"
-        allure.attach(url, name="URL", attachment_type=allure.attachment_type.TEXT)
-
-        last_history_item = history.history[-1] if history.history else None
-        if last_history_item and last_history_item.metadata:
-            duration: float = last_history_item.metadata.duration_seconds
-            allure.attach(
-                f"{duration:.2f}s",
-                name="Step Duration",
-                attachment_type=allure.attachment_type.TEXT,
-            )
-
-        # Attach Screenshot
-        try:
-            screenshot_b64 = await agent.browser_session.take_screenshot()
-            if screenshot_b64:
-                # Validate base64 string before decoding
-                if isinstance(screenshot_b64, bytes):
-                    # If it's already bytes, use it directly
-                    screenshot_bytes: bytes | None = screenshot_b64
-                elif is_valid_base64(screenshot_b64):
-                    # If it's a valid base64 string, decode it
-                    screenshot_bytes = base64.b64decode(screenshot_b64)
-                else:
-                    logger.warning("Invalid base64 padding in screenshot data")
-                    screenshot_bytes = None
-
-                if screenshot_bytes:
-                    allure.attach(
-                        screenshot_bytes,
-                        name="Screenshot",
-                        attachment_type=allure.attachment_type.PNG,
-                    )
-                    # Save screenshot to a local file
-                    try:
-                        screenshot_dir = os.path.join(PROJECT_ROOT, "screenshots")
-                        os.makedirs(screenshot_dir, exist_ok=True)
-                        # Generate a unique filename with a timestamp
-                        timestamp = int(time.time() * 1000)
-                        step_num = len(history.model_actions())
-                        filename = f"step_{step_num}_{timestamp}.png"
-                        filepath = os.path.join(screenshot_dir, filename)
-                        with open(filepath, "wb") as f:
-                            f.write(screenshot_bytes)
-                    except Exception as e:
-                        logger.warning(f"Failed to save screenshot to file: {e}")
-        except PlaywrightError as e:
-            # This can happen if the page is closed before the screenshot is taken,
-            # which is common on the final step of an agent's task.
-            if "No target with given id found" in str(e):
-                logger.warning("Could not take screenshot: Page was already closed.")
-        except Exception as e:
-            logger.warning(f"Failed to take or attach screenshot: {e}")
-
-
-# --- Utility Function for Base64 Validation ---
-
-
-def is_valid_base64(s: Any) -> bool:
-    """Check if a string or bytes is a valid base64 encoded data."""
-    try:
-        # If it's already bytes, try to decode it directly
-        if isinstance(s, bytes):
-            base64.b64decode(s, validate=True)
-            return True
-
-        # If it's a string, check if length is multiple of 4 and try to decode
-        if isinstance(s, str):
-            # Check if length is multiple of 4
-            if len(s) % 4 != 0:
-                return False
-            base64.b64decode(s, validate=True)
-            return True
-
-        return False
-    except binascii.Error:
-        return False
@@ -0,0 +1,223 @@
+"""Pytest plugin that skips agent tests whose pages have not changed.
+
+With ``--incremental``, each agent test's target pages are fingerprinted
+before it runs, without the agent: by ``ETag`` or ``Last-Modified`` when the
+server sends one, otherwise by a hash of the HTML with scripts, styles,
+comments and per-request tokens removed. A test that passed before is
+reported as ``cached`` instead of run when its page fingerprints and its
+definition is unchanged, and the last pass is younger than
+``--incremental-max-age``. The definition covers the test's source and
+parameters, the fixtures it uses, the agent runner and LLM client modules
+(which build the prompt and the model) and the ``GEMINI_MODEL`` setting.
+
+A test's pages are its class's ``BASE_URL`` plus any listed with
+``@pytest.mark.pages(url, ...)``, relative to ``BASE_URL`` unless absolute.
+Passing runs are stored in the pytest cache; a failure or a changed
+fingerprint means the test runs again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import inspect
+import logging
+import os
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+logger = logging.getLogger(__name__)
+
+RESULTS_KEY = "agentitest/incremental"
+FETCH_TIMEOUT_SECONDS = 10
+USER_AGENT = "Mozilla/5.0 (compatible; agentitest-incremental)"
+# Modules that turn a test's task into the agent's prompt and model calls; a
+# change to either can change the outcome of every test.
+DEFINITION_MODULES = ("agent_runner.py", "llm_client.py")
+DEFINITION_SETTINGS = ("GEMINI_MODEL",)
+
+# Parts of a page that change on every request without the page changing.
+_VOLATILE_HTML = [
+    re.compile(r"<script\b.*?</script>", re.DOTALL | re.IGNORECASE),
+    re.compile(r"<style\b.*?</style>", re.DOTALL | re.IGNORECASE),
+    re.compile(r"<noscript\b.*?</noscript>", re.DOTALL | re.IGNORECASE),
+    re.compile(r"<!--.*?-->", re.DOTALL),
+    re.compile(r"<meta\b[^>]*(csrf|nonce)[^>]*>", re.IGNORECASE),
+    re.compile(r'\s(nonce|data-csrf[\w-]*)="[^"]*"', re.IGNORECASE),
+    re.compile(r"<time\b[^>]*>.*?</time>", re.DOTALL | re.IGNORECASE),
+]
+_WHITESPACE = re.compile(r"\s+")
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("incremental", "incremental agent test runs")
+    group.addoption(
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="Skip tests that passed before when their pages and definition are unchanged.",
+    )
+    group.addoption(
+        "--incremental-max-age",
+        type=float,
+        default=168.0,
+        metavar="HOURS",
+        help="Re-run a cached test once its last pass is older than this (default: 168).",
+    )
+
+
+def normalize_html(html: str) -> str:
+    """Strips the parts of a page that change between requests for the same content."""
+    for pattern in _VOLATILE_HTML:
+        html = pattern.sub("", html)
+    return _WHITESPACE.sub(" ", html).strip()
+
+
+def fingerprint_page(url: str) -> str | None:
+    """Cheap fingerprint of a page's content, or None if it could not be fetched."""
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    try:
+        with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT_SECONDS) as response:
+            etag = response.headers.get("ETag")
+            if etag:
+                return f"etag:{etag}"
+            last_modified = response.headers.get("Last-Modified")
+            if last_modified:
+                return f"last-modified:{last_modified}"
+            charset = response.headers.get_content_charset() or "utf-8"
+            html = response.read().decode(charset, errors="replace")
+    except (urllib.error.URLError, TimeoutError, ValueError) as e:
+        logger.warning(f"Could not fingerprint {url}: {e}")
+        return None
+    return "sha256:" + hashlib.sha256(normalize_html(html).encode()).hexdigest()
+
+
+def target_pages(item: pytest.Item) -> list[str]:
+    pages: list[str] = []
+    base_url = getattr(getattr(item, "cls", None), "BASE_URL", None)
+    if base_url:
+        pages.append(base_url)
+    for marker in item.iter_markers("pages"):
+        for url in marker.args:
+            url = urllib.parse.urljoin(base_url, url) if base_url else url
+            if url not in pages:
+                pages.append(url)
+    return pages
+
+
+@cache
+def _module_source(filename: str) -> bytes:
+    try:
+        return (Path(__file__).parent / filename).read_bytes()
+    except OSError:
+        return b""
+
+
+def definition_hash(item: pytest.Item) -> str:
+    """Hash of what the test does: its code, its fixtures, the agent runner and the model settings."""
+    digest = hashlib.sha256(item.nodeid.encode())
+    sources = [getattr(item, "function", None)]
+    sources.extend(cls for cls in getattr(getattr(item, "cls", None), "__mro__", ()) if cls is not object)
+    fixture_info = getattr(item, "_fixtureinfo", None)
+    for name in getattr(fixture_info, "names_closure", ()):
+        for fixture_def in fixture_info.name2fixturedefs.get(name, ()):
+            sources.append(fixture_def.func)
+    for obj in sources:
+        try:
+            digest.update(inspect.getsource(obj).encode())
+        except (OSError, TypeError):
+            continue
+    for filename in DEFINITION_MODULES:
+        digest.update(_module_source(filename))
+    digest.update(repr([os.getenv(name) for name in DEFINITION_SETTINGS]).encode())
+    callspec = getattr(item, "callspec", None)
+    if callspec is not None:
+        digest.update(repr(sorted(callspec.params.items())).encode())
+    return digest.hexdigest()
+
+
+class IncrementalRunner:
+    """Skips unchanged tests and remembers the fingerprints of passing ones."""
+
+    def __init__(self, config: pytest.Config) -> None:
+        self.config = config
+        self.max_age_seconds = config.getoption("incremental_max_age") * 3600
+        self.previous: dict[str, dict[str, Any]] = config.cache.get(RESULTS_KEY, {})
+        self.fingerprints: dict[str, str | None] = {}  # Per URL, fetched once per process
+        self.outcomes: dict[str, dict[str, Any]] = {}
+
+    def _fingerprint(self, url: str) -> str | None:
+        if url not in self.fingerprints:
+            self.fingerprints[url] = fingerprint_page(url)
+        return self.fingerprints[url]
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_setup(self, item: pytest.Item) -> None:
+        # Runs before any fixture, so a cached test never acquires a browser or the LLM.
+        pages = target_pages(item)
+        if not pages:
+            return
+        fingerprints = {url: self._fingerprint(url) for url in pages}
+        if None in fingerprints.values():
+            return
+        definition = definition_hash(item)
+        # The controller stores these on a pass (see pytest_runtest_logreport).
+        item.user_properties.append(("incremental_pages", fingerprints))
+        item.user_properties.append(("incremental_definition", definition))
+
+        last_pass = self.previous.get(item.nodeid)
+        if (
+            last_pass
+            and last_pass.get("definition") == definition
+            and last_pass.get("pages") == fingerprints
+            and time.time() - last_pass.get("passed_at", 0) < self.max_age_seconds
+        ):
+            item.user_properties.append(("incremental", "cached"))
+            passed_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(last_pass["passed_at"]))
+            pytest.skip(f"cached: pages and test unchanged since the pass at {passed_at}")
+
+    def pytest_runtest_logreport(self, report: pytest.TestReport) -> None:
+        # With xdist this runs on the controller for the reports of all workers.
+        properties = dict(report.user_properties)
+        outcome = self.outcomes.setdefault(report.nodeid, {"failed": False, "passed": False})
+        outcome["failed"] = outcome["failed"] or report.failed
+        if report.when == "call" and report.passed and "incremental_pages" in properties:
+            outcome.update(
+                passed=True,
+                pages=properties["incremental_pages"],
+                definition=properties["incremental_definition"],
+            )
+
+    def pytest_report_teststatus(self, report: pytest.TestReport) -> tuple[str, str, str] | None:
+        if report.skipped and dict(report.user_properties).get("incremental") == "cached":
+            return "cached", "c", "CACHED"
+        return None
+
+    def pytest_sessionfinish(self) -> None:
+        if hasattr(self.config, "workerinput") or not self.outcomes:
+            return
+        results = self.config.cache.get(RESULTS_KEY, {})
+        for nodeid, outcome in self.outcomes.items():
+            if outcome["failed"]:
+                results.pop(nodeid, None)
+            elif outcome["passed"]:
+                results[nodeid] = {
+                    "pages": outcome["pages"],
+                    "definition": outcome["definition"],
+                    "passed_at": time.time(),
+                }
+        self.config.cache.set(RESULTS_KEY, results)
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.addinivalue_line("markers", "pages(*urls): extra pages fingerprinted by --incremental")
+    # The cache is missing when run with -p no:cacheprovider.
+    if config.getoption("incremental") and getattr(config, "cache", None) is not None:
+        config.pluginmanager.register(IncrementalRunner(config), "agentitest-incremental")
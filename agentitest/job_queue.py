@@ -0,0 +1,256 @@
+"""Bounded job scheduler for agent runs.
+
+Requests are queued instead of being run inline, at most ``max_concurrency``
+run at once, and submissions are rejected once ``max_queued`` jobs are waiting.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections.abc import AsyncIterator
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Awaitable, Callable
+
+from telemetry import QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+
+class QueueFullError(Exception):
+    """Raised by ``JobScheduler.submit`` when the queue is at capacity."""
+
+
+@dataclass
+class Job:
+    """A queued agent run and its outcome."""
+
+    payload: dict[str, Any]
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    result: Any = None
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    details: dict[str, Any] = field(default_factory=dict)  # Extra fields for the response, e.g. browser memory
+    events: list[dict[str, Any]] = field(default_factory=list, repr=False)
+    _done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _task: asyncio.Task | None = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    async def wait(self) -> Job:
+        """Waits until the job has finished, failed or been cancelled."""
+        await self._done.wait()
+        return self
+
+    def publish(self, event: dict[str, Any]) -> None:
+        """Adds a progress event (e.g. a finished agent step) for ``stream`` listeners."""
+        self.events.append(event)
+        self._notify()
+
+    async def stream(self, heartbeat: float | None = None) -> AsyncIterator[dict[str, Any] | None]:
+        """Yields the job's events, past and new, until it has finished.
+
+        With ``heartbeat``, yields ``None`` after that many seconds without an
+        event, so a streaming response can keep its connection alive.
+        """
+        sent = 0
+        while True:
+            while sent < len(self.events):
+                yield self.events[sent]
+                sent += 1
+            if self.finished:
+                return
+            try:
+                await asyncio.wait_for(self._changed.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+    def _notify(self) -> None:
+        # Swap the event so every waiter wakes once and then waits on a fresh one.
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status.value,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+    def _finish(self, status: JobStatus, result: Any = None, error: str | None = None) -> None:
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        self._done.set()
+        self._notify()
+
+
+_current_job: ContextVar[Job | None] = ContextVar("agentitest_current_job", default=None)
+
+
+def current_job() -> Job | None:
+    """The job whose runner is executing, so it can publish progress events."""
+    return _current_job.get()
+
+
+class JobScheduler:
+    """Runs submitted jobs on a fixed number of worker tasks."""
+
+    def __init__(
+        self,
+        runner: Callable[[dict[str, Any]], Awaitable[Any]],
+        max_concurrency: int = 2,
+        max_queued: int = 20,
+        retention_seconds: float = 3600.0,
+    ) -> None:
+        self.runner = runner
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+
+        self._jobs: dict[str, Job] = {}
+        # Unbounded: a cancelled job stays in the queue until a worker skips it,
+        # so the limit is enforced on ``_queued``, the jobs still waiting to run.
+        self._queue: asyncio.Queue[Job] = asyncio.Queue()
+        self._queued = 0
+        self._workers: list[asyncio.Task] = []
+
+    @classmethod
+    def from_env(cls, runner: Callable[[dict[str, Any]], Awaitable[Any]]) -> JobScheduler:
+        """Builds a scheduler configured by ``MAX_CONCURRENT_RUNS`` and ``MAX_QUEUED_RUNS``."""
+        return cls(
+            runner,
+            max_concurrency=int(os.getenv("MAX_CONCURRENT_RUNS", "2")),
+            max_queued=int(os.getenv("MAX_QUEUED_RUNS", "20")),
+            retention_seconds=float(os.getenv("JOB_RETENTION_SECONDS", "3600")),
+        )
+
+    async def start(self) -> None:
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.max_concurrency)
+        ]
+
+    async def close(self) -> None:
+        """Stops the workers and cancels everything still queued or running."""
+        for job in self._jobs.values():
+            if not job.finished:
+                self.cancel(job.id)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    # --- Public API ---
+
+    def submit(self, payload: dict[str, Any], job_id: str | None = None) -> Job:
+        """Queues a job, raising ``QueueFullError`` when the queue is full.
+
+        ``job_id`` keeps the id of a job claimed from a shared queue (see worker.py).
+        """
+        self._prune()
+        if self._queued >= self.max_queued:
+            raise QueueFullError(f"Too many queued runs ({self.max_queued}); try again later.")
+        job = Job(payload=payload) if job_id is None else Job(payload=payload, id=job_id)
+        self._queue.put_nowait(job)
+        self._queued += 1
+        self._jobs[job.id] = job
+        logger.info(f"Queued job {job.id} ({self._queued} waiting).")
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a queued or running job. Returns ``False`` if it had already finished."""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        if job._task is not None:
+            job._task.cancel()
+        else:
+            # Still queued: it frees its place now, and the worker skips it when it is dequeued.
+            job._finish(JobStatus.CANCELLED)
+            self._queued -= 1
+        return True
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status is JobStatus.RUNNING)
+
+    # --- Internals ---
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.finished:
+                    continue
+                self._queued -= 1
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = JobStatus.RUNNING
+        job.started_at = time.time()
+        QUEUE_WAIT.observe(job.started_at - job.created_at)
+        # The runner's task copies the context, so it sees its job via current_job().
+        token = _current_job.set(job)
+        try:
+            job._task = asyncio.create_task(self.runner(job.payload))
+        finally:
+            _current_job.reset(token)
+        try:
+            result = await job._task
+        except asyncio.CancelledError:
+            job._finish(JobStatus.CANCELLED)
+            # Re-raise only if the worker itself is being shut down.
+            if asyncio.current_task().cancelling():
+                raise
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}", exc_info=True)
+            job._finish(JobStatus.FAILED, error=str(e))
+        else:
+            job._finish(JobStatus.SUCCEEDED, result=result)
+        finally:
+            job._task = None
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at is not None and job.finished_at < cutoff
+        ]:
+            del self._jobs[job_id]
@@ -0,0 +1,457 @@
+"""Shared job queue for running agent jobs on separate worker processes.
+
+With ``JOB_QUEUE=sqlite`` the agent server no longer runs agents itself. It
+enqueues each request into a ``JobStore``, and ``worker.py`` processes (as
+many as there are browsers and cores to spare) claim jobs, heartbeat while
+they run them, and write back step events and results. ``JobCoordinator``
+gives the server the same interface as the in-process ``JobScheduler``, except
+that ``submit``, ``get`` and ``cancel`` are coroutines: they query the store
+off the event loop.
+
+A job whose worker stops heartbeating (the process died, or its host went
+away) is re-queued for another worker, up to ``JOB_MAX_ATTEMPTS`` times.
+
+``SQLiteJobStore`` is the bundled backend. It keeps the database in WAL mode,
+which needs shared memory, so the server and its workers must run on one
+machine and the file must not be on a network filesystem (NFS, SMB). Workers
+on other hosts need another backend implementing the ``JobStore`` protocol.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Protocol
+
+from job_queue import FINISHED_STATUSES, Job, JobScheduler, JobStatus, QueueFullError
+from telemetry import QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass
+class JobSnapshot:
+    """A job's stored state plus the events added after the last one seen."""
+
+    job: Job
+    events: list[tuple[int, dict[str, Any]]] = field(default_factory=list)
+
+
+class JobStore(Protocol):
+    def enqueue(self, payload: dict[str, Any], max_queued: int) -> Job:
+        """Adds a queued job, raising ``QueueFullError`` when ``max_queued`` are waiting."""
+
+    def get(self, job_id: str) -> Job | None: ...
+
+    def snapshots(self, last_seen: dict[str, int]) -> dict[str, JobSnapshot]:
+        """The state and new events (after the given sequence number) of these jobs."""
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a queued job, or asks its worker to cancel it; ``False`` if finished."""
+
+    def claim(self, worker_id: str) -> Job | None:
+        """Marks the oldest queued job as running on ``worker_id`` and returns it."""
+
+    def heartbeat(self, worker_id: str) -> list[str]:
+        """Renews the worker's jobs and returns the ids it has been asked to cancel."""
+
+    def add_events(self, job_id: str, events: list[dict[str, Any]]) -> None: ...
+
+    def finish(self, worker_id: str, job: Job) -> bool:
+        """Stores the job's outcome, unless it has since been taken from this worker."""
+
+    def release(self, worker_id: str, job_ids: list[str]) -> None:
+        """Hands unfinished jobs back to the queue (a worker shutting down)."""
+
+    def requeue_lost(self, heartbeat_timeout: float, max_attempts: int) -> int:
+        """Re-queues running jobs without a recent heartbeat; returns how many."""
+
+    def counts(self) -> dict[str, int]: ...
+
+    def prune(self, retention_seconds: float) -> None: ...
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    details TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    worker_id TEXT,
+    heartbeat_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_by_job ON job_events (job_id, seq);
+"""
+
+_JOB_COLUMNS = "id, payload, status, result, error, details, created_at, started_at, finished_at"
+
+
+def _job_from_row(row: tuple) -> Job:
+    job_id, payload, status, result, error, details, created_at, started_at, finished_at = row
+    return Job(
+        payload=json.loads(payload),
+        id=job_id,
+        status=JobStatus(status),
+        result=json.loads(result) if result is not None else None,
+        error=error,
+        details=json.loads(details),
+        created_at=created_at,
+        started_at=started_at,
+        finished_at=finished_at,
+    )
+
+
+class SQLiteJobStore:
+    """``JobStore`` in a SQLite database (WAL mode, one connection per call); single host only."""
+
+    def __init__(self, path: str, busy_timeout: float = 30.0) -> None:
+        self.path = path
+        self.busy_timeout = busy_timeout
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> SQLiteJobStore:
+        return cls(os.getenv("JOB_QUEUE_PATH", os.path.join(PROJECT_ROOT, ".jobs", "jobs.sqlite3")))
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit; writes that read first use BEGIN IMMEDIATE to take the lock up front.
+        return sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+
+    # --- Coordinator side ---
+
+    def enqueue(self, payload: dict[str, Any], max_queued: int) -> Job:
+        job = Job(payload=payload)
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                (waiting,) = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()
+                if waiting >= max_queued:
+                    raise QueueFullError(f"Too many queued runs ({max_queued}); try again later.")
+                db.execute(
+                    "INSERT INTO jobs (id, payload, status, created_at) VALUES (?, ?, ?, ?)",
+                    (job.id, json.dumps(payload), job.status.value, job.created_at),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with closing(self._connect()) as db:
+            row = db.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_from_row(row) if row else None
+
+    def snapshots(self, last_seen: dict[str, int]) -> dict[str, JobSnapshot]:
+        snapshots: dict[str, JobSnapshot] = {}
+        with closing(self._connect()) as db:
+            for job_id, after in last_seen.items():
+                row = db.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None:
+                    continue
+                events = db.execute(
+                    "SELECT seq, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                    (job_id, after),
+                ).fetchall()
+                snapshots[job_id] = JobSnapshot(
+                    job=_job_from_row(row), events=[(seq, json.loads(data)) for seq, data in events]
+                )
+        return snapshots
+
+    def cancel(self, job_id: str) -> bool:
+        now = time.time()
+        with closing(self._connect()) as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (now, job_id),
+            )
+            if cursor.rowcount:
+                return True
+            cursor = db.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)
+            )
+            return cursor.rowcount > 0
+
+    def counts(self) -> dict[str, int]:
+        with closing(self._connect()) as db:
+            return dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def prune(self, retention_seconds: float) -> None:
+        cutoff = time.time() - retention_seconds
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "DELETE FROM job_events WHERE job_id IN "
+                "(SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?)",
+                (cutoff,),
+            )
+            db.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,))
+            db.execute("COMMIT")
+
+    # --- Worker side ---
+
+    def claim(self, worker_id: str) -> Job | None:
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, worker_id = ?, heartbeat_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (now, worker_id, now, row[0]),
+            )
+            job_row = db.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (row[0],)).fetchone()
+            db.execute("COMMIT")
+        return _job_from_row(job_row)
+
+    def heartbeat(self, worker_id: str) -> list[str]:
+        with closing(self._connect()) as db:
+            db.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE worker_id = ? AND status = 'running'",
+                (time.time(), worker_id),
+            )
+            rows = db.execute(
+                "SELECT id FROM jobs WHERE worker_id = ? AND status = 'running' AND cancel_requested = 1",
+                (worker_id,),
+            ).fetchall()
+        return [job_id for (job_id,) in rows]
+
+    def add_events(self, job_id: str, events: list[dict[str, Any]]) -> None:
+        if not events:
+            return
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "INSERT INTO job_events (job_id, data) VALUES (?, ?)",
+                [(job_id, json.dumps(event, default=str)) for event in events],
+            )
+            db.execute("COMMIT")
+
+    def finish(self, worker_id: str, job: Job) -> bool:
+        with closing(self._connect()) as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, details = ?, finished_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (
+                    job.status.value,
+                    json.dumps(job.result, default=str),
+                    job.error,
+                    json.dumps(job.details, default=str),
+                    job.finished_at or time.time(),
+                    job.id,
+                    worker_id,
+                ),
+            )
+            return cursor.rowcount > 0
+
+    def release(self, worker_id: str, job_ids: list[str]) -> None:
+        with closing(self._connect()) as db:
+            db.executemany(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL, started_at = NULL, "
+                "attempts = attempts - 1 WHERE id = ? AND worker_id = ? AND status = 'running'",
+                [(job_id, worker_id) for job_id in job_ids],
+            )
+
+    def requeue_lost(self, heartbeat_timeout: float, max_attempts: int) -> int:
+        now = time.time()
+        cutoff = now - heartbeat_timeout
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            failed = db.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, "
+                "error = 'The worker running this job stopped responding ' || attempts || ' time(s).' "
+                "WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+                (now, cutoff, max_attempts),
+            ).rowcount
+            requeued = db.execute(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL, started_at = NULL "
+                "WHERE status = 'running' AND heartbeat_at < ?",
+                (cutoff,),
+            ).rowcount
+            db.execute("COMMIT")
+        if failed or requeued:
+            logger.warning(f"Re-queued {requeued} job(s) from unresponsive workers; gave up on {failed}.")
+        return requeued
+
+
+class JobCoordinator:
+    """The ``JobScheduler`` interface over a ``JobStore``; ``worker.py`` processes run the jobs.
+
+    Store calls block (on SQLite's busy timeout, for one), so ``submit``,
+    ``get`` and ``cancel`` run them in a thread and must be awaited. Jobs submitted here (or looked up by id) are mirrored locally, and a poll
+    loop copies their status and events from the store, so ``Job.wait()`` and
+    ``Job.stream()`` work as with the in-process scheduler.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        max_queued: int = 20,
+        retention_seconds: float = 3600.0,
+        poll_interval: float = 0.5,
+        heartbeat_timeout: float = 30.0,
+        max_attempts: int = 3,
+    ) -> None:
+        self.store = store
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self.poll_interval = poll_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self._jobs: dict[str, Job] = {}
+        self._last_event: dict[str, int] = {}
+        self._counts: dict[str, int] = {}
+        self._poller: asyncio.Task | None = None
+
+    @classmethod
+    def from_env(cls) -> JobCoordinator:
+        return cls(
+            SQLiteJobStore.from_env(),
+            max_queued=int(os.getenv("MAX_QUEUED_RUNS", "20")),
+            retention_seconds=float(os.getenv("JOB_RETENTION_SECONDS", "3600")),
+            heartbeat_timeout=float(os.getenv("JOB_HEARTBEAT_TIMEOUT_SECONDS", "30")),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        )
+
+    async def start(self) -> None:
+        self._poller = asyncio.create_task(self._poll_loop(), name="job-coordinator")
+
+    async def close(self) -> None:
+        """Stops polling. Queued and running jobs stay with the workers."""
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+        for job in self._jobs.values():
+            if not job.finished:
+                # Wake anyone still waiting on this process's mirror.
+                job._finish(JobStatus.CANCELLED, error="The server shut down.")
+
+    # --- Public API ---
+
+    async def submit(self, payload: dict[str, Any]) -> Job:
+        """Queues a job, raising ``QueueFullError`` when the queue is full."""
+        job = await asyncio.to_thread(self.store.enqueue, payload, self.max_queued)
+        self._watch(job)
+        logger.info(f"Queued job {job.id} for the workers.")
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is not None:
+                if job.finished:
+                    job._done.set()
+                self._watch(job)
+        return job
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancels a queued job, or asks its worker to. Returns ``False`` if it had already finished."""
+        return await asyncio.to_thread(self.store.cancel, job_id)
+
+    @property
+    def queued(self) -> int:
+        return self._counts.get(JobStatus.QUEUED.value, 0)
+
+    @property
+    def running(self) -> int:
+        return self._counts.get(JobStatus.RUNNING.value, 0)
+
+    # --- Internals ---
+
+    def _watch(self, job: Job) -> None:
+        self._jobs[job.id] = job
+        self._last_event.setdefault(job.id, 0)
+
+    async def _poll_loop(self) -> None:
+        last_maintenance = 0.0
+        while True:
+            try:
+                await self._sync()
+                if time.monotonic() - last_maintenance > self.heartbeat_timeout / 2:
+                    last_maintenance = time.monotonic()
+                    await asyncio.to_thread(self.store.requeue_lost, self.heartbeat_timeout, self.max_attempts)
+                    await asyncio.to_thread(self.store.prune, self.retention_seconds)
+                    self._prune()
+            except Exception as e:
+                logger.warning(f"Could not sync jobs with the queue: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _sync(self) -> None:
+        pending = {job_id: self._last_event[job_id] for job_id, job in self._jobs.items() if not job.finished}
+        self._counts = await asyncio.to_thread(self.store.counts)
+        if not pending:
+            return
+        snapshots = await asyncio.to_thread(self.store.snapshots, pending)
+        for job_id, snapshot in snapshots.items():
+            job = self._jobs[job_id]
+            for seq, event in snapshot.events:
+                job.publish(event)
+                self._last_event[job_id] = seq
+            stored = snapshot.job
+            if job.status is JobStatus.QUEUED and stored.status is JobStatus.RUNNING and stored.started_at:
+                QUEUE_WAIT.observe(stored.started_at - stored.created_at)
+            job.started_at = stored.started_at
+            job.details = stored.details
+            if stored.status in FINISHED_STATUSES:
+                job._finish(stored.status, result=stored.result, error=stored.error)
+                job.finished_at = stored.finished_at
+            else:
+                job.status = stored.status
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at is not None and job.finished_at < cutoff
+        ]:
+            del self._jobs[job_id]
+            self._last_event.pop(job_id, None)
+
+
+def new_worker_id() -> str:
+    """A worker id that says where the worker runs, e.g. ``host-1234-1a2b3c``."""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def scheduler_from_env(runner: Callable[[dict[str, Any]], Awaitable[Any]]) -> JobScheduler | JobCoordinator:
+    """The scheduler selected by ``JOB_QUEUE``: ``memory`` (default) runs jobs in this process."""
+    backend = os.getenv("JOB_QUEUE", "memory").lower()
+    if backend == "memory":
+        return JobScheduler.from_env(runner)
+    if backend == "sqlite":
+        return JobCoordinator.from_env()
+    raise ValueError(f"Unknown JOB_QUEUE {backend!r}; expected 'memory' or 'sqlite'")
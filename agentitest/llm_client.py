@@ -0,0 +1,276 @@
+"""Process-wide, rate-governed LLM client.
+
+Every agent in a process (the server's jobs, or all tests in a pytest worker)
+shares one ``ChatGoogle`` per model, and therefore one HTTP client, through
+``get_llm``. Calls pass through an ``LLMGovernor`` that:
+
+* limits requests and tokens per minute with token buckets,
+* caps calls in flight with an AIMD limit: +1 per window of successful calls,
+  halved when Gemini answers 429 or 503,
+* retries those responses with full-jitter exponential backoff, so agents that
+  were throttled together don't retry together.
+
+Limits apply per process and model, whatever the temperature; with xdist,
+divide the quota by the worker count.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import time
+import weakref
+from functools import cache
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+if TYPE_CHECKING:
+    from browser_use import ChatGoogle
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+LLM_TEMPERATURE = 0.2
+# Status codes that mean "slow down" rather than "this request is wrong".
+OVERLOAD_STATUS_CODES = (429, 503)
+
+
+def _status_code(error: BaseException) -> int | None:
+    # browser_use's ModelProviderError and google-genai's APIError carry the HTTP status.
+    for attribute in ("status_code", "code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+class _PerLoop:
+    """Creates an asyncio primitive lazily for each running event loop.
+
+    Governors live for the whole process, but a lock or condition belongs to
+    the loop that first uses it, so each ``asyncio.run`` (e.g. in benchmarks)
+    gets its own.
+    """
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self._factory = factory
+        self._objects: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any] = weakref.WeakKeyDictionary()
+
+    def get(self) -> Any:
+        loop = asyncio.get_running_loop()
+        primitive = self._objects.get(loop)
+        if primitive is None:
+            primitive = self._objects[loop] = self._factory()
+        return primitive
+
+
+class TokenBucket:
+    """Refills ``rate_per_minute`` units per minute, holding at most ``capacity``."""
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None) -> None:
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = _PerLoop(asyncio.Lock)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Waits until ``amount`` units are available and takes them. Returns the seconds waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        # Waiters queue on the lock, so units are handed out first come, first served.
+        async with self._lock.get():
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+    def adjust(self, amount: float) -> None:
+        """Takes (or returns, if negative) units after the fact; the balance may go into debt."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AdaptiveConcurrency:
+    """An AIMD limit on calls in flight."""
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 16,
+        decrease_factor: float = 0.5,
+        cooldown_seconds: float = 5.0,
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = _PerLoop(asyncio.Condition)
+
+    async def acquire(self) -> None:
+        condition = self._condition.get()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, overloaded: bool) -> None:
+        condition = self._condition.get()
+        async with condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if overloaded:
+                # Calls that were already in flight when the first 429 arrived
+                # report it too; count them as one congestion signal.
+                if now - self._last_decrease >= self.cooldown_seconds:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    logger.warning(f"LLM overloaded; concurrency limit lowered to {int(self.limit)}.")
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            condition.notify_all()
+
+
+class LLMGovernor:
+    """Applies the rate limits, adaptive concurrency and retries to each LLM call."""
+
+    def __init__(
+        self,
+        requests_per_minute: float = 60,
+        tokens_per_minute: float = 1_000_000,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        retry_base_delay: float = 2.0,
+        retry_max_delay: float = 60.0,
+        estimated_tokens: float = 4000,
+    ) -> None:
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.concurrency = AdaptiveConcurrency(initial=max_concurrency, maximum=max_concurrency * 4)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        # Running average of tokens per call, charged up front and corrected afterwards.
+        self.estimated_tokens = estimated_tokens
+
+    @classmethod
+    def from_env(cls) -> LLMGovernor:
+        """Builds a governor configured by the ``LLM_*`` environment variables (0 disables a limit)."""
+        return cls(
+            requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60")),
+            tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+            retry_base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "2")),
+        )
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: a random delay up to the exponential cap.
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2**attempt))
+
+    def _record_usage(self, response: Any, charged: float) -> None:
+        usage = getattr(response, "usage", None)
+        total = getattr(usage, "total_tokens", None)
+        if not total:
+            return
+        if self.tokens is not None:
+            self.tokens.adjust(total - charged)
+        self.estimated_tokens = 0.8 * self.estimated_tokens + 0.2 * total
+
+    async def call(self, invoke: Callable[[], Awaitable[Any]]) -> Any:
+        """Runs ``invoke`` under the limits, retrying on 429 and 503."""
+        attempt = 0
+        while True:
+            if self.requests is not None:
+                await self.requests.acquire()
+            charged = self.estimated_tokens
+            if self.tokens is not None:
+                await self.tokens.acquire(charged)
+
+            await self.concurrency.acquire()
+            overloaded = False
+            try:
+                response = await invoke()
+            except Exception as e:
+                overloaded = _status_code(e) in OVERLOAD_STATUS_CODES
+                if not overloaded or attempt >= self.max_retries:
+                    raise
+            finally:
+                await self.concurrency.release(overloaded)
+
+            if not overloaded:
+                self._record_usage(response, charged)
+                return response
+            delay = self._backoff(attempt)
+            attempt += 1
+            logger.warning(f"LLM call throttled; retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+
+
+class GovernedLLM:
+    """Wraps a browser_use chat model so every ``ainvoke`` goes through a governor.
+
+    All other attributes are delegated to the wrapped model.
+    """
+
+    def __init__(self, llm: Any, governor: LLMGovernor) -> None:
+        self._llm = llm
+        self.governor = governor
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._llm, name)
+
+    async def ainvoke(self, *args: Any, **kwargs: Any) -> Any:
+        return await self.governor.call(lambda: self._llm.ainvoke(*args, **kwargs))
+
+
+_clients: dict[tuple[str, float], GovernedLLM] = {}
+# One governor per model: clients with different temperatures share its quota.
+_governors: dict[str, LLMGovernor] = {}
+
+
+def get_llm(model: str | None = None, temperature: float = LLM_TEMPERATURE) -> GovernedLLM:
+    """Returns the process-wide governed client for ``model`` (default: ``GEMINI_MODEL``) at ``temperature``."""
+    model = model or os.getenv("GEMINI_MODEL", DEFAULT_MODEL)
+    key = (model, temperature)
+    client = _clients.get(key)
+    if client is None:
+        governor = _governors.get(model)
+        if governor is None:
+            governor = _governors[model] = LLMGovernor.from_env()
+        client = GovernedLLM(_create_chat_model(model, temperature), governor)
+        _clients[key] = client
+    return client
+
+
+def _create_chat_model(model: str, temperature: float) -> ChatGoogle:
+    from browser_use import ChatGoogle
+
+    settings: dict[str, Any] = {}
+    if "max_retries" in getattr(ChatGoogle, "__dataclass_fields__", {}):
+        # Throttling is retried by the governor; the model itself should not retry as well.
+        settings["max_retries"] = 0
+    llm = ChatGoogle(
+        model=model,
+        temperature=temperature,
+        api_key=os.getenv("GEMINI_API_KEY"),
+        **settings,
+    )
+    # ChatGoogle builds a new genai client (and connection pool) per call;
+    # keep the first one so all calls share its connections.
+    if hasattr(llm, "get_client"):
+        llm.get_client = cache(llm.get_client)
+    return llm
@@ -0,0 +1,149 @@
+"""On-disk cache of authenticated browser state, keyed by login URL and username.
+
+Logging in through the agent costs several LLM round-trips. Once a login has
+succeeded we keep its cookies and localStorage, seed later sessions with them,
+and only fall back to the agent login when a cheap probe says the state expired.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import TYPE_CHECKING, Any
+
+from browser_utils import apply_storage_state, capture_storage_state, evaluate, navigate
+
+if TYPE_CHECKING:
+    from browser_use import BrowserSession
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Evaluates to true when the page looks signed in: no visible password field and
+# no visible "Sign in"/"Log in" control. Override with LOGIN_PROBE_JS per site.
+DEFAULT_LOGIN_PROBE_JS = """
+(() => {
+  const visible = el => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+  if ([...document.querySelectorAll('input[type=password]')].some(visible)) return false;
+  const signIn = /^\\s*(sign|log)\\s*-?\\s*in\\s*$/i;
+  return ![...document.querySelectorAll('a, button')].some(
+    el => visible(el) && signIn.test(el.textContent || '')
+  );
+})()
+"""
+
+
+class LoginStateCache:
+    """Stores one storage-state JSON file per (login_url, username) pair."""
+
+    def __init__(self, cache_dir: str, ttl_seconds: float = 12 * 3600) -> None:
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+
+    @classmethod
+    def from_env(cls) -> LoginStateCache | None:
+        """Returns the configured cache, or ``None`` when ``LOGIN_CACHE`` is disabled."""
+        if os.getenv("LOGIN_CACHE", "true").lower() not in ("true", "1", "t"):
+            return None
+        return cls(
+            cache_dir=os.getenv("LOGIN_CACHE_DIR", os.path.join(PROJECT_ROOT, ".auth_cache")),
+            ttl_seconds=float(os.getenv("LOGIN_CACHE_TTL_SECONDS", str(12 * 3600))),
+        )
+
+    def _path(self, login_url: str, username: str) -> str:
+        key = hashlib.sha256(f"{login_url}\n{username}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, login_url: str, username: str) -> dict[str, Any] | None:
+        """Returns the cached storage state, or ``None`` if missing or past its TTL."""
+        path = self._path(login_url, username)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable login cache entry {path}: {e}")
+            return None
+        if time.time() - entry.get("saved_at", 0) > self.ttl_seconds:
+            self.invalidate(login_url, username)
+            return None
+        return entry.get("storage_state")
+
+    def save(self, login_url: str, username: str, storage_state: dict[str, Any]) -> None:
+        """Atomically writes the storage state; the file is readable by the owner only."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {
+            "login_url": login_url,
+            "username": username,
+            "saved_at": time.time(),
+            "storage_state": storage_state,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self._path(login_url, username))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def invalidate(self, login_url: str, username: str) -> None:
+        try:
+            os.remove(self._path(login_url, username))
+        except FileNotFoundError:
+            pass
+
+
+async def is_logged_in(session: BrowserSession) -> bool:
+    """Runs the login probe against the page currently open in the session."""
+    probe = os.getenv("LOGIN_PROBE_JS", DEFAULT_LOGIN_PROBE_JS)
+    try:
+        return bool(await evaluate(session, probe))
+    except Exception as e:
+        logger.warning(f"Login probe failed: {e}")
+        return False
+
+
+async def restore_login(
+    cache: LoginStateCache, session: BrowserSession, login_url: str, username: str
+) -> bool:
+    """Seeds the session from the cache and checks the state is still valid.
+
+    Leaves the session on ``login_url``. Returns ``False`` (and drops the entry)
+    on a miss or when the probe finds the page signed out.
+    """
+    state = cache.load(login_url, username)
+    if state is None:
+        return False
+    try:
+        await apply_storage_state(session, state)
+        await navigate(session, login_url)
+    except Exception as e:
+        logger.warning(f"Could not restore cached login state: {e}")
+        return False
+    if await is_logged_in(session):
+        logger.info(f"Reusing cached login for {username} at {login_url}.")
+        return True
+    logger.info(f"Cached login for {username} at {login_url} has expired.")
+    cache.invalidate(login_url, username)
+    return False
+
+
+async def remember_login(
+    cache: LoginStateCache, session: BrowserSession, login_url: str, username: str
+) -> None:
+    """Saves the session's storage state if the current page looks signed in."""
+    if not await is_logged_in(session):
+        return
+    try:
+        cache.save(login_url, username, await capture_storage_state(session))
+        logger.info(f"Cached login state for {username} at {login_url}.")
+    except Exception as e:
+        logger.warning(f"Could not cache login state: {e}")
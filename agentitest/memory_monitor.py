@@ -0,0 +1,125 @@
+"""Memory sampling for agent browser sessions.
+
+Renderer memory grows on heavy pages (the ck12 Flexi app in particular) and is
+not always given back when tabs close, so a long-running server slowly fills
+the machine. ``sample_session`` measures a session's Chromium process tree
+(the browser found by its remote-debugging port, plus every renderer and
+helper under it) and its open pages. ``MemoryLimits`` decides when a pooled
+session should be recycled between tasks.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlsplit
+
+import psutil
+from browser_utils import page_target_ids
+from prometheus_client import Counter, Histogram
+
+if TYPE_CHECKING:
+    from browser_use import BrowserSession
+
+logger = logging.getLogger(__name__)
+
+BROWSER_RSS = Histogram(
+    "agentitest_browser_rss_megabytes",
+    "Resident memory of a browser session's process tree, sampled after each run.",
+    buckets=(100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000),
+)
+BROWSER_RECYCLES = Counter(
+    "agentitest_browser_recycles_total",
+    "Pooled browser sessions replaced because they crossed a memory limit.",
+    ["reason"],
+)
+
+
+@dataclass(frozen=True)
+class MemorySample:
+    """A session's browser memory at one point in time; ``rss_mb`` is ``None`` if unmeasurable."""
+
+    rss_mb: float | None
+    processes: int
+    pages: int
+
+    def to_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        if self.rss_mb is not None:
+            data["rss_mb"] = round(self.rss_mb, 1)
+        return data
+
+
+@dataclass(frozen=True)
+class MemoryLimits:
+    """When to recycle a session; a zero limit is not enforced."""
+
+    max_rss_mb: float = 1500.0
+    max_pages: int = 10
+
+    @classmethod
+    def from_env(cls) -> MemoryLimits:
+        return cls(
+            max_rss_mb=float(os.getenv("BROWSER_MAX_RSS_MB", "1500")),
+            max_pages=int(os.getenv("BROWSER_MAX_PAGES", "10")),
+        )
+
+    def exceeded(self, sample: MemorySample) -> str | None:
+        """Which limit the sample crosses (``"rss"`` or ``"pages"``), if any."""
+        if self.max_rss_mb and sample.rss_mb is not None and sample.rss_mb > self.max_rss_mb:
+            return "rss"
+        if self.max_pages and sample.pages > self.max_pages:
+            return "pages"
+        return None
+
+
+def find_browser_pid(session: BrowserSession) -> int | None:
+    """The pid of the local Chromium serving the session, found by its debugging port."""
+    port = urlsplit(getattr(session, "cdp_url", None) or "").port
+    if port is None:
+        return None
+    flag = f"--remote-debugging-port={port}"
+    for process in psutil.process_iter(["cmdline"]):
+        try:
+            if flag in (process.info["cmdline"] or ()):
+                return process.pid
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return None
+
+
+def process_tree_memory(pid: int) -> tuple[float, int] | None:
+    """RSS in MB and number of processes of ``pid`` and all its children."""
+    try:
+        process = psutil.Process(pid)
+        processes = [process, *process.children(recursive=True)]
+    except psutil.NoSuchProcess:
+        return None
+    total = 0
+    counted = 0
+    for p in processes:
+        try:
+            total += p.memory_info().rss
+            counted += 1
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total / (1024 * 1024), counted
+
+
+async def sample_session(session: BrowserSession, browser_pid: int | None = None) -> MemorySample:
+    """Measures the session's browser; pass ``browser_pid`` to skip the process lookup."""
+    if browser_pid is None:
+        browser_pid = await asyncio.to_thread(find_browser_pid, session)
+    memory = await asyncio.to_thread(process_tree_memory, browser_pid) if browser_pid else None
+    try:
+        pages = len(await page_target_ids(session))
+    except Exception as e:
+        logger.debug(f"Could not count open pages: {e}")
+        pages = 0
+    rss_mb, processes = memory if memory is not None else (None, 0)
+    if rss_mb is not None:
+        BROWSER_RSS.observe(rss_mb)
+    return MemorySample(rss_mb=rss_mb, processes=processes, pages=pages)
@@ -0,0 +1,267 @@
+"""Record and replay of the network traffic of agent runs.
+
+With ``NETWORK_ARCHIVE_MODE=record`` every response a run receives is stored
+in one HAR file per test. With ``replay`` those responses are served from the
+file through request interception, so reruns are fast, don't depend on the
+live site and make benchmark numbers comparable. A request that is not in the
+archive goes to the network, or fails with ``NETWORK_ARCHIVE_FALLBACK=abort``.
+
+The files are HAR 1.2, the format the recorder's runner replays with
+Playwright's ``routeFromHAR``.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Any
+
+from request_interceptor import is_response_stage
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+NETWORK_ARCHIVE_MODES = ("off", "record", "replay")
+NETWORK_ARCHIVE_FALLBACKS = ("network", "abort")
+
+# The stored body is already decoded, so these would make the browser misread it.
+_REPLAY_DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def _request_key(method: str, url: str, post_data: str | None) -> tuple[str, str, str]:
+    digest = hashlib.sha256(post_data.encode()).hexdigest() if post_data else ""
+    return method.upper(), url, digest
+
+
+class NetworkArchive:
+    """The recorded responses of one test, kept as a HAR file."""
+
+    def __init__(self, path: str, entries: list[dict[str, Any]] | None = None) -> None:
+        self.path = path
+        self.entries = entries or []
+        # Repeated requests (e.g. polling) are answered in recorded order, then the last repeats.
+        self._served: dict[tuple[str, str, str], int] = defaultdict(int)
+        self._index: dict[tuple[str, str, str], list[dict[str, Any]]] = defaultdict(list)
+        for entry in self.entries:
+            self._index[self._entry_key(entry)].append(entry)
+
+    @classmethod
+    def load(cls, path: str) -> NetworkArchive | None:
+        """Loads an archive, or returns ``None`` if there is no usable file."""
+        try:
+            with open(path) as f:
+                return cls(path, json.load(f)["log"]["entries"])
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable network archive {path}: {e}")
+            return None
+
+    @staticmethod
+    def _entry_key(entry: dict[str, Any]) -> tuple[str, str, str]:
+        request = entry["request"]
+        return _request_key(request["method"], request["url"], (request.get("postData") or {}).get("text"))
+
+    def add(
+        self,
+        request: dict[str, Any],
+        status: int,
+        status_text: str,
+        headers: list[dict[str, str]],
+        body: str,
+        base64_encoded: bool,
+    ) -> None:
+        """Adds a response as received by CDP ``Fetch.requestPaused`` at the response stage."""
+        mime_type = next((h["value"] for h in headers if h["name"].lower() == "content-type"), "")
+        har_request: dict[str, Any] = {
+            "method": request["method"],
+            "url": request["url"],
+            "httpVersion": "HTTP/1.1",
+            "headers": [{"name": k, "value": v} for k, v in request.get("headers", {}).items()],
+            "queryString": [],
+            "cookies": [],
+            "headersSize": -1,
+            "bodySize": len(request.get("postData") or ""),
+        }
+        if request.get("postData"):
+            har_request["postData"] = {
+                "mimeType": request.get("headers", {}).get("Content-Type", ""),
+                "text": request["postData"],
+            }
+        content: dict[str, Any] = {"size": len(body), "mimeType": mime_type, "text": body}
+        if base64_encoded:
+            content["encoding"] = "base64"
+        entry = {
+            "startedDateTime": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+            "time": 0,
+            "request": har_request,
+            "response": {
+                "status": status,
+                "statusText": status_text,
+                "httpVersion": "HTTP/1.1",
+                "headers": headers,
+                "cookies": [],
+                "content": content,
+                "redirectURL": next((h["value"] for h in headers if h["name"].lower() == "location"), ""),
+                "headersSize": -1,
+                "bodySize": -1,
+            },
+            "cache": {},
+            "timings": {"send": 0, "wait": 0, "receive": 0},
+        }
+        self.entries.append(entry)
+        self._index[self._entry_key(entry)].append(entry)
+
+    def lookup(self, method: str, url: str, post_data: str | None) -> dict[str, Any] | None:
+        key = _request_key(method, url, post_data)
+        candidates = self._index.get(key)
+        if not candidates:
+            return None
+        served = self._served[key]
+        self._served[key] = served + 1
+        return candidates[min(served, len(candidates) - 1)]
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        har = {"log": {"version": "1.2", "creator": {"name": "agentitest", "version": "1"}, "entries": self.entries}}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(har, f)
+        os.replace(tmp_path, self.path)
+
+
+class ArchiveRecorder:
+    """Request handler that copies every response into the archive and lets it through."""
+
+    def __init__(self, archive: NetworkArchive) -> None:
+        self.archive = archive
+
+    def fetch_patterns(self) -> list[dict[str, str]]:
+        return [{"urlPattern": "*", "requestStage": "Response"}]
+
+    async def handle(self, client: Any, event: dict[str, Any], session_id: str) -> bool:
+        if "responseStatusCode" not in event:
+            return False
+        status = event["responseStatusCode"]
+        body, base64_encoded = "", False
+        if not 300 <= status < 400:  # Redirects have no body to read.
+            try:
+                response = await client.send.Fetch.getResponseBody(
+                    params={"requestId": event["requestId"]}, session_id=session_id
+                )
+                body, base64_encoded = response["body"], response["base64Encoded"]
+            except Exception as e:
+                logger.debug(f"Could not read the body of {event['request']['url']}: {e}")
+        self.archive.add(
+            event["request"],
+            status,
+            event.get("responseStatusText", ""),
+            event.get("responseHeaders", []),
+            body,
+            base64_encoded,
+        )
+        return False
+
+    def close(self) -> None:
+        self.archive.save()
+        logger.info(f"Recorded {len(self.archive.entries)} response(s) to {self.archive.path}")
+
+
+class ArchiveReplayer:
+    """Request handler that answers requests from the archive."""
+
+    def __init__(self, archive: NetworkArchive, fallback: str = "network") -> None:
+        self.archive = archive
+        self.fallback = fallback
+        self.hits = 0
+        self.misses = 0
+
+    def fetch_patterns(self) -> list[dict[str, str]]:
+        return [{"urlPattern": "*", "requestStage": "Request"}]
+
+    async def handle(self, client: Any, event: dict[str, Any], session_id: str) -> bool:
+        if is_response_stage(event):
+            return False
+        request = event["request"]
+        entry = self.archive.lookup(request["method"], request["url"], request.get("postData"))
+        if entry is None:
+            self.misses += 1
+            if self.fallback == "network":
+                return False
+            await client.send.Fetch.failRequest(
+                params={"requestId": event["requestId"], "errorReason": "InternetDisconnected"},
+                session_id=session_id,
+            )
+            return True
+
+        self.hits += 1
+        response = entry["response"]
+        content = response.get("content", {})
+        body = content.get("text", "")
+        if content.get("encoding") != "base64":
+            body = base64.b64encode(body.encode()).decode()
+        headers = [h for h in response.get("headers", []) if h["name"].lower() not in _REPLAY_DROPPED_HEADERS]
+        await client.send.Fetch.fulfillRequest(
+            params={
+                "requestId": event["requestId"],
+                "responseCode": response["status"],
+                "responseHeaders": headers,
+                "body": body,
+            },
+            session_id=session_id,
+        )
+        return True
+
+    def close(self) -> None:
+        logger.info(
+            f"Replayed {self.hits} response(s) from {self.archive.path}; "
+            f"{self.misses} request(s) were not recorded ({self.fallback})."
+        )
+
+
+class NetworkArchiveStore:
+    """One HAR file per test, keyed by a test id (pytest node id, or task and URL)."""
+
+    def __init__(self, directory: str, mode: str = "record", fallback: str = "network") -> None:
+        if mode not in NETWORK_ARCHIVE_MODES:
+            raise ValueError(f"Unknown network archive mode {mode!r}; expected one of {NETWORK_ARCHIVE_MODES}")
+        if fallback not in NETWORK_ARCHIVE_FALLBACKS:
+            raise ValueError(f"Unknown network archive fallback {fallback!r}; expected one of {NETWORK_ARCHIVE_FALLBACKS}")
+        self.directory = directory
+        self.mode = mode
+        self.fallback = fallback
+
+    @classmethod
+    def from_env(cls) -> NetworkArchiveStore | None:
+        """Returns the store selected by ``NETWORK_ARCHIVE_MODE``, or ``None`` when off."""
+        mode = os.getenv("NETWORK_ARCHIVE_MODE", "off").lower()
+        if mode == "off":
+            return None
+        return cls(
+            directory=os.getenv("NETWORK_ARCHIVE_DIR", os.path.join(PROJECT_ROOT, "network_archives")),
+            mode=mode,
+            fallback=os.getenv("NETWORK_ARCHIVE_FALLBACK", "network").lower(),
+        )
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{hashlib.sha256(key.encode()).hexdigest()}.har")
+
+    def handler(self, key: str) -> ArchiveRecorder | ArchiveReplayer | None:
+        """The request handler recording or replaying the archive for ``key``."""
+        path = self.path(key)
+        if self.mode == "record":
+            return ArchiveRecorder(NetworkArchive(path))
+        archive = NetworkArchive.load(path)
+        if archive is None:
+            if self.fallback == "network":
+                logger.info(f"No network archive for this test yet ({path}); using the live network.")
+                return None
+            # Nothing may reach the network, so every request fails.
+            archive = NetworkArchive(path)
+        return ArchiveReplayer(archive, self.fallback)
@@ -0,0 +1,136 @@
+"""Shared CDP request interception for agent browser sessions.
+
+Chrome keeps one set of ``Fetch`` patterns per tab, so features that need to
+see requests (resource blocking, network archives) register as handlers on a
+single ``RequestInterceptor`` instead of enabling ``Fetch`` themselves. Every
+paused request goes to the handlers in order until one of them fails,
+fulfills or continues it; requests no handler resolves are continued.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, Protocol
+
+from browser_utils import page_target_ids
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Sequence
+
+    from browser_use import BrowserSession
+
+logger = logging.getLogger(__name__)
+
+
+class RequestHandler(Protocol):
+    def fetch_patterns(self) -> list[dict[str, str]]:
+        """CDP ``Fetch.enable`` patterns for the requests this handler wants to see."""
+
+    async def handle(self, client: Any, event: dict[str, Any], session_id: str) -> bool:
+        """Resolves the paused request and returns True, or returns False to pass it on."""
+
+    # Handlers may also define ``async def watch_tab(client, session_id)``, which
+    # is called once per intercepted tab, e.g. to listen to its Network events.
+
+
+def is_response_stage(event: dict[str, Any]) -> bool:
+    return "responseStatusCode" in event or "responseErrorReason" in event
+
+
+class RequestInterceptor:
+    """Applies request handlers to every tab of a session, including tabs opened later."""
+
+    def __init__(self, session: BrowserSession, handlers: Sequence[RequestHandler]) -> None:
+        self.session = session
+        self.handlers = list(handlers)
+        self._cdp_sessions: dict[str, Any] = {}
+        self._tab_handler_registered = False
+
+    async def attach(self) -> None:
+        from browser_use.browser.events import TabCreatedEvent
+
+        for target_id in await page_target_ids(self.session):
+            await self._intercept(target_id)
+        self.session.event_bus.on(TabCreatedEvent, self._on_tab_created)
+        self._tab_handler_registered = True
+
+    async def detach(self) -> None:
+        """Stops intercepting, so a pooled session starts the next run unrestricted."""
+        if self._tab_handler_registered:
+            # bubus has no way to unsubscribe, so the handler is removed from its registry.
+            with contextlib.suppress(AttributeError, KeyError, ValueError):
+                self.session.event_bus.handlers["TabCreatedEvent"].remove(self._on_tab_created)
+            self._tab_handler_registered = False
+        cdp_sessions, self._cdp_sessions = self._cdp_sessions, {}
+        for cdp_session in cdp_sessions.values():
+            with contextlib.suppress(Exception):
+                # The tab may already be closed.
+                await cdp_session.cdp_client.send.Fetch.disable(session_id=cdp_session.session_id)
+
+    async def _on_tab_created(self, event: Any) -> None:
+        try:
+            await self._intercept(event.target_id)
+        except Exception as e:
+            logger.warning(f"Could not intercept requests of a new tab: {e}")
+
+    async def _intercept(self, target_id: str) -> None:
+        if target_id in self._cdp_sessions:
+            return
+        cdp_session = await self.session.get_or_create_cdp_session(target_id, focus=False)
+        client = cdp_session.cdp_client
+
+        def on_request_paused(event: dict[str, Any], session_id: str | None = None) -> None:
+            asyncio.create_task(self._dispatch(client, event, session_id or cdp_session.session_id))
+
+        patterns = [pattern for handler in self.handlers for pattern in handler.fetch_patterns()]
+        client.register.Fetch.requestPaused(on_request_paused)
+        await client.send.Fetch.enable(params={"patterns": patterns}, session_id=cdp_session.session_id)
+        self._cdp_sessions[target_id] = cdp_session
+        for handler in self.handlers:
+            watch_tab = getattr(handler, "watch_tab", None)
+            if watch_tab is not None:
+                try:
+                    await watch_tab(client, cdp_session.session_id)
+                except Exception as e:
+                    logger.debug(f"Could not watch a tab's requests: {e}")
+
+    async def _dispatch(self, client: Any, event: dict[str, Any], session_id: str) -> None:
+        try:
+            for handler in self.handlers:
+                if await handler.handle(client, event, session_id):
+                    return
+            await client.send.Fetch.continueRequest(
+                params={"requestId": event["requestId"]}, session_id=session_id
+            )
+        except Exception as e:
+            # The page navigated away or closed while the request was paused.
+            logger.debug(f"Could not resolve paused request: {e}")
+
+
+@asynccontextmanager
+async def intercept_requests(
+    session: BrowserSession, handlers: Sequence[RequestHandler | None]
+) -> AsyncIterator[None]:
+    """Intercepts the session's requests with ``handlers`` (``None`` entries are skipped).
+
+    If interception cannot be set up, the run goes ahead without it.
+    """
+    active = [handler for handler in handlers if handler is not None and handler.fetch_patterns()]
+    if not active:
+        yield
+        return
+    interceptor: RequestInterceptor | None = RequestInterceptor(session, active)
+    try:
+        await interceptor.attach()
+    except Exception as e:
+        logger.warning(f"Could not intercept browser requests: {e}")
+        await interceptor.detach()
+        interceptor = None
+    try:
+        yield
+    finally:
+        if interceptor is not None:
+            await interceptor.detach()
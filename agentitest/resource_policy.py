@@ -0,0 +1,247 @@
+"""Blocks images, fonts, media, ads and analytics in agent browsers.
+
+The agent only needs the DOM, but every page load also pulls in heavy
+resources and tracking beacons. ``ResourceBlocker`` fails the requests the
+policy blocks, by resource type or by domain, through the session's
+``RequestInterceptor``. Interception is per run rather than a browser launch
+flag, so a pooled browser can serve tests with different allowlists, and
+blocked requests can be counted.
+
+A blocked request never loads, so its size and load time cannot be read off
+it. ``LOADED_RESOURCES`` measures the requests that do load (CDP
+``Network.loadingFinished``), and each blocked request is charged the average
+transfer size and load time of its resource type. Types this process has not
+loaded yet are reported as unmeasured instead of guessed.
+
+Blocking is off unless ``RESOURCE_BLOCKING`` is set: agent steps that look at
+screenshots, and recorded tests that check images, need the page as it is.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlsplit
+
+from prometheus_client import Counter as PrometheusCounter
+from request_interceptor import is_response_stage
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCKED_TYPES = "image,media,font"
+DEFAULT_BLOCKED_DOMAINS = (
+    "google-analytics.com,googletagmanager.com,doubleclick.net,googlesyndication.com,"
+    "googleadservices.com,facebook.net,hotjar.com,clarity.ms,segment.io,mixpanel.com,"
+    "nr-data.net,fullstory.com"
+)
+
+# CDP resource type names; the policy uses Playwright's lowercase spelling.
+CDP_RESOURCE_TYPES = {
+    "document": "Document",
+    "stylesheet": "Stylesheet",
+    "image": "Image",
+    "media": "Media",
+    "font": "Font",
+    "script": "Script",
+    "texttrack": "TextTrack",
+    "xhr": "XHR",
+    "fetch": "Fetch",
+    "eventsource": "EventSource",
+    "websocket": "WebSocket",
+    "manifest": "Manifest",
+    "ping": "Ping",
+    "other": "Other",
+}
+
+BLOCKED_REQUESTS = PrometheusCounter(
+    "agentitest_blocked_requests_total",
+    "Requests failed by the resource-blocking policy.",
+    ["resource_type"],
+)
+
+
+def _split(value: str) -> frozenset[str]:
+    return frozenset(item.strip().lower() for item in value.split(",") if item.strip())
+
+
+def _matches_domain(host: str, domains: Iterable[str]) -> bool:
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+@dataclass(frozen=True)
+class ResourcePolicy:
+    """Which requests to block: by resource type, or by domain; allowed domains always load."""
+
+    blocked_types: frozenset[str] = frozenset()
+    blocked_domains: frozenset[str] = frozenset()
+    allowed_domains: frozenset[str] = frozenset()
+
+    @classmethod
+    def from_env(cls) -> ResourcePolicy | None:
+        """Builds the policy from ``RESOURCE_*`` variables; ``None`` unless ``RESOURCE_BLOCKING`` is on."""
+        if os.getenv("RESOURCE_BLOCKING", "false").lower() not in ("true", "1", "t"):
+            return None
+        return cls(
+            blocked_types=_split(os.getenv("RESOURCE_BLOCK_TYPES", DEFAULT_BLOCKED_TYPES)),
+            blocked_domains=_split(os.getenv("RESOURCE_BLOCK_DOMAINS", DEFAULT_BLOCKED_DOMAINS)),
+            allowed_domains=_split(os.getenv("RESOURCE_ALLOW_DOMAINS", "")),
+        )
+
+    def allowing(self, types: Iterable[str] = (), domains: Iterable[str] = ()) -> ResourcePolicy:
+        """A copy that also lets these resource types and domains through (per-test allowlists)."""
+        return replace(
+            self,
+            blocked_types=self.blocked_types - {t.lower() for t in types},
+            allowed_domains=self.allowed_domains | {d.lower() for d in domains},
+        )
+
+    def blocks(self, url: str, resource_type: str) -> bool:
+        host = (urlsplit(url).hostname or "").lower()
+        if not host or _matches_domain(host, self.allowed_domains):
+            return False
+        return resource_type.lower() in self.blocked_types or _matches_domain(host, self.blocked_domains)
+
+    def fetch_patterns(self) -> list[dict[str, str]]:
+        """CDP ``Fetch.enable`` patterns that pause every request this policy might block."""
+        patterns = [
+            {"urlPattern": "*", "resourceType": CDP_RESOURCE_TYPES[t], "requestStage": "Request"}
+            for t in sorted(self.blocked_types)
+            if t in CDP_RESOURCE_TYPES
+        ]
+        patterns.extend({"urlPattern": f"*{domain}*", "requestStage": "Request"} for domain in sorted(self.blocked_domains))
+        return patterns
+
+
+class LoadedResources:
+    """Transfer size and load time of the requests that loaded, totalled per resource type."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # resource type -> [requests, encoded bytes, seconds]
+        self._totals: dict[str, list[float]] = {}
+
+    def observe(self, resource_type: str, encoded_bytes: float, seconds: float) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(resource_type, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += encoded_bytes
+            totals[2] += max(seconds, 0.0)
+
+    def average(self, resource_type: str) -> tuple[float, float] | None:
+        """Mean (bytes, seconds) of a loaded request of this type, or ``None`` if none loaded."""
+        with self._lock:
+            totals = self._totals.get(resource_type)
+            if not totals:
+                return None
+            count, encoded_bytes, seconds = totals
+            return encoded_bytes / count, seconds / count
+
+
+# Shared by all runs in the process, so a run learns from the pages earlier runs loaded.
+LOADED_RESOURCES = LoadedResources()
+
+
+@dataclass
+class BlockingStats:
+    """What the policy blocked during one run.
+
+    ``blocked_bytes`` and ``blocked_seconds`` charge each blocked request the
+    measured average of its resource type (see ``LoadedResources``). Requests
+    load in parallel, so ``blocked_seconds`` is request time, not wall-clock time.
+    """
+
+    by_type: Counter[str] = field(default_factory=Counter)
+    blocked_bytes: float = 0.0
+    blocked_seconds: float = 0.0
+    unmeasured: int = 0  # Blocked requests of a type no loaded request has measured
+
+    @property
+    def requests(self) -> int:
+        return sum(self.by_type.values())
+
+    def add(self, resource_type: str, average: tuple[float, float] | None = None) -> None:
+        self.by_type[resource_type] += 1
+        if average is None:
+            self.unmeasured += 1
+        else:
+            self.blocked_bytes += average[0]
+            self.blocked_seconds += average[1]
+        BLOCKED_REQUESTS.labels(resource_type=resource_type).inc()
+
+    def summary(self) -> str:
+        kinds = ", ".join(f"{count} {kind}" for kind, count in self.by_type.most_common())
+        text = f"Blocked {self.requests} request(s) ({kinds or 'none'})"
+        if self.requests > self.unmeasured:
+            text += (
+                f", about {self.blocked_bytes / 1024:.0f} KB and {self.blocked_seconds:.1f}s of request time "
+                f"at the measured average of each type"
+            )
+        if self.unmeasured:
+            text += f" ({self.unmeasured} of types not measured yet)"
+        return text + "."
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "blocked_requests": self.requests,
+            "blocked_by_type": dict(self.by_type),
+            "blocked_bytes": round(self.blocked_bytes),
+            "blocked_seconds": round(self.blocked_seconds, 2),
+            "unmeasured_requests": self.unmeasured,
+        }
+
+
+class ResourceBlocker:
+    """Request handler (see request_interceptor.py) that fails what the policy blocks.
+
+    It also measures the requests that do load, into ``loaded``.
+    """
+
+    def __init__(self, policy: ResourcePolicy, loaded: LoadedResources = LOADED_RESOURCES) -> None:
+        self.policy = policy
+        self.loaded = loaded
+        self.stats = BlockingStats()
+        # requestId -> (resource type, start timestamp) of requests still loading
+        self._loading: dict[str, tuple[str, float]] = {}
+
+    def fetch_patterns(self) -> list[dict[str, str]]:
+        return self.policy.fetch_patterns()
+
+    async def watch_tab(self, client: Any, session_id: str) -> None:
+        """Measures the size and load time of the tab's requests through CDP ``Network`` events."""
+
+        def on_request(event: dict[str, Any], session_id: str | None = None) -> None:
+            # data: and blob: URLs cost no transfer; they would drag the averages down.
+            if event["request"]["url"].startswith(("http:", "https:")):
+                self._loading[event["requestId"]] = (event.get("type", "Other").lower(), event["timestamp"])
+
+        def on_finished(event: dict[str, Any], session_id: str | None = None) -> None:
+            loading = self._loading.pop(event["requestId"], None)
+            if loading is not None:
+                resource_type, started = loading
+                self.loaded.observe(resource_type, event.get("encodedDataLength", 0), event["timestamp"] - started)
+
+        def on_failed(event: dict[str, Any], session_id: str | None = None) -> None:
+            self._loading.pop(event["requestId"], None)
+
+        client.register.Network.requestWillBeSent(on_request)
+        client.register.Network.loadingFinished(on_finished)
+        client.register.Network.loadingFailed(on_failed)
+        await client.send.Network.enable(session_id=session_id)
+
+    async def handle(self, client: Any, event: dict[str, Any], session_id: str) -> bool:
+        resource_type = event.get("resourceType", "Other").lower()
+        if is_response_stage(event) or not self.policy.blocks(event["request"]["url"], resource_type):
+            return False
+        self.stats.add(resource_type, self.loaded.average(resource_type))
+        await client.send.Fetch.failRequest(
+            params={"requestId": event["requestId"], "errorReason": "BlockedByClient"},
+            session_id=session_id,
+        )
+        return True
@@ -0,0 +1,255 @@
+"""Budgets and stuck-loop detection for agent runs.
+
+``RunSupervisor`` is an ``on_step_end`` hook that stops the agent as soon as
+it repeats the same action on an unchanged page, cycles between the same URLs,
+or uses more LLM tokens than its budget. Scrolling and waiting are expected to
+repeat, and a repeated click that changes the page (a "next" or "load more"
+button) is progress, so the page's title, text length and element count are
+part of what must repeat. The agent's step budget is passed to
+``Agent.run``, which also asks the model to finish on the last step.
+
+``TimeBudgets`` learns how long each task takes: the run's time limit is the
+p95 of its recent successful durations times a factor, clamped between a
+minimum and the old global limit, so a looping run no longer burns the full
+three minutes when the task usually takes thirty seconds. Replayed runs (see
+trajectory_store.py) are learned separately and bound the replay itself.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from browser_utils import evaluate
+
+if TYPE_CHECKING:
+    from browser_use import Agent
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_TIME_BUDGET_SECONDS = 180.0
+# Successful durations kept per task, and how many are needed before learning.
+TIME_BUDGET_SAMPLES = 20
+TIME_BUDGET_MIN_SAMPLES = 3
+
+# Actions that repeat on purpose and never count toward a loop.
+REPEATABLE_ACTIONS = frozenset({"scroll", "wait", "find_text"})
+# Cheap summary of the page; a repeated action that changes it is not a loop.
+PAGE_FINGERPRINT_JS = (
+    "`${document.title}|${document.body ? document.body.innerText.length : 0}"
+    "|${document.getElementsByTagName('*').length}`"
+)
+
+
+@dataclass(frozen=True)
+class RunBudget:
+    """Limits for one agent run; a zero ``max_tokens`` means no token limit."""
+
+    max_steps: int = 50
+    max_tokens: int = 0
+    max_repeated_actions: int = 5
+    max_url_cycles: int = 3
+
+    @classmethod
+    def from_env(cls) -> RunBudget:
+        return cls(
+            max_steps=int(os.getenv("RUN_MAX_STEPS", "50")),
+            max_tokens=int(os.getenv("RUN_MAX_TOKENS", "0")),
+            max_repeated_actions=int(os.getenv("RUN_MAX_REPEATED_ACTIONS", "5")),
+            max_url_cycles=int(os.getenv("RUN_MAX_URL_CYCLES", "3")),
+        )
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+class TimeBudgets:
+    """Recent successful run durations, one JSON file per (task, start URL) pair."""
+
+    def __init__(
+        self,
+        directory: str,
+        factor: float = 2.0,
+        min_seconds: float = 30.0,
+        max_seconds: float = DEFAULT_TIME_BUDGET_SECONDS,
+    ) -> None:
+        self.directory = directory
+        self.factor = factor
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+
+    @classmethod
+    def from_env(cls) -> TimeBudgets:
+        return cls(
+            directory=os.getenv("RUN_TIME_BUDGET_DIR", os.path.join(PROJECT_ROOT, "run_budgets")),
+            factor=float(os.getenv("RUN_TIME_BUDGET_FACTOR", "2")),
+            min_seconds=float(os.getenv("RUN_TIME_BUDGET_MIN_SECONDS", "30")),
+            max_seconds=float(os.getenv("RUN_TIME_BUDGET_MAX_SECONDS", str(DEFAULT_TIME_BUDGET_SECONDS))),
+        )
+
+    def _path(self, task: str, start_url: str | None) -> str:
+        key = hashlib.sha256(f"{task}\n{start_url or ''}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self, task: str, start_url: str | None) -> dict[str, list[float]]:
+        path = self._path(task, start_url)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            return {series: [float(d) for d in data.get(series, [])] for series in ("durations", "replay_durations")}
+        except FileNotFoundError:
+            return {"durations": [], "replay_durations": []}
+        except (OSError, ValueError, AttributeError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable time budget {path}: {e}")
+            return {"durations": [], "replay_durations": []}
+
+    def durations(self, task: str, start_url: str | None, replayed: bool = False) -> list[float]:
+        """Recent successful durations of live (or, with ``replayed``, fully replayed) runs."""
+        return self._load(task, start_url)["replay_durations" if replayed else "durations"]
+
+    def budget(self, task: str, start_url: str | None, replayed: bool = False) -> float:
+        """p95 of the recent successful durations times ``factor``, within the limits."""
+        durations = self.durations(task, start_url, replayed)
+        if len(durations) < TIME_BUDGET_MIN_SAMPLES:
+            return self.max_seconds
+        learned = _percentile(durations, 0.95) * self.factor
+        return min(max(learned, self.min_seconds), self.max_seconds)
+
+    def record(self, task: str, start_url: str | None, seconds: float, replayed: bool = False) -> None:
+        """Adds the duration of a successful run; older samples roll off.
+
+        Fully replayed runs are much faster than live ones, so they go to their
+        own series; a run the live agent finished counts as live.
+        """
+        data = self._load(task, start_url)
+        series = "replay_durations" if replayed else "durations"
+        data[series] = (data[series] + [round(seconds, 2)])[-TIME_BUDGET_SAMPLES:]
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._path(task, start_url))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def _action_signature(model_output: Any) -> str | None:
+    """The step's actions as JSON, or ``None`` if they only scroll or wait."""
+    actions = [action.model_dump(exclude_none=True) for action in model_output.action or []]
+    if all(set(action) <= REPEATABLE_ACTIONS for action in actions):
+        return None
+    return json.dumps(actions, sort_keys=True, default=str)
+
+
+class RunSupervisor:
+    """Stops an agent that loops or runs over its token budget.
+
+    Like ``StepReporter``, it only reads the history items added since the
+    previous step. ``failure_reason`` says why the agent was stopped.
+    """
+
+    def __init__(self, budget: RunBudget, on_step_end: Callable[[Agent], Awaitable[None]] | None = None) -> None:
+        self.budget = budget
+        self.on_step_end = on_step_end
+        self.failure_reason: str | None = None
+        self._history: Any = None
+        self._next_index = 0
+        self._last_signature: tuple[str, str | None, str | None] | None = None
+        self._repeats = 0
+        self._urls: list[str] = []
+        self._tokens_at_start = self._tokens_used()
+
+    @staticmethod
+    def _tokens_used() -> int:
+        # Imported here so pytest's conftest doesn't load prometheus_client through this module.
+        from telemetry import current_trace
+
+        trace = current_trace()
+        return trace.tokens if trace is not None else 0
+
+    async def __call__(self, agent: Agent) -> None:
+        if self.on_step_end is not None:
+            await self.on_step_end(agent)
+        if self.failure_reason is not None or agent.history.is_done():
+            return
+        self.failure_reason = self.check(agent, await self._page_fingerprint(agent))
+        if self.failure_reason is not None:
+            logger.warning(f"Stopping the agent: {self.failure_reason}")
+            agent.stop()
+
+    @staticmethod
+    async def _page_fingerprint(agent: Agent) -> str | None:
+        try:
+            return str(await evaluate(agent.browser_session, PAGE_FINGERPRINT_JS))
+        except Exception as e:
+            logger.debug(f"Could not fingerprint the page: {e}")
+            return None
+
+    def check(self, agent: Agent, page_fingerprint: str | None = None) -> str | None:
+        """Reads the new history items and returns why the run must stop, if it must.
+
+        ``page_fingerprint`` describes the page after the latest item; without
+        it, an action repeated on the same URL counts as a loop.
+        """
+        history = agent.history
+        if history is not self._history:
+            # A new agent (e.g. the live agent taking over from a replay) starts its own history.
+            self._history = history
+            self._next_index = 0
+        items = history.history
+        reason: str | None = None
+        new_items = items[self._next_index :]
+        for position, item in enumerate(new_items, start=1):
+            fingerprint = page_fingerprint if position == len(new_items) else None
+            reason = self._check_item(item, fingerprint) or reason
+        self._next_index = len(items)
+        if reason is not None:
+            return reason
+
+        if self.budget.max_tokens:
+            tokens = self._tokens_used() - self._tokens_at_start
+            if tokens > self.budget.max_tokens:
+                return f"Used {tokens} LLM tokens, over the budget of {self.budget.max_tokens}."
+        return None
+
+    def _check_item(self, item: Any, page_fingerprint: str | None) -> str | None:
+        url = getattr(item.state, "url", None)
+        if item.model_output is not None:
+            actions = _action_signature(item.model_output)
+            # Scrolls and waits neither count as a repeat nor break a run of them.
+            if actions is not None:
+                signature = (actions, url, page_fingerprint)
+                self._repeats = self._repeats + 1 if signature == self._last_signature else 1
+                self._last_signature = signature
+                if self._repeats >= self.budget.max_repeated_actions:
+                    return f"Repeated the same action {self._repeats} times on an unchanged {url}: {actions}"
+
+        if url and (not self._urls or self._urls[-1] != url):
+            self._urls.append(url)
+            return self._check_url_cycle()
+        return None
+
+    def _check_url_cycle(self) -> str | None:
+        """Looks for the last few distinct URLs repeating, e.g. A → B → A → B → A → B."""
+        cycles = self.budget.max_url_cycles
+        for period in range(2, 5):
+            window = period * cycles
+            if len(self._urls) < window:
+                break
+            recent = self._urls[-window:]
+            pattern = recent[:period]
+            if len(set(pattern)) == period and recent == pattern * cycles:
+                return f"Cycled {cycles} times through the same pages: {' -> '.join(pattern)}"
+        return None
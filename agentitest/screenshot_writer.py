@@ -0,0 +1,201 @@
+"""Background writer for per-step screenshots.
+
+Hashing, thumbnailing and disk I/O happen on a single worker thread so the
+agent's step hook only pays for handing the bytes over. Files are named by
+content hash, which deduplicates identical frames, and the directory is capped
+at ``max_files`` so long suites don't grow it without bound. ``index.jsonl``
+entries for pruned files are dropped in batches and on ``close()``.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+def _load_pillow() -> Any:
+    """Imports Pillow on first use; it is optional and only needed for thumbnails."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def decode_screenshot(data: Any) -> bytes | None:
+    """Returns PNG bytes from raw bytes or a base64 string, decoding at most once."""
+    if isinstance(data, bytes):
+        return data
+    if not isinstance(data, str):
+        return None
+    try:
+        return base64.b64decode(data, validate=True)
+    except binascii.Error:
+        logger.warning("Invalid base64 padding in screenshot data")
+        return None
+
+
+class ScreenshotWriter:
+    """Writes screenshots as ``<sha256>.png`` on a background thread."""
+
+    INDEX_FILENAME = "index.jsonl"
+    # Pruned files whose index entries may remain before the index is rewritten.
+    INDEX_PRUNE_BATCH = 50
+
+    def __init__(
+        self,
+        directory: str,
+        max_files: int = 1000,
+        thumbnail_width: int = 0,
+    ) -> None:
+        self.directory = directory
+        self.max_files = max_files
+        self.thumbnail_width = thumbnail_width
+        self._image_module: Any = None
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot-writer")
+        self._pending: deque[Future] = deque()
+        self._last_hash: str | None = None
+        self._files: deque[str] | None = None  # Loaded lazily on the worker thread.
+        self._pruned: set[str] = set()  # Digests of deleted files still in the index.
+
+    @classmethod
+    def from_env(cls, default_directory: str) -> ScreenshotWriter:
+        """Builds a writer configured by the ``SCREENSHOT_*`` environment variables."""
+        return cls(
+            directory=os.getenv("SCREENSHOT_DIR", default_directory),
+            max_files=int(os.getenv("SCREENSHOT_MAX_FILES", "1000")),
+            thumbnail_width=int(os.getenv("SCREENSHOT_THUMBNAIL_WIDTH", "0")),
+        )
+
+    def submit(self, png_bytes: bytes, step_num: int) -> None:
+        """Queues a screenshot for writing and returns immediately."""
+        while self._pending and self._pending[0].done():
+            self._pending.popleft()
+        self._pending.append(
+            self._executor.submit(self._write, png_bytes, step_num, time.time())
+        )
+
+    def flush(self) -> None:
+        """Blocks until every queued screenshot has been written."""
+        while self._pending:
+            self._pending.popleft().result()
+
+    def close(self) -> None:
+        self.flush()
+        self._executor.submit(self._prune_index).result()
+        self._executor.shutdown(wait=True)
+
+    # --- Worker thread ---
+
+    def _write(self, png_bytes: bytes, step_num: int, timestamp: float) -> None:
+        try:
+            digest = hashlib.sha256(png_bytes).hexdigest()
+            if digest == self._last_hash:
+                # Identical to the previous frame; the index entry below is enough.
+                self._append_index(step_num, timestamp, digest, duplicate=True)
+                return
+            self._last_hash = digest
+
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{digest}.png")
+            if not os.path.exists(path):
+                with open(path, "wb") as f:
+                    f.write(png_bytes)
+                self._pruned.discard(digest)
+                self._track(path)
+                if self.thumbnail_width:
+                    self._write_thumbnail(png_bytes, digest)
+            self._append_index(step_num, timestamp, digest, duplicate=False)
+            self._enforce_retention()
+        except Exception as e:
+            logger.warning(f"Failed to save screenshot to file: {e}")
+
+    def _write_thumbnail(self, png_bytes: bytes, digest: str) -> None:
+        if self._image_module is None:
+            self._image_module = _load_pillow()
+            if self._image_module is None:
+                logger.warning("Pillow is not installed; screenshot thumbnails are disabled.")
+                self.thumbnail_width = 0
+                return
+        Image = self._image_module
+        thumbs_dir = os.path.join(self.directory, "thumbnails")
+        os.makedirs(thumbs_dir, exist_ok=True)
+        with Image.open(io.BytesIO(png_bytes)) as image:
+            image.thumbnail((self.thumbnail_width, self.thumbnail_width * 4))
+            image.convert("RGB").save(os.path.join(thumbs_dir, f"{digest}.jpg"), "JPEG", quality=70)
+
+    def _append_index(self, step_num: int, timestamp: float, digest: str, duplicate: bool) -> None:
+        record = {"step": step_num, "timestamp": timestamp, "sha256": digest, "duplicate": duplicate}
+        with open(os.path.join(self.directory, self.INDEX_FILENAME), "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _track(self, path: str) -> None:
+        if self._files is None:
+            # The first scan already picks up the file that was just written.
+            self._load_existing()
+        else:
+            self._files.append(path)
+
+    def _load_existing(self) -> None:
+        paths = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".png")
+        ]
+        paths.sort(key=os.path.getmtime)
+        self._files = deque(paths)
+
+    def _enforce_retention(self) -> None:
+        while self._files and len(self._files) > self.max_files:
+            oldest = self._files.popleft()
+            digest = os.path.splitext(os.path.basename(oldest))[0]
+            for stale in (oldest, os.path.join(self.directory, "thumbnails", f"{digest}.jpg")):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            self._pruned.add(digest)
+        if len(self._pruned) >= self.INDEX_PRUNE_BATCH:
+            self._prune_index()
+
+    def _prune_index(self) -> None:
+        """Rewrites the index without the entries of deleted screenshots."""
+        if not self._pruned:
+            return
+        index_path = os.path.join(self.directory, self.INDEX_FILENAME)
+        try:
+            with open(index_path) as f:
+                lines = f.readlines()
+            kept = []
+            for line in lines:
+                try:
+                    if json.loads(line)["sha256"] not in self._pruned:
+                        kept.append(line)
+                except (ValueError, KeyError, TypeError):
+                    continue
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.writelines(kept)
+                os.replace(tmp_path, index_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to prune the screenshot index: {e}")
+            return
+        self._pruned.clear()
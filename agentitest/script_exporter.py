@@ -0,0 +1,169 @@
+"""Turns a successful agent history into a deterministic ai-test-framework script.
+
+The agent finds its way through a site once; the exported script replays the
+same actions with concrete selectors through ``ai-test-framework/src/runner.js``
+at Playwright speed. Scripts are saved through the recorder server's
+``/save-script`` endpoint, the same store the browser extension uses.
+
+Usage::
+
+    python script_exporter.py trajectories/<hash>.json --name "Search Looker"
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import urllib.request
+from typing import Any
+from urllib.parse import quote_plus
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RECORDER_URL = "http://localhost:5001"
+
+# browser_use action names (old and new spellings) mapped to runner.js actions.
+NAVIGATE_ACTIONS = ("go_to_url", "navigate", "open_tab")
+CLICK_ACTIONS = ("click_element_by_index", "click")
+INPUT_ACTIONS = ("input_text", "input")
+KEY_ACTIONS = ("send_keys",)
+WAIT_ACTIONS = ("wait",)
+SEARCH_ACTIONS = ("search_google", "search")
+
+# Attributes that usually identify an element stably, in order of preference.
+STABLE_ATTRIBUTES = ("data-testid", "data-test", "data-qa", "name", "aria-label", "placeholder", "title")
+
+
+def _css_string(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def selector_for_element(element: dict[str, Any] | None) -> str | None:
+    """Picks the most stable selector for an element recorded by the agent."""
+    if not element:
+        return None
+    attributes: dict[str, str] = element.get("attributes") or {}
+    tag = (element.get("node_name") or element.get("tag_name") or "").lower()
+
+    element_id = attributes.get("id")
+    # Skip ids that look generated, such as ember123 or :r1:.
+    if element_id and not any(ch.isdigit() for ch in element_id) and ":" not in element_id:
+        return f'[id="{_css_string(element_id)}"]'
+    for attribute in STABLE_ATTRIBUTES:
+        value = attributes.get(attribute)
+        if value:
+            return f'{tag}[{attribute}="{_css_string(value)}"]'
+
+    x_path = element.get("x_path") or element.get("xpath")
+    if x_path:
+        return f"xpath={x_path if x_path.startswith('/') else '/' + x_path}"
+    return None
+
+
+def _step(action: str, step_name: str, url: str | None, selector: str | None = None, value: str | None = None) -> dict[str, Any]:
+    return {"action": action, "selector": selector, "value": value, "stepName": step_name, "key": None, "url": url}
+
+
+def convert_action(name: str, params: dict[str, Any], element: dict[str, Any] | None, url: str | None) -> dict[str, Any] | None:
+    """Converts one agent action into a runner step, or ``None`` if it has no equivalent."""
+    params = params or {}
+    if name in NAVIGATE_ACTIONS and params.get("url"):
+        return _step("goto", f"Navigate to {params['url']}", params["url"], value=params["url"])
+    if name in SEARCH_ACTIONS and params.get("query"):
+        search_url = f"https://www.google.com/search?q={quote_plus(params['query'])}"
+        return _step("goto", f"Search for {params['query']}", search_url, value=search_url)
+    if name in WAIT_ACTIONS:
+        milliseconds = str(int(float(params.get("seconds", 3)) * 1000))
+        return _step("wait", f"Wait for {milliseconds}ms", url, value=milliseconds)
+    if name in KEY_ACTIONS and params.get("keys"):
+        selector = selector_for_element(element) or "body"
+        return _step("press", f"press {params['keys']} on {selector}", url, selector=selector, value=params["keys"])
+
+    selector = selector_for_element(element)
+    if selector is None:
+        return None
+    if name in CLICK_ACTIONS:
+        return _step("click", f"click on {selector}", url, selector=selector)
+    if name in INPUT_ACTIONS:
+        text = str(params.get("text", ""))
+        return _step("fill", f'fill "{text}" into {selector}', url, selector=selector, value=text)
+    return None
+
+
+def history_to_script(history: Any, name: str) -> dict[str, Any]:
+    """Builds a ``ScriptData`` dict from an ``AgentHistoryList`` or its JSON form."""
+    data = history.model_dump() if hasattr(history, "model_dump") else history
+    steps: list[dict[str, Any]] = []
+    skipped: list[str] = []
+
+    for item in data.get("history", []):
+        model_output = item.get("model_output") or {}
+        state = item.get("state") or {}
+        url = state.get("url")
+        elements = state.get("interacted_element") or []
+        for index, action in enumerate(model_output.get("action") or []):
+            action_name, params = next(iter(action.items()))
+            if action_name == "done":
+                continue
+            element = elements[index] if index < len(elements) else None
+            step = convert_action(action_name, params, element, url)
+            if step is None:
+                skipped.append(action_name)
+            else:
+                steps.append(step)
+
+    if skipped:
+        logger.info(f"Skipped actions without a runner equivalent: {', '.join(skipped)}")
+    return {"name": name, "variables": {}, "steps": steps}
+
+
+def _post_json(url: str, payload: dict[str, Any]) -> dict[str, Any]:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+async def export_history(history: Any, name: str, recorder_url: str | None = None) -> dict[str, Any]:
+    """Converts a history and saves it through the recorder's ``/save-script`` endpoint."""
+    script = history_to_script(history, name)
+    if not script["steps"]:
+        raise ValueError("The agent history contains no actions that can be exported.")
+    base_url = recorder_url or os.getenv("RECORDER_SERVER_URL", DEFAULT_RECORDER_URL)
+    return await asyncio.to_thread(_post_json, f"{base_url.rstrip('/')}/save-script", script)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("history_files", nargs="+", help="Agent history JSON files (e.g. from trajectories/).")
+    parser.add_argument("--name", help="Script name; defaults to the history file name.")
+    parser.add_argument("--recorder-url", help=f"Recorder server URL (default {DEFAULT_RECORDER_URL}).")
+    args = parser.parse_args(argv)
+    if args.name and len(args.history_files) > 1:
+        parser.error("--name can only be used with a single history file.")
+
+    logging.basicConfig(level=logging.INFO)
+    failures = 0
+    for path in args.history_files:
+        name = args.name or os.path.splitext(os.path.basename(path))[0]
+        try:
+            with open(path) as f:
+                history = json.load(f)
+            response = asyncio.run(export_history(history, name, args.recorder_url))
+            logger.info(f"Exported {path} -> {response.get('filepath')}")
+        except Exception as e:
+            logger.error(f"Could not export {path}: {e}")
+            failures += 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,22 @@
 import asyncio
 import logging
 import os
-from agent_runner import run_agent_on_task
+import time
+from contextlib import asynccontextmanager
+from agent_runner import build_browser_profile, run_batch_request, run_test_request
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from job_queue import Job, JobScheduler, JobStatus, QueueFullError
+from job_store import JobCoordinator, scheduler_from_env
+from login_cache import LoginStateCache
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
+from resource_policy import ResourcePolicy
+from session_pool import BrowserSessionPool
+from step_stream import ndjson_line, sse_event
+from telemetry import REQUEST_DURATION
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -14,7 +25,51 @@ logger = logging.getLogger(__name__)
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI()
+# Pool of warm browser sessions shared by all requests. Set BROWSER_POOL_SIZE=0
+# to launch a fresh browser per request instead.
+browser_pool: BrowserSessionPool | None = None
+# Cached authenticated browser state, so repeat requests can skip the login steps.
+login_cache: LoginStateCache | None = LoginStateCache.from_env()
+# Images, fonts, media and trackers blocked during agent runs (RESOURCE_* variables).
+resource_policy: ResourcePolicy | None = ResourcePolicy.from_env()
+# Seconds between keep-alive comments on an idle /run-test/stream connection.
+STREAM_HEARTBEAT_SECONDS = 15
+# Limits on one /run-batch request: prompts in it, and prompts run at once.
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "20"))
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "2"))
+
+
+async def run_job(payload: dict):
+    """Runs one queued /run-test or /run-batch request."""
+    run_request = run_batch_request if "prompts" in payload else run_test_request
+    return await run_request(
+        payload, pool=browser_pool, login_cache=login_cache, resource_policy=resource_policy
+    )
+
+
+# Bounds how many agent runs execute at once and how many may wait in line.
+# With JOB_QUEUE=sqlite, jobs go to a shared queue and worker.py processes run them.
+scheduler = scheduler_from_env(run_job)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global browser_pool
+    # Only a server that runs the agents itself needs browsers.
+    if isinstance(scheduler, JobScheduler) and int(os.getenv("BROWSER_POOL_SIZE", "2")) > 0:
+        browser_pool = BrowserSessionPool.from_env(build_browser_profile())
+        await browser_pool.start()
+    await scheduler.start()
+    try:
+        yield
+    finally:
+        await scheduler.close()
+        if browser_pool is not None:
+            await browser_pool.close()
+            browser_pool = None
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Set up CORS middleware to allow requests from the Chrome extension.
 # The browser sends a preflight OPTIONS request to check if the server allows
@@ -32,25 +87,216 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    """Observes every request in the request-duration histogram."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (/jobs/{job_id}) rather than the raw path.
+        route = request.scope.get("route")
+        REQUEST_DURATION.labels(
+            method=request.method,
+            path=getattr(route, "path", "unmatched"),
+            status=str(status),
+        ).observe(time.perf_counter() - start)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: request duration, queue wait, steps per task, LLM latency."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 class TestRequest(BaseModel):
     prompt: str
     url: str
+    allow_resource_types: list[str] = []  # e.g. ["image"] when the task needs to see images
+    allow_domains: list[str] = []  # Domains loaded in full despite the resource policy
+
+
+class BatchRequest(BaseModel):
+    url: str  # The login URL every prompt starts from
+    prompts: list[str]
+    username: str | None = None  # Defaults to USERNAME from the environment
+    password: str | None = None  # Defaults to PASSWORD from the environment
+    parallel: int = 1  # Prompts run at once, each in its own signed-in session; 1 reuses the login session
+    allow_resource_types: list[str] = []
+    allow_domains: list[str] = []
+
+
+# JobCoordinator's submit, get and cancel query the shared job store off the
+# event loop and must be awaited; the in-process JobScheduler's never block.
+
+
+async def submit_job(request: BaseModel, **options) -> Job:
+    """Queues a run, translating a full queue into 429 Too Many Requests."""
+    payload = {**request.model_dump(), **options}
+    try:
+        if isinstance(scheduler, JobCoordinator):
+            return await scheduler.submit(payload)
+        return scheduler.submit(payload)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+
+
+async def cancel_job(job_id: str) -> bool:
+    if isinstance(scheduler, JobCoordinator):
+        return await scheduler.cancel(job_id)
+    return scheduler.cancel(job_id)
+
+
+def job_response(job: Job) -> dict:
+    """Shapes a finished job like the /run-test response the extension expects."""
+    if job.status is JobStatus.SUCCEEDED:
+        return {"status": "success", "result": job.result, **job.details}
+    if job.status is JobStatus.CANCELLED:
+        return {"status": "cancelled", "result": "The test run was cancelled."}
+    return {"status": "error", "result": job.error}
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    """Returns once the client disconnects.
+
+    Starlette does not cancel a plain endpoint when its client goes away, and
+    ``Request.is_disconnected()`` cannot see it through the HTTP middleware
+    above, so this listens on ``receive()`` the way ``StreamingResponse`` does.
+    """
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
 
 
 @app.post("/run-test")
-async def run_test_endpoint(request: TestRequest):
+async def run_test_endpoint(request: TestRequest, http_request: Request):
     """
     Endpoint to receive a test prompt and URL, run the agent,
     and return the result.
     """
     logger.info(f"Received test request for URL: {request.url} with prompt: '{request.prompt}'")
+    job = await submit_job(request, stream=False)
+    finished = asyncio.create_task(job.wait())
+    disconnected = asyncio.create_task(wait_for_disconnect(http_request))
     try:
-        # Run the agent task and get the result
-        # The user's prompt will contain the target URL for the main task.
-        # The current page URL is used for the initial login.
-        result = await run_agent_on_task(task_instruction=request.prompt, url=request.url, login_url=request.url)
-        return {"status": "success", "result": result}
-    except Exception as e:
-        logger.error(f"An error occurred during agent execution: {e}", exc_info=True)
-        # In case of an exception, return an error status
-        return {"status": "error", "result": str(e)}
\ No newline at end of file
+        await asyncio.wait((finished, disconnected), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        finished.cancel()
+        disconnected.cancel()
+    if not job.finished:
+        # The client went away; don't keep a browser busy for nobody.
+        logger.info(f"Client disconnected; cancelling job {job.id}.")
+        await cancel_job(job.id)
+    return job_response(job)
+
+
+@app.post("/run-test/stream")
+async def run_test_stream_endpoint(request: TestRequest):
+    """
+    Runs a test like /run-test, pushing each agent step as a server-sent event.
+    Events: `queued` (the job), one `step` per finished step (actions, URL,
+    duration, thought and a JPEG thumbnail), then `result`, shaped like the
+    /run-test response. Closing the connection cancels the run.
+    """
+    logger.info(f"Received streamed test request for URL: {request.url} with prompt: '{request.prompt}'")
+    job = await submit_job(request, stream=True)
+
+    async def events():
+        try:
+            yield sse_event("queued", job.to_dict())
+            async for event in job.stream(heartbeat=STREAM_HEARTBEAT_SECONDS):
+                if event is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield sse_event(event["type"], event)
+            yield sse_event("result", job_response(job))
+        finally:
+            # Runs when the client disconnects too; don't keep a browser busy for nobody.
+            if not job.finished:
+                await cancel_job(job.id)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/run-batch")
+async def run_batch_endpoint(request: BatchRequest):
+    """
+    Runs several prompts as one user at `url`, signing in only once.
+    Answers with newline-delimited JSON, one object per line: `queued` (the
+    job), one `prompt_result` per prompt as it finishes (index, prompt,
+    status, result, duration_seconds), `heartbeat` while idle, then `result`
+    with every prompt's result in order. Closing the connection cancels the batch.
+    """
+    if not request.prompts:
+        raise HTTPException(status_code=400, detail="The batch has no prompts.")
+    if len(request.prompts) > BATCH_MAX_PROMPTS:
+        raise HTTPException(
+            status_code=400, detail=f"A batch may hold at most {BATCH_MAX_PROMPTS} prompts."
+        )
+    parallel = min(max(request.parallel, 1), BATCH_MAX_PARALLEL)
+    logger.info(f"Received batch of {len(request.prompts)} prompt(s) for URL: {request.url}, {parallel} at once")
+    job = await submit_job(request, parallel=parallel)
+
+    async def lines():
+        try:
+            yield ndjson_line({"type": "queued", **job.to_dict()})
+            async for event in job.stream(heartbeat=STREAM_HEARTBEAT_SECONDS):
+                yield ndjson_line(event if event is not None else {"type": "heartbeat"})
+            yield ndjson_line({"type": "result", **job_response(job)})
+        finally:
+            # Runs when the client disconnects too; don't keep browsers busy for nobody.
+            if not job.finished:
+                await cancel_job(job.id)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job_endpoint(request: TestRequest):
+    """Queues a test run and returns its job id without waiting for it."""
+    logger.info(f"Queueing test request for URL: {request.url} with prompt: '{request.prompt}'")
+    return (await submit_job(request, stream=False)).to_dict()
+
+
+async def get_job_or_404(job_id: str) -> Job:
+    if isinstance(scheduler, JobCoordinator):
+        job = await scheduler.get(job_id)
+    else:
+        job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+async def job_status_endpoint(job_id: str):
+    """Returns the status and timings of a job."""
+    return (await get_job_or_404(job_id)).to_dict()
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result_endpoint(job_id: str):
+    """Returns the job's result, or 409 while it is still queued or running."""
+    job = await get_job_or_404(job_id)
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Job is still {job.status.value}.")
+    return job_response(job)
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job_endpoint(job_id: str):
+    """Cancels a queued or running job."""
+    job = await get_job_or_404(job_id)
+    if not await cancel_job(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status.value}.")
+    return job.to_dict()
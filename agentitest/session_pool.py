@@ -0,0 +1,300 @@
+"""A pool of pre-started browser sessions for the agent server.
+
+Starting Chromium is the most expensive part of a short agent run, so the
+server keeps a few sessions warm and hands each request a scrubbed one.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from browser_utils import evaluate, reset_browser_state
+from memory_monitor import BROWSER_RECYCLES, MemoryLimits, MemorySample, find_browser_pid, sample_session
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from browser_use import BrowserProfile, BrowserSession
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PooledSession:
+    """A warm browser session plus the bookkeeping the pool needs for it."""
+
+    session: BrowserSession
+    user_data_dir: str
+    created_at: float = field(default_factory=time.monotonic)
+    last_used_at: float = field(default_factory=time.monotonic)
+    uses: int = 0
+    browser_pid: int | None = None
+    memory: MemorySample | None = None  # Sampled when the session was last returned
+
+
+class BrowserSessionPool:
+    """Keeps between ``min_size`` and ``max_size`` browser sessions ready for use.
+
+    Sessions are checked out with ``acquire()``, which yields a clean session and
+    scrubs it (cookies, site storage, extra tabs) when it is returned. Sessions
+    that fail a health check, fail to scrub, reach ``max_uses`` or cross
+    ``memory_limits`` (browser RSS or open pages, sampled on return) are killed
+    and replaced. Idle sessions above ``min_size`` are evicted after ``idle_timeout``.
+    """
+
+    def __init__(
+        self,
+        browser_profile: BrowserProfile,
+        min_size: int = 1,
+        max_size: int = 2,
+        idle_timeout: float = 300.0,
+        max_uses: int = 20,
+        health_check_timeout: float = 5.0,
+        maintenance_interval: float = 30.0,
+        memory_limits: MemoryLimits | None = None,
+    ) -> None:
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.browser_profile = browser_profile
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_uses = max_uses
+        self.health_check_timeout = health_check_timeout
+        self.maintenance_interval = maintenance_interval
+        self.memory_limits = memory_limits or MemoryLimits()
+
+        self._idle: list[PooledSession] = []
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_size)
+        self._checked_out = 0
+        self._maintenance_task: asyncio.Task | None = None
+        self._closed = False
+
+    @classmethod
+    def from_env(cls, browser_profile: BrowserProfile) -> BrowserSessionPool:
+        """Builds a pool configured by the ``BROWSER_POOL_*`` environment variables."""
+        max_size = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+        return cls(
+            browser_profile,
+            min_size=int(os.getenv("BROWSER_POOL_MIN_IDLE", "1")),
+            max_size=max_size,
+            idle_timeout=float(os.getenv("BROWSER_POOL_IDLE_SECONDS", "300")),
+            max_uses=int(os.getenv("BROWSER_POOL_MAX_USES", "20")),
+            memory_limits=MemoryLimits.from_env(),
+        )
+
+    # --- Lifecycle ---
+
+    async def start(self) -> None:
+        """Pre-starts ``min_size`` sessions and begins periodic maintenance."""
+        await self._refill()
+        self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+        logger.info(
+            f"Browser pool started with {len(self._idle)} warm session(s) "
+            f"(max {self.max_size})."
+        )
+
+    async def close(self) -> None:
+        """Stops maintenance and kills every idle session."""
+        self._closed = True
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except asyncio.CancelledError:
+                pass
+        async with self._lock:
+            idle, self._idle = self._idle, []
+        await asyncio.gather(*(self._discard(p) for p in idle))
+
+    # --- Checkout ---
+
+    @asynccontextmanager
+    async def acquire(self, run_info: dict[str, Any] | None = None) -> AsyncIterator[BrowserSession]:
+        """Checks out a healthy, clean session and returns it to the pool afterwards.
+
+        The session's memory is sampled when it is returned; with ``run_info``,
+        that sample is also stored in it under "browser_memory".
+        """
+        if self._closed:
+            raise RuntimeError("Browser pool is closed.")
+        await self._slots.acquire()
+        self._checked_out += 1
+        pooled: PooledSession | None = None
+        try:
+            pooled = await self._checkout()
+            yield pooled.session
+        finally:
+            try:
+                if pooled is not None:
+                    await self._checkin(pooled, run_info)
+            finally:
+                self._checked_out -= 1
+                self._slots.release()
+
+    async def _checkout(self) -> PooledSession:
+        while True:
+            async with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                return await self._launch()
+            if await self._is_healthy(pooled):
+                return pooled
+            logger.warning("Discarding unhealthy pooled browser session.")
+            await self._discard(pooled)
+
+    async def _checkin(self, pooled: PooledSession, run_info: dict[str, Any] | None = None) -> None:
+        pooled.uses += 1
+        pooled.last_used_at = time.monotonic()
+        if self._closed:
+            await self._discard(pooled)
+            return
+        await self._sample_memory(pooled)
+        if run_info is not None and pooled.memory is not None:
+            run_info["browser_memory"] = pooled.memory.to_dict()
+        if pooled.uses >= self.max_uses or self._over_memory_limit(pooled):
+            await self._discard(pooled)
+            return
+        try:
+            await asyncio.wait_for(
+                reset_browser_state(pooled.session), timeout=self.health_check_timeout
+            )
+        except Exception as e:
+            logger.warning(f"Could not reset pooled browser session, discarding it: {e}")
+            await self._discard(pooled)
+            return
+        async with self._lock:
+            self._idle.append(pooled)
+
+    # --- Session management ---
+
+    async def _launch(self) -> PooledSession:
+        from browser_use import BrowserSession
+
+        # Every session needs its own profile directory; Chromium locks it.
+        user_data_dir = tempfile.mkdtemp(prefix="agentitest-pool-")
+        profile = self.browser_profile.model_copy(
+            update={"keep_alive": True, "user_data_dir": user_data_dir}
+        )
+        session = BrowserSession(browser_profile=profile)
+        try:
+            await session.start()
+        except Exception:
+            shutil.rmtree(user_data_dir, ignore_errors=True)
+            raise
+        pooled = PooledSession(session=session, user_data_dir=user_data_dir)
+        try:
+            pooled.browser_pid = await asyncio.to_thread(find_browser_pid, session)
+        except Exception as e:
+            logger.debug(f"Could not find the pooled browser's process: {e}")
+        return pooled
+
+    async def _discard(self, pooled: PooledSession) -> None:
+        try:
+            await pooled.session.kill()
+        except Exception as e:
+            logger.warning(f"Error while killing pooled browser session: {e}")
+        finally:
+            shutil.rmtree(pooled.user_data_dir, ignore_errors=True)
+
+    async def _is_healthy(self, pooled: PooledSession) -> bool:
+        try:
+            result = await asyncio.wait_for(
+                evaluate(pooled.session, "1 + 1"), timeout=self.health_check_timeout
+            )
+            return result == 2
+        except Exception:
+            return False
+
+    async def _sample_memory(self, pooled: PooledSession) -> None:
+        try:
+            pooled.memory = await asyncio.wait_for(
+                sample_session(pooled.session, pooled.browser_pid), timeout=self.health_check_timeout
+            )
+        except Exception as e:
+            logger.debug(f"Could not sample pooled browser memory: {e}")
+            pooled.memory = None
+
+    def _over_memory_limit(self, pooled: PooledSession) -> bool:
+        """Says whether the returned session's memory sample requires recycling it."""
+        if pooled.memory is None:
+            return False
+        reason = self.memory_limits.exceeded(pooled.memory)
+        if reason is None:
+            return False
+        logger.info(
+            f"Recycling pooled browser session after {pooled.uses} use(s): "
+            f"{pooled.memory.rss_mb or 0:.0f} MB in {pooled.memory.processes} process(es), "
+            f"{pooled.memory.pages} open page(s) (limits {self.memory_limits.max_rss_mb:.0f} MB, "
+            f"{self.memory_limits.max_pages} pages)."
+        )
+        BROWSER_RECYCLES.labels(reason=reason).inc()
+        return True
+
+    # --- Maintenance ---
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.maintenance_interval)
+            try:
+                await self._evict_idle()
+                await self._refill()
+            except Exception as e:
+                logger.warning(f"Browser pool maintenance failed: {e}")
+
+    async def _evict_idle(self) -> None:
+        """Health-checks idle sessions and evicts stale ones above ``min_size``.
+
+        Sessions are checked one at a time, each holding a slot like a
+        checkout, so ``acquire()`` never launches a browser past ``max_size``
+        while one is out of the idle list.
+        """
+        now = time.monotonic()
+        async with self._lock:
+            # Most recently used sessions sit at the end of the list; keep those first.
+            candidates = list(reversed(self._idle))
+
+        kept = 0
+        for pooled in candidates:
+            # Never wait for a busy pool; the rest are checked in the next round.
+            if self._closed or self._slots.locked():
+                return
+            await self._slots.acquire()
+            self._checked_out += 1
+            try:
+                async with self._lock:
+                    if pooled not in self._idle:
+                        continue  # Checked out in the meantime
+                    self._idle.remove(pooled)
+                expired = now - pooled.last_used_at > self.idle_timeout
+                if self._closed or (expired and kept >= self.min_size) or not await self._is_healthy(pooled):
+                    await self._discard(pooled)
+                    continue
+                kept += 1
+                async with self._lock:
+                    self._idle.append(pooled)
+                    self._idle.sort(key=lambda p: p.last_used_at)
+            finally:
+                self._checked_out -= 1
+                self._slots.release()
+
+    async def _refill(self) -> None:
+        while not self._closed:
+            async with self._lock:
+                if len(self._idle) >= self.min_size:
+                    return
+                # Never warm more browsers than the pool may hold in total.
+                if len(self._idle) + self._checked_out >= self.max_size:
+                    return
+            pooled = await self._launch()
+            async with self._lock:
+                self._idle.append(pooled)
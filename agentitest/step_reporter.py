@@ -0,0 +1,170 @@
+"""Allure reporting of agent steps that stays cheap on long runs.
+
+``AgentHistoryList.model_actions()``, ``model_thoughts()`` and ``urls()``
+rebuild their lists from the whole history on every call, so a step hook using
+them costs more with every step. ``StepReporter`` remembers the last history
+index it has seen and only reads the items added since.
+
+Allure writes a file per attachment, so the reporter captures each step's
+details (including its screenshot) when the step ends but writes them to the
+report in batches of ``REPORT_FLUSH_STEPS`` and on ``flush()``. Because of
+that, a step's own time in Allure is not meaningful; its "Step Duration"
+attachment is.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from screenshot_writer import decode_screenshot
+from telemetry import span
+
+if TYPE_CHECKING:
+    from browser_use import Agent
+    from screenshot_writer import ScreenshotWriter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingStep:
+    """One step captured by the hook and not yet written to the report."""
+
+    title: str
+    thought: str | None
+    url: str
+    duration_seconds: float | None
+    screenshot: bytes | None
+
+
+def format_step_title(action: dict[str, Any]) -> str:
+    """``Action: name(key=value, ...)`` for a dumped action model."""
+    action_name: str = next(iter(action)) if action else "No action"
+    action_params: dict[str, Any] = action.get(action_name) or {}
+    step_title = f"Action: {action_name}"
+    param_str = ", ".join(f"{k}={v}" for k, v in action_params.items())
+    if param_str:
+        step_title += f"({param_str})"
+    return step_title
+
+
+class StepReporter:
+    """``on_step_end`` hook adding one Allure step per agent step.
+
+    Use one reporter per agent run and call ``flush()`` when the run ends,
+    including when it fails, so the last batch reaches the report.
+    """
+
+    def __init__(
+        self,
+        screenshot_writer: ScreenshotWriter | None = None,
+        flush_every: int | None = None,
+    ) -> None:
+        if flush_every is None:
+            flush_every = int(os.getenv("REPORT_FLUSH_STEPS", "5"))
+        self.screenshot_writer = screenshot_writer
+        self.flush_every = max(flush_every, 1)
+        self.pending: list[PendingStep] = []
+        self._history: Any = None
+        self._next_index = 0
+        # Carried over from earlier items, like model_actions()[-1] and model_thoughts()[-1].
+        self._last_action: dict[str, Any] = {}
+        self._last_thought: str | None = None
+
+    async def __call__(self, agent: Agent) -> None:
+        await self.record(agent)
+
+    async def record(self, agent: Agent) -> None:
+        """Captures the agent's new history items and the current screenshot."""
+        history = agent.history
+        if history is not self._history:
+            # A new agent (e.g. the live agent taking over from a replay) starts its own history.
+            self._history = history
+            self._next_index = 0
+        items = history.history
+        url: str | None = None
+        duration: float | None = None
+        for item in items[self._next_index :]:
+            model_output = item.model_output
+            if model_output and model_output.action:
+                self._last_action = model_output.action[-1].model_dump(exclude_none=True)
+            if model_output:
+                self._last_thought = str(model_output.current_state)
+            url = item.state.url
+            duration = item.metadata.duration_seconds if item.metadata else None
+        self._next_index = len(items)
+
+        self.pending.append(
+            PendingStep(
+                title=format_step_title(self._last_action),
+                thought=self._last_thought,
+                url=url or "N/A",
+                duration_seconds=duration,
+                screenshot=await self._capture_screenshot(agent, step_num=len(items)),
+            )
+        )
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    async def _capture_screenshot(self, agent: Agent, step_num: int) -> bytes | None:
+        from playwright.sync_api import Error as PlaywrightError
+
+        try:
+            with span("screenshot"):
+                raw_screenshot = await agent.browser_session.take_screenshot()
+                # Decode off the event loop; hashing and the file write happen
+                # on the screenshot writer's background thread.
+                screenshot_bytes: bytes | None = (
+                    await asyncio.to_thread(decode_screenshot, raw_screenshot)
+                    if raw_screenshot
+                    else None
+                )
+        except PlaywrightError as e:
+            # This can happen if the page is closed before the screenshot is taken,
+            # which is common on the final step of an agent's task.
+            if "No target with given id found" in str(e):
+                logger.warning("Could not take screenshot: Page was already closed.")
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to take screenshot: {e}")
+            return None
+        if screenshot_bytes and self.screenshot_writer is not None:
+            self.screenshot_writer.submit(screenshot_bytes, step_num=step_num)
+        return screenshot_bytes
+
+    def flush(self) -> None:
+        """Writes the captured steps to the Allure report."""
+        if not self.pending:
+            return
+        import allure
+
+        pending, self.pending = self.pending, []
+        with span("reporting", attachment="batch", steps=len(pending)):
+            for step in pending:
+                try:
+                    with allure.step(step.title):
+                        if step.thought:
+                            allure.attach(
+                                step.thought,
+                                name="Agent Thoughts",
+                                attachment_type=allure.attachment_type.TEXT,
+                            )
+                        allure.attach(step.url, name="URL", attachment_type=allure.attachment_type.TEXT)
+                        if step.duration_seconds is not None:
+                            allure.attach(
+                                f"{step.duration_seconds:.2f}s",
+                                name="Step Duration",
+                                attachment_type=allure.attachment_type.TEXT,
+                            )
+                        if step.screenshot:
+                            allure.attach(
+                                step.screenshot,
+                                name="Screenshot",
+                                attachment_type=allure.attachment_type.PNG,
+                            )
+                except Exception as e:
+                    logger.warning(f"Failed to attach step {step.title!r} to the report: {e}")
@@ -0,0 +1,90 @@
+"""Live step events for streamed agent runs.
+
+``step_publisher(job)`` builds an ``on_step_end`` hook that describes every
+finished agent step (its actions, URL, duration, the agent's thought and a
+small JPEG thumbnail) and publishes it on the job. ``sse_event`` formats those
+events for a ``text/event-stream`` response.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from browser_utils import capture_thumbnail
+
+if TYPE_CHECKING:
+    from browser_use import Agent
+    from job_queue import Job
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_TIMEOUT_SECONDS = 5
+
+
+async def describe_step(agent: Agent, thumbnail_width: int) -> dict[str, Any]:
+    """Summarizes the agent's latest step; ``thumbnail_width=0`` skips the screenshot."""
+    history = agent.history
+    last_step = history.history[-1] if history.history else None
+    model_output = getattr(last_step, "model_output", None)
+
+    actions: list[dict[str, Any]] = []
+    for action in getattr(model_output, "action", None) or []:
+        dumped = action.model_dump(exclude_unset=True)
+        name = next(iter(dumped), "unknown")
+        actions.append({"name": name, "params": dumped.get(name) or {}})
+    errors = [r.error for r in getattr(last_step, "result", None) or [] if getattr(r, "error", None)]
+    metadata = getattr(last_step, "metadata", None)
+
+    thumbnail: str | None = None
+    if thumbnail_width:
+        try:
+            thumbnail = await asyncio.wait_for(
+                capture_thumbnail(agent.browser_session, width=thumbnail_width),
+                timeout=THUMBNAIL_TIMEOUT_SECONDS,
+            )
+        except Exception as e:
+            # The page may be closing on the last step; the event is still useful.
+            logger.debug(f"Could not capture step thumbnail: {e}")
+
+    return {
+        "step": len(history.history),
+        "actions": actions,
+        "url": getattr(getattr(last_step, "state", None), "url", None),
+        "duration_seconds": getattr(metadata, "duration_seconds", None),
+        "thought": getattr(model_output, "next_goal", None),
+        "evaluation": getattr(model_output, "evaluation_previous_goal", None),
+        "error": errors[0] if errors else None,
+        "thumbnail_jpeg": thumbnail,
+    }
+
+
+def step_publisher(job: Job, thumbnail_width: int | None = None) -> Callable[[Agent], Awaitable[None]]:
+    """Returns an ``on_step_end`` hook publishing each step on ``job``.
+
+    ``thumbnail_width`` defaults to ``STREAM_THUMBNAIL_WIDTH`` (320, 0 disables).
+    """
+    if thumbnail_width is None:
+        thumbnail_width = int(os.getenv("STREAM_THUMBNAIL_WIDTH", "320"))
+
+    async def on_step_end(agent: Agent) -> None:
+        try:
+            job.publish({"type": "step", **await describe_step(agent, thumbnail_width)})
+        except Exception as e:
+            # Progress reporting must never fail the run itself.
+            logger.warning(f"Could not publish step for job {job.id}: {e}")
+
+    return on_step_end
+
+
+def sse_event(event: str, data: dict[str, Any]) -> str:
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def ndjson_line(data: dict[str, Any]) -> str:
+    """Formats one line of newline-delimited JSON."""
+    return json.dumps(data, default=str) + "\n"
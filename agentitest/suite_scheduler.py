@@ -0,0 +1,99 @@
+"""Pytest plugin that orders agent tests from their run history.
+
+Durations and recent outcomes of every test are kept in the pytest cache.
+On the next run, tests whose last run failed go first (highest failure rate
+first) and the rest run longest-first, so ``pytest -n`` workers finish at
+about the same time instead of waiting on one slow test picked up last.
+Combine with ``-x`` or ``--maxfail=N`` to stop early once failures show up.
+
+Registered from conftest.py; ``--schedule=collection`` keeps pytest's order.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any
+
+import pytest
+
+HISTORY_KEY = "agentitest/run_history"
+RECENT_RUNS = 10  # Outcomes kept per test for its failure rate
+DEFAULT_DURATION_SECONDS = 60.0  # Assumed for tests that never ran
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--schedule",
+        choices=("history", "collection"),
+        default="history",
+        help="Test order: 'history' runs last failures first, then longest first (default); "
+        "'collection' keeps pytest's order.",
+    )
+
+
+def _is_xdist_worker(config: pytest.Config) -> bool:
+    return hasattr(config, "workerinput")
+
+
+def order_by_history(nodeids: list[str], history: dict[str, dict[str, Any]]) -> list[str]:
+    """Last run failed first (highest failure rate first), then longest expected duration first."""
+    known = [e["avg_duration_seconds"] for e in history.values() if e.get("avg_duration_seconds")]
+    unknown_duration = sum(known) / len(known) if known else DEFAULT_DURATION_SECONDS
+
+    def key(nodeid: str) -> tuple[bool, float, float]:
+        entry = history.get(nodeid) or {}
+        recent = entry.get("recent") or []
+        last_failed = bool(recent) and recent[-1] == "failed"
+        failure_rate = recent.count("failed") / len(recent) if recent else 0.0
+        duration = entry.get("avg_duration_seconds") or unknown_duration
+        return (not last_failed, -failure_rate if last_failed else 0.0, -duration)
+
+    return sorted(nodeids, key=key)
+
+
+class HistoryScheduler:
+    """Reorders the collected tests and records how the run went."""
+
+    def __init__(self, config: pytest.Config) -> None:
+        self.config = config
+        self.results: dict[str, dict[str, Any]] = {}
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, items: list[pytest.Item]) -> None:
+        if self.config.getoption("schedule") != "history":
+            return
+        # Every xdist worker reads the same history, so all of them agree on the order.
+        history = self.config.cache.get(HISTORY_KEY, {})
+        by_id = {item.nodeid: item for item in items}
+        items[:] = [by_id[nodeid] for nodeid in order_by_history(list(by_id), history)]
+
+    def pytest_runtest_logreport(self, report: pytest.TestReport) -> None:
+        # With xdist this runs on the controller for the reports of all workers.
+        result = self.results.setdefault(report.nodeid, {"duration": 0.0, "failed": False, "skipped": False})
+        result["duration"] += report.duration
+        result["failed"] = result["failed"] or report.failed
+        result["skipped"] = result["skipped"] or report.skipped
+
+    def pytest_sessionfinish(self) -> None:
+        if _is_xdist_worker(self.config) or not self.results:
+            return
+        history = self.config.cache.get(HISTORY_KEY, {})
+        for nodeid, result in self.results.items():
+            if result["skipped"]:
+                continue
+            entry = history.setdefault(nodeid, {"runs": 0, "failures": 0, "avg_duration_seconds": None, "recent": []})
+            entry["runs"] += 1
+            entry["failures"] += 1 if result["failed"] else 0
+            previous = entry["avg_duration_seconds"]
+            entry["avg_duration_seconds"] = (
+                result["duration"] if previous is None else 0.7 * previous + 0.3 * result["duration"]
+            )
+            entry["recent"] = (entry["recent"] + ["failed" if result["failed"] else "passed"])[-RECENT_RUNS:]
+            entry["last_run_at"] = time.time()
+        self.config.cache.set(HISTORY_KEY, history)
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    # The cache is missing when run with -p no:cacheprovider.
+    if getattr(config, "cache", None) is not None:
+        config.pluginmanager.register(HistoryScheduler(config), "agentitest-history-scheduler")
@@ -0,0 +1,195 @@
+"""Per-run latency spans and Prometheus metrics for agent runs.
+
+Spans (LLM calls, browser actions, agent steps, screenshots, reporting) are
+collected for the run that is active in the current task and written as one
+JSONL file per run. The same measurements feed the Prometheus histograms the
+agent server exposes on ``/metrics``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# --- Prometheus Metrics ---
+
+REQUEST_DURATION = Histogram(
+    "agentitest_request_duration_seconds",
+    "HTTP request duration.",
+    ["method", "path", "status"],
+    buckets=(0.05, 0.1, 0.5, 1, 5, 15, 30, 60, 120, 180, 300),
+)
+QUEUE_WAIT = Histogram(
+    "agentitest_queue_wait_seconds",
+    "Time a job waited in the queue before an agent picked it up.",
+    buckets=(0.01, 0.1, 0.5, 1, 5, 15, 30, 60, 120, 300),
+)
+STEPS_PER_TASK = Histogram(
+    "agentitest_steps_per_task",
+    "Agent steps needed to finish a task.",
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+LLM_CALL_LATENCY = Histogram(
+    "agentitest_llm_call_seconds",
+    "Latency of a single LLM call.",
+    ["model"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60),
+)
+SPAN_DURATION = Histogram(
+    "agentitest_span_seconds",
+    "Duration of instrumented spans inside an agent run.",
+    ["span"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+
+
+# --- Run Traces ---
+
+
+@dataclass
+class RunTrace:
+    """Spans recorded for one agent run."""
+
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    spans: list[dict[str, Any]] = field(default_factory=list)
+    tokens: int = 0  # LLM tokens used by the run, for token budgets
+
+    def add(self, name: str, start: float, duration: float, **attributes: Any) -> None:
+        self.spans.append(
+            {"run_id": self.run_id, "name": name, "start": start, "duration_seconds": duration, **attributes}
+        )
+
+    def write(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.run_id}.jsonl")
+        with open(path, "w") as f:
+            f.writelines(json.dumps(span, default=str) + "\n" for span in self.spans)
+        return path
+
+
+_current_trace: ContextVar[RunTrace | None] = ContextVar("agentitest_run_trace", default=None)
+
+
+def current_trace() -> RunTrace | None:
+    return _current_trace.get()
+
+
+@contextmanager
+def run_trace(run_id: str | None = None) -> Iterator[RunTrace]:
+    """Collects spans for the enclosed run and writes them out as JSONL when it ends.
+
+    Nested calls reuse the outer trace, so a run is never split across files.
+    """
+    existing = _current_trace.get()
+    if existing is not None:
+        yield existing
+        return
+    trace = RunTrace(run_id=run_id) if run_id else RunTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        if os.getenv("AGENT_TRACES", "true").lower() in ("true", "1", "t"):
+            directory = os.getenv("AGENT_TRACE_DIR", os.path.join(PROJECT_ROOT, "traces"))
+            try:
+                path = trace.write(directory)
+                logger.info(f"Wrote {len(trace.spans)} span(s) to {path}")
+            except OSError as e:
+                logger.warning(f"Could not write run trace: {e}")
+
+
+def record_span(name: str, start: float, duration: float, **attributes: Any) -> None:
+    """Records an already-measured span (``start`` is a wall-clock timestamp)."""
+    SPAN_DURATION.labels(span=name).observe(duration)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, start, duration, **attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+    """Times the enclosed block; extra attributes can be added to the yielded dict."""
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        record_span(name, started_at, time.perf_counter() - start, **attributes)
+
+
+# --- LLM Instrumentation ---
+
+
+class InstrumentedLLM:
+    """Wraps a browser_use chat model and times every ``ainvoke`` call.
+
+    All other attributes are delegated to the wrapped model, so the agent sees
+    the same model name, provider and settings.
+    """
+
+    def __init__(self, llm: Any) -> None:
+        self._llm = llm
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._llm, name)
+
+    async def ainvoke(self, *args: Any, **kwargs: Any) -> Any:
+        model = str(getattr(self._llm, "model", "unknown"))
+        with span("llm_call", model=model) as attributes:
+            start = time.perf_counter()
+            try:
+                response = await self._llm.ainvoke(*args, **kwargs)
+            finally:
+                LLM_CALL_LATENCY.labels(model=model).observe(time.perf_counter() - start)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                attributes["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+                attributes["completion_tokens"] = getattr(usage, "completion_tokens", None)
+                trace = _current_trace.get()
+                if trace is not None:
+                    trace.tokens += getattr(usage, "total_tokens", None) or (
+                        (attributes["prompt_tokens"] or 0) + (attributes["completion_tokens"] or 0)
+                    )
+            return response
+
+
+def instrument_agent(agent: Any) -> None:
+    """Times the agent's browser actions by wrapping its ``multi_act`` method."""
+    multi_act = agent.multi_act
+
+    async def timed_multi_act(actions: Any, *args: Any, **kwargs: Any) -> Any:
+        with span("browser_actions", count=len(actions)):
+            return await multi_act(actions, *args, **kwargs)
+
+    agent.multi_act = timed_multi_act
+
+
+def record_history_spans(history: Any) -> None:
+    """Adds one ``agent_step`` span per history item and observes steps per task."""
+    items = getattr(history, "history", None) or []
+    STEPS_PER_TASK.observe(len(items))
+    for item in items:
+        metadata = getattr(item, "metadata", None)
+        if metadata is None:
+            continue
+        record_span(
+            "agent_step",
+            metadata.step_start_time,
+            metadata.duration_seconds,
+            step=getattr(metadata, "step_number", None),
+            url=getattr(getattr(item, "state", None), "url", None),
+        )
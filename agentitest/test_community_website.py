@@ -1,9 +1,15 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
 import allure
-from browser_use import BrowserSession, ChatGoogle
 import pytest
 
 from test_utils import BaseAgentTest
 
+if TYPE_CHECKING:
+    from browser_use import BrowserSession, ChatGoogle
+
 
 @allure.feature("Main Navigation")
 class TestMainNavigation(BaseAgentTest):
@@ -14,10 +20,14 @@ class TestMainNavigation(BaseAgentTest):
     @pytest.mark.parametrize(
         ("link_text", "expected_path_segment"),
         [
-            ("Google Cloud", "/c/google-cloud/14"),
-            ("Looker", "/c/looker/19"),
-            ("Google Workspace Developers", "/c/google-workspace/20"),
-            ("AppSheet", "/c/appsheet/21"),
+            pytest.param("Google Cloud", "/c/google-cloud/14", marks=pytest.mark.pages("c/google-cloud/14")),
+            pytest.param("Looker", "/c/looker/19", marks=pytest.mark.pages("c/looker/19")),
+            pytest.param(
+                "Google Workspace Developers",
+                "/c/google-workspace/20",
+                marks=pytest.mark.pages("c/google-workspace/20"),
+            ),
+            pytest.param("AppSheet", "/c/appsheet/21", marks=pytest.mark.pages("c/appsheet/21")),
         ],
     )
     async def test_main_navigation(
@@ -64,7 +74,13 @@ class TestSearch(BaseAgentTest):
 
     @allure.story("Searching for Terms")
     @allure.title("Search for '{term}'")
-    @pytest.mark.parametrize("term", ["Google Cloud", "Looker"])
+    @pytest.mark.parametrize(
+        "term",
+        [
+            pytest.param("Google Cloud", marks=pytest.mark.pages("search?q=Google%20Cloud")),
+            pytest.param("Looker", marks=pytest.mark.pages("search?q=Looker")),
+        ],
+    )
     async def test_search_for_term(
         self,
         llm: ChatGoogle,
@@ -85,6 +101,7 @@ class TestSearch(BaseAgentTest):
 
     @allure.story("Searching for Non-Existent Term")
     @allure.title("Search for a Non-Existent Term")
+    @pytest.mark.pages("search?q=a_very_unlikely_search_term_xyz")
     async def test_search_for_non_existent_term(
         self,
         llm: ChatGoogle,
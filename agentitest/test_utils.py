@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-from agent_runner import run_agent_task
-from conftest import record_step
-from browser_use import BrowserSession, ChatGoogle
+from typing import TYPE_CHECKING
+
+from conftest import screenshot_writer
+
+if TYPE_CHECKING:
+    from browser_use import BrowserSession, ChatGoogle
 
 
 class BaseAgentTest:
@@ -19,10 +22,18 @@ class BaseAgentTest:
         ignore_case: bool = False,
     ) -> str:
         """Runs a task with the agent, prepends the BASE_URL, and performs common assertions."""
+        # Imported here so collecting the tests doesn't load the agent stack (see conftest.py).
+        from agent_runner import run_agent_task
+        from step_reporter import StepReporter
+
         full_task: str = f"Go to {self.BASE_URL}, then {task_instruction}"
-        result_text: str = await run_agent_task(
-            full_task, llm, browser_session, on_step_end=record_step
-        )
+        reporter = StepReporter(screenshot_writer)
+        try:
+            result_text: str = await run_agent_task(
+                full_task, llm, browser_session, on_step_end=reporter, start_url=self.BASE_URL
+            )
+        finally:
+            reporter.flush()
         assert result_text is not None and result_text.strip() != "", (
             "Agent did not return a result."
         )
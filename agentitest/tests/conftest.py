@@ -0,0 +1,10 @@
+"""Unit tests for the server-side modules. They need no browser or LLM."""
+
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def allure_environment() -> None:
+    """Overrides the root fixture so the unit tests don't probe the browser version."""
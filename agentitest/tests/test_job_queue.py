@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from job_queue import JobScheduler, JobStatus, QueueFullError, current_job
+
+
+class Gate:
+    """A runner that blocks each job until the test releases it."""
+
+    def __init__(self) -> None:
+        self.started: list[dict[str, Any]] = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, payload: dict[str, Any]) -> Any:
+        self.started.append(payload)
+        await self.release.wait()
+        if payload.get("fail"):
+            raise RuntimeError("boom")
+        return payload["n"]
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+async def gate_scheduler():
+    gate = Gate()
+    scheduler = JobScheduler(gate, max_concurrency=1, max_queued=2)
+    await scheduler.start()
+    yield gate, scheduler
+    gate.release.set()
+    await scheduler.close()
+
+
+async def test_runs_jobs_and_reports_results(gate_scheduler) -> None:
+    gate, scheduler = gate_scheduler
+    ok = scheduler.submit({"n": 1})
+    failed = scheduler.submit({"n": 2, "fail": True})
+    gate.release.set()
+    await asyncio.wait_for(failed.wait(), 1)
+    assert ok.status is JobStatus.SUCCEEDED and ok.result == 1
+    assert failed.status is JobStatus.FAILED and failed.error == "boom"
+
+
+async def test_limits_concurrency(gate_scheduler) -> None:
+    gate, scheduler = gate_scheduler
+    first = scheduler.submit({"n": 1})
+    second = scheduler.submit({"n": 2})
+    await settle()
+    assert gate.started == [{"n": 1}]
+    assert first.status is JobStatus.RUNNING and second.status is JobStatus.QUEUED
+    assert scheduler.running == 1 and scheduler.queued == 1
+
+
+async def test_rejects_submissions_when_queue_is_full(gate_scheduler) -> None:
+    gate, scheduler = gate_scheduler
+    scheduler.submit({"n": 1})
+    await settle()
+    scheduler.submit({"n": 2})
+    scheduler.submit({"n": 3})
+    with pytest.raises(QueueFullError):
+        scheduler.submit({"n": 4})
+
+
+async def test_cancelling_a_queued_job_frees_its_slot(gate_scheduler) -> None:
+    gate, scheduler = gate_scheduler
+    scheduler.submit({"n": 1})
+    await settle()
+    queued = scheduler.submit({"n": 2})
+    scheduler.submit({"n": 3})
+    assert scheduler.cancel(queued.id)
+    assert queued.status is JobStatus.CANCELLED
+    assert scheduler.queued == 1
+    scheduler.submit({"n": 4})
+
+    gate.release.set()
+    await settle()
+    await asyncio.wait_for(asyncio.gather(*(job.wait() for job in scheduler._jobs.values())), 1)
+    assert {"n": 2} not in gate.started
+
+
+async def test_cancelling_a_running_job_keeps_the_worker(gate_scheduler) -> None:
+    gate, scheduler = gate_scheduler
+    running = scheduler.submit({"n": 1})
+    await settle()
+    assert scheduler.cancel(running.id)
+    await asyncio.wait_for(running.wait(), 1)
+    assert running.status is JobStatus.CANCELLED
+    assert not scheduler.cancel(running.id)
+
+    gate.release.set()
+    after = scheduler.submit({"n": 2})
+    await asyncio.wait_for(after.wait(), 1)
+    assert after.status is JobStatus.SUCCEEDED
+
+
+async def test_close_cancels_queued_and_running_jobs(gate_scheduler) -> None:
+    gate, scheduler = gate_scheduler
+    running = scheduler.submit({"n": 1})
+    await settle()
+    queued = scheduler.submit({"n": 2})
+    await scheduler.close()
+    assert running.status is JobStatus.CANCELLED
+    assert queued.status is JobStatus.CANCELLED
+
+
+async def test_runner_sees_its_job_and_streams_events() -> None:
+    async def runner(payload: dict[str, Any]) -> None:
+        job = current_job()
+        job.publish({"step": 1})
+        job.publish({"step": 2})
+
+    scheduler = JobScheduler(runner, max_concurrency=1)
+    await scheduler.start()
+    job = scheduler.submit({})
+    events = [event async for event in job.stream()]
+    await scheduler.close()
+    assert events == [{"step": 1}, {"step": 2}]
+    assert job.status is JobStatus.SUCCEEDED
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from contextlib import closing
+from typing import Any
+
+import pytest
+
+from job_queue import JobScheduler, JobStatus, QueueFullError, current_job
+from job_store import JobCoordinator, SQLiteJobStore
+
+
+@pytest.fixture
+def store(tmp_path) -> SQLiteJobStore:
+    return SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def attempts(store: SQLiteJobStore, job_id: str) -> int:
+    with closing(sqlite3.connect(store.path)) as db:
+        return db.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+
+def test_enqueue_rejects_jobs_over_the_limit(store: SQLiteJobStore) -> None:
+    store.enqueue({"n": 1}, max_queued=2)
+    store.enqueue({"n": 2}, max_queued=2)
+    with pytest.raises(QueueFullError):
+        store.enqueue({"n": 3}, max_queued=2)
+    assert store.counts() == {"queued": 2}
+
+
+def test_claim_hands_out_the_oldest_job_once(store: SQLiteJobStore) -> None:
+    first = store.enqueue({"n": 1}, max_queued=10)
+    second = store.enqueue({"n": 2}, max_queued=10)
+
+    claimed = store.claim("worker-a")
+    assert claimed.id == first.id
+    assert claimed.status is JobStatus.RUNNING
+    assert claimed.payload == {"n": 1}
+    assert store.claim("worker-b").id == second.id
+    assert store.claim("worker-c") is None
+
+
+def test_finish_stores_the_outcome_for_the_owning_worker_only(store: SQLiteJobStore) -> None:
+    job = store.enqueue({}, max_queued=10)
+    claimed = store.claim("worker-a")
+    claimed._finish(JobStatus.SUCCEEDED, result={"passed": True})
+
+    assert not store.finish("worker-b", claimed)
+    assert store.finish("worker-a", claimed)
+    stored = store.get(job.id)
+    assert stored.status is JobStatus.SUCCEEDED
+    assert stored.result == {"passed": True}
+
+
+def test_requeue_lost_retries_then_gives_up(store: SQLiteJobStore) -> None:
+    job = store.enqueue({}, max_queued=10)
+    store.claim("worker-a")
+    assert store.requeue_lost(heartbeat_timeout=60, max_attempts=2) == 0
+
+    assert store.requeue_lost(heartbeat_timeout=-1, max_attempts=2) == 1
+    assert store.get(job.id).status is JobStatus.QUEUED
+
+    claimed = store.claim("worker-b")
+    store.requeue_lost(heartbeat_timeout=-1, max_attempts=2)
+    failed = store.get(job.id)
+    assert failed.status is JobStatus.FAILED
+    assert "stopped responding 2 time(s)" in failed.error
+    # A late result from the lost worker no longer applies.
+    claimed._finish(JobStatus.SUCCEEDED)
+    assert not store.finish("worker-b", claimed)
+
+
+def test_release_returns_jobs_without_using_an_attempt(store: SQLiteJobStore) -> None:
+    job = store.enqueue({}, max_queued=10)
+    store.claim("worker-a")
+    store.release("worker-b", [job.id])
+    assert store.get(job.id).status is JobStatus.RUNNING
+
+    store.release("worker-a", [job.id])
+    assert store.get(job.id).status is JobStatus.QUEUED
+    assert attempts(store, job.id) == 0
+
+
+def test_cancel_queued_and_running_jobs(store: SQLiteJobStore) -> None:
+    running = store.enqueue({"n": 1}, max_queued=10)
+    queued = store.enqueue({"n": 2}, max_queued=10)
+    store.claim("worker-a")
+
+    assert store.cancel(queued.id)
+    assert store.get(queued.id).status is JobStatus.CANCELLED
+    assert store.cancel(running.id)
+    assert store.heartbeat("worker-a") == [running.id]
+    assert store.heartbeat("worker-b") == []
+    assert not store.cancel(queued.id)
+
+
+def test_snapshots_return_only_new_events(store: SQLiteJobStore) -> None:
+    job = store.enqueue({}, max_queued=10)
+    store.add_events(job.id, [{"step": 1}, {"step": 2}])
+    snapshot = store.snapshots({job.id: 0})[job.id]
+    assert [event for _, event in snapshot.events] == [{"step": 1}, {"step": 2}]
+
+    last_seen = snapshot.events[-1][0]
+    store.add_events(job.id, [{"step": 3}])
+    assert [event for _, event in store.snapshots({job.id: last_seen})[job.id].events] == [{"step": 3}]
+    assert store.snapshots({"missing": 0}) == {}
+
+
+async def test_coordinator_queries_the_store_off_the_loop(store: SQLiteJobStore) -> None:
+    coordinator = JobCoordinator(store, max_queued=1)
+    job = await coordinator.submit({"n": 1})
+    with pytest.raises(QueueFullError):
+        await coordinator.submit({"n": 2})
+    assert await coordinator.get(job.id) is job
+    assert await JobCoordinator(store).get(job.id) is not None
+    assert await coordinator.get("missing") is None
+    assert await coordinator.cancel(job.id)
+    assert store.get(job.id).status is JobStatus.CANCELLED
+
+
+async def test_worker_shutdown_releases_interrupted_jobs(store: SQLiteJobStore) -> None:
+    from worker import JobWorker
+
+    started = asyncio.Event()
+
+    async def runner(payload: dict[str, Any]) -> None:
+        current_job().publish({"step": 1})
+        started.set()
+        await asyncio.sleep(60)
+
+    job = store.enqueue({}, max_queued=10)
+    worker = JobWorker(store, JobScheduler(runner, max_concurrency=1, max_queued=1), poll_interval=60)
+    task = asyncio.create_task(worker.run())
+    await asyncio.wait_for(started.wait(), 5)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert worker.scheduler.get(job.id).status is JobStatus.CANCELLED
+    assert store.get(job.id).status is JobStatus.QUEUED
+    assert attempts(store, job.id) == 0
+    # The step it ran before the shutdown is not lost.
+    assert [event for _, event in store.snapshots({job.id: 0})[job.id].events] == [{"step": 1}]
+
+
+async def test_worker_shutdown_stores_jobs_cancelled_on_request(store: SQLiteJobStore) -> None:
+    from worker import JobWorker
+
+    async def runner(payload: dict[str, Any]) -> None:
+        await asyncio.sleep(60)
+
+    scheduler = JobScheduler(runner, max_concurrency=1, max_queued=1)
+    await scheduler.start()
+    worker = JobWorker(store, scheduler)
+    store.enqueue({}, max_queued=10)
+    claimed = store.claim(worker.worker_id)
+    job = scheduler.submit(claimed.payload, job_id=claimed.id)
+    await asyncio.sleep(0)
+    scheduler.cancel(job.id)
+
+    await worker._shut_down({job.id: job}, {job.id: 0}, {job.id})
+
+    assert store.get(job.id).status is JobStatus.CANCELLED
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import llm_client
+from llm_client import AdaptiveConcurrency, LLMGovernor, TokenBucket, get_llm
+
+
+class Overloaded(Exception):
+    status_code = 429
+
+
+# --- TokenBucket ---
+
+
+async def test_bucket_hands_out_its_capacity_without_waiting() -> None:
+    bucket = TokenBucket(rate_per_minute=60, capacity=3)
+    for _ in range(3):
+        assert await bucket.acquire() == 0.0
+    assert bucket.tokens < 1
+
+
+async def test_bucket_waits_for_refill() -> None:
+    bucket = TokenBucket(rate_per_minute=6000, capacity=1)  # 100 units per second
+    await bucket.acquire()
+    started = time.monotonic()
+    waited = await bucket.acquire()
+    assert waited > 0
+    assert time.monotonic() - started >= 0.005
+
+
+async def test_bucket_caps_large_requests_at_capacity() -> None:
+    bucket = TokenBucket(rate_per_minute=60, capacity=5)
+    assert await bucket.acquire(50) == 0.0
+
+
+def test_bucket_adjust_goes_into_debt_and_refunds_up_to_capacity() -> None:
+    bucket = TokenBucket(rate_per_minute=60, capacity=10)
+    bucket.adjust(25)
+    assert bucket.tokens < 0
+    bucket.adjust(-100)
+    assert bucket.tokens == 10
+
+
+# --- AdaptiveConcurrency ---
+
+
+async def test_concurrency_halves_on_overload_once_per_cooldown() -> None:
+    concurrency = AdaptiveConcurrency(initial=8, maximum=16, cooldown_seconds=60)
+    for _ in range(3):
+        await concurrency.acquire()
+    for _ in range(3):
+        await concurrency.release(overloaded=True)
+    assert concurrency.limit == 4
+    assert concurrency.in_flight == 0
+
+
+async def test_concurrency_grows_back_one_step_per_window() -> None:
+    concurrency = AdaptiveConcurrency(initial=2, maximum=3)
+    for _ in range(2):
+        await concurrency.acquire()
+        await concurrency.release(overloaded=False)
+    assert concurrency.limit == pytest.approx(3, abs=0.2)
+    for _ in range(10):
+        await concurrency.acquire()
+        await concurrency.release(overloaded=False)
+    assert concurrency.limit == 3
+
+
+async def test_concurrency_never_drops_below_minimum() -> None:
+    concurrency = AdaptiveConcurrency(initial=2, minimum=1, cooldown_seconds=0)
+    for _ in range(5):
+        await concurrency.acquire()
+        await concurrency.release(overloaded=True)
+    assert concurrency.limit == 1
+
+
+async def test_concurrency_blocks_at_the_limit() -> None:
+    concurrency = AdaptiveConcurrency(initial=1, maximum=1)
+    await concurrency.acquire()
+    waiter = asyncio.create_task(concurrency.acquire())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+    await concurrency.release(overloaded=False)
+    await asyncio.wait_for(waiter, 1)
+    assert concurrency.in_flight == 1
+
+
+# --- LLMGovernor ---
+
+
+def governor(**kwargs) -> LLMGovernor:
+    return LLMGovernor(requests_per_minute=0, tokens_per_minute=0, retry_base_delay=0, **kwargs)
+
+
+async def test_governor_retries_overloaded_calls() -> None:
+    calls = 0
+
+    async def invoke() -> str:
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise Overloaded()
+        return "ok"
+
+    assert await governor().call(invoke) == "ok"
+    assert calls == 3
+
+
+async def test_governor_gives_up_after_max_retries() -> None:
+    async def invoke() -> None:
+        raise Overloaded()
+
+    with pytest.raises(Overloaded):
+        await governor(max_retries=2).call(invoke)
+
+
+async def test_governor_does_not_retry_other_errors() -> None:
+    calls = 0
+
+    async def invoke() -> None:
+        nonlocal calls
+        calls += 1
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        await governor().call(invoke)
+    assert calls == 1
+
+
+async def test_governor_learns_tokens_per_call() -> None:
+    limited = LLMGovernor(requests_per_minute=0, tokens_per_minute=100_000, estimated_tokens=1000)
+
+    async def invoke() -> SimpleNamespace:
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=2000))
+
+    await limited.call(invoke)
+    assert limited.estimated_tokens == pytest.approx(1200)
+    assert limited.tokens.tokens == pytest.approx(98_000, abs=50)
+
+
+def test_governor_works_across_event_loops() -> None:
+    limited = LLMGovernor(requests_per_minute=600, tokens_per_minute=0)
+
+    async def invoke() -> str:
+        return "ok"
+
+    assert asyncio.run(limited.call(invoke)) == "ok"
+    assert asyncio.run(limited.call(invoke)) == "ok"
+
+
+# --- get_llm ---
+
+
+def test_get_llm_keys_clients_by_temperature_and_shares_the_governor(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(llm_client, "_clients", {})
+    monkeypatch.setattr(llm_client, "_governors", {})
+    monkeypatch.setattr(
+        llm_client, "_create_chat_model", lambda model, temperature: SimpleNamespace(temperature=temperature)
+    )
+    cold = get_llm("model-a", temperature=0.0)
+    warm = get_llm("model-a", temperature=0.7)
+    assert get_llm("model-a", temperature=0.0) is cold
+    assert (cold.temperature, warm.temperature) == (0.0, 0.7)
+    assert cold.governor is warm.governor
+    assert get_llm("model-b", temperature=0.0).governor is not cold.governor
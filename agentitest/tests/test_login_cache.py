@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import os
+import stat
+import time
+
+import pytest
+
+import browser_utils
+import login_cache
+from browser_utils import apply_storage_state, capture_storage_state
+from login_cache import LoginStateCache, remember_login, restore_login
+
+LOGIN_URL = "https://app.example.test/login"
+STATE = {
+    "cookies": [{"name": "sid", "value": "abc", "domain": "app.example.test", "path": "/"}],
+    "origins": [{"origin": "https://app.example.test", "localStorage": [{"name": "token", "value": "t"}]}],
+}
+
+
+@pytest.fixture
+def cache(tmp_path) -> LoginStateCache:
+    return LoginStateCache(str(tmp_path), ttl_seconds=60)
+
+
+def test_entries_are_scoped_to_login_url_and_user(cache: LoginStateCache) -> None:
+    cache.save(LOGIN_URL, "alice", STATE)
+    assert cache.load(LOGIN_URL, "alice") == STATE
+    assert cache.load(LOGIN_URL, "bob") is None
+    assert cache.load("https://other.example.test/login", "alice") is None
+    assert stat.S_IMODE(os.stat(cache._path(LOGIN_URL, "alice")).st_mode) == 0o600
+
+
+def test_expired_entry_is_dropped(cache: LoginStateCache, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache.save(LOGIN_URL, "alice", STATE)
+    later = time.time() + 61
+    monkeypatch.setattr(login_cache.time, "time", lambda: later)
+    assert cache.load(LOGIN_URL, "alice") is None
+    assert not os.path.exists(cache._path(LOGIN_URL, "alice"))
+
+
+def test_unreadable_entry_is_a_miss(cache: LoginStateCache) -> None:
+    os.makedirs(cache.cache_dir, exist_ok=True)
+    with open(cache._path(LOGIN_URL, "alice"), "w") as f:
+        f.write("{not json")
+    assert cache.load(LOGIN_URL, "alice") is None
+
+
+class FakeBrowser:
+    """Stands in for the CDP helpers login_cache uses; ``signed_in`` drives the probe."""
+
+    def __init__(self, monkeypatch: pytest.MonkeyPatch, signed_in: bool) -> None:
+        self.signed_in = signed_in
+        self.applied: list[dict] = []
+        self.visited: list[str] = []
+        monkeypatch.setattr(login_cache, "evaluate", self.evaluate)
+        monkeypatch.setattr(login_cache, "navigate", self.navigate)
+        monkeypatch.setattr(login_cache, "apply_storage_state", self.apply_storage_state)
+        monkeypatch.setattr(login_cache, "capture_storage_state", self.capture_storage_state)
+
+    async def evaluate(self, session, expression: str) -> bool:
+        return self.signed_in
+
+    async def navigate(self, session, url: str) -> None:
+        self.visited.append(url)
+
+    async def apply_storage_state(self, session, state: dict) -> None:
+        self.applied.append(state)
+
+    async def capture_storage_state(self, session) -> dict:
+        return STATE
+
+
+async def test_restores_a_login_that_is_still_valid(cache: LoginStateCache, monkeypatch: pytest.MonkeyPatch) -> None:
+    browser = FakeBrowser(monkeypatch, signed_in=True)
+    cache.save(LOGIN_URL, "alice", STATE)
+    assert await restore_login(cache, object(), LOGIN_URL, "alice")
+    assert browser.applied == [STATE]
+    assert browser.visited == [LOGIN_URL]
+
+
+async def test_drops_a_login_the_site_no_longer_accepts(
+    cache: LoginStateCache, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    FakeBrowser(monkeypatch, signed_in=False)
+    cache.save(LOGIN_URL, "alice", STATE)
+    assert not await restore_login(cache, object(), LOGIN_URL, "alice")
+    assert cache.load(LOGIN_URL, "alice") is None
+
+
+async def test_remembers_only_signed_in_pages(cache: LoginStateCache, monkeypatch: pytest.MonkeyPatch) -> None:
+    browser = FakeBrowser(monkeypatch, signed_in=False)
+    await remember_login(cache, object(), LOGIN_URL, "alice")
+    assert cache.load(LOGIN_URL, "alice") is None
+    browser.signed_in = True
+    await remember_login(cache, object(), LOGIN_URL, "alice")
+    assert cache.load(LOGIN_URL, "alice") == STATE
+
+
+class FakeCDPSession:
+    """A session whose page is on ``origin``, with a cookie jar and per-origin localStorage."""
+
+    def __init__(self, origin: str) -> None:
+        self.origin = origin
+        self.cookies: list[dict] = []
+        self.local_storage: dict[str, dict[str, str]] = {}
+        self.cdp_client = self
+        self.send = self
+        self.Storage = self
+
+    async def getCookies(self, params: dict) -> dict:
+        return {"cookies": self.cookies}
+
+    async def setCookies(self, params: dict) -> None:
+        self.cookies.extend(params["cookies"])
+
+
+@pytest.fixture
+def page_storage(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Runs browser_utils' evaluate/navigate against FakeCDPSession instead of a page."""
+
+    async def navigate(session: FakeCDPSession, url: str) -> None:
+        session.origin = url
+
+    async def evaluate(session: FakeCDPSession, expression: str):
+        storage = session.local_storage.setdefault(session.origin, {})
+        if expression == "location.origin":
+            return session.origin
+        if expression.startswith("Object.entries(localStorage)"):
+            return [{"name": k, "value": v} for k, v in storage.items()]
+        items = json.loads(expression[expression.rindex("(") + 1 : -1])
+        storage.update({item["name"]: item["value"] for item in items})
+
+    monkeypatch.setattr(browser_utils, "navigate", navigate)
+    monkeypatch.setattr(browser_utils, "evaluate", evaluate)
+
+
+async def test_captures_local_storage_of_the_signed_in_origin_only(page_storage: None) -> None:
+    session = FakeCDPSession("https://app.example.test")
+    session.cookies = STATE["cookies"]
+    session.local_storage = {
+        "https://app.example.test": {"token": "t"},
+        "https://ads.example.test": {"tracking": "x"},
+    }
+    assert await capture_storage_state(session) == STATE
+
+
+async def test_restores_local_storage_on_its_own_origin(page_storage: None) -> None:
+    session = FakeCDPSession("about:blank")
+    await apply_storage_state(session, STATE)
+    assert session.cookies == STATE["cookies"]
+    assert session.local_storage["https://app.example.test"] == {"token": "t"}
+    assert not session.local_storage.get("about:blank")
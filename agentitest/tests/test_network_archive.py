@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import base64
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from network_archive import ArchiveRecorder, ArchiveReplayer, NetworkArchive, NetworkArchiveStore
+
+SEARCH = {"method": "POST", "url": "https://api.test/search", "postData": '{"q": "looker"}', "headers": {}}
+HTML_HEADERS = [
+    {"name": "Content-Type", "value": "text/html"},
+    {"name": "Content-Encoding", "value": "gzip"},
+    {"name": "Content-Length", "value": "12"},
+]
+
+
+def fetch_client(body: str = "", base64_encoded: bool = False) -> SimpleNamespace:
+    fetch = SimpleNamespace(
+        getResponseBody=AsyncMock(return_value={"body": body, "base64Encoded": base64_encoded}),
+        fulfillRequest=AsyncMock(),
+        failRequest=AsyncMock(),
+    )
+    return SimpleNamespace(send=SimpleNamespace(Fetch=fetch))
+
+
+def paused(request: dict, request_id: str = "r1", **response: object) -> dict:
+    return {"requestId": request_id, "request": request, **response}
+
+
+def test_requests_match_on_method_url_and_body(tmp_path) -> None:
+    archive = NetworkArchive(str(tmp_path / "a.har"))
+    archive.add(SEARCH, 200, "OK", [], "first", False)
+    archive.add(SEARCH, 200, "OK", [], "second", False)
+
+    assert archive.lookup("GET", SEARCH["url"], None) is None
+    assert archive.lookup("POST", SEARCH["url"], '{"q": "other"}') is None
+    # Repeats are answered in recorded order, then the last one keeps answering.
+    bodies = [archive.lookup("post", SEARCH["url"], SEARCH["postData"])["response"]["content"]["text"] for _ in range(3)]
+    assert bodies == ["first", "second", "second"]
+
+
+async def test_recorded_archive_replays_after_a_reload(tmp_path) -> None:
+    path = str(tmp_path / "archives" / "search.har")
+    recorder = ArchiveRecorder(NetworkArchive(path))
+    event = paused(SEARCH, responseStatusCode=200, responseStatusText="OK", responseHeaders=HTML_HEADERS)
+    assert not await recorder.handle(fetch_client("<p>hits</p>"), event, "tab")
+    recorder.close()
+
+    replayer = ArchiveReplayer(NetworkArchive.load(path))
+    client = fetch_client()
+    assert await replayer.handle(client, paused(SEARCH, "r2"), "tab")
+    params = client.send.Fetch.fulfillRequest.call_args.kwargs["params"]
+    assert params["requestId"] == "r2"
+    assert base64.b64decode(params["body"]).decode() == "<p>hits</p>"
+    assert params["responseHeaders"] == [{"name": "Content-Type", "value": "text/html"}]
+    assert (replayer.hits, replayer.misses) == (1, 0)
+
+
+async def test_unrecorded_requests_use_the_fallback(tmp_path) -> None:
+    other = {"method": "GET", "url": "https://api.test/other", "headers": {}}
+    client = fetch_client()
+    assert not await ArchiveReplayer(NetworkArchive(str(tmp_path / "a.har")), "network").handle(client, paused(other), "tab")
+    assert await ArchiveReplayer(NetworkArchive(str(tmp_path / "a.har")), "abort").handle(client, paused(other), "tab")
+    client.send.Fetch.failRequest.assert_awaited_once()
+    client.send.Fetch.fulfillRequest.assert_not_awaited()
+
+
+def test_store_keys_archives_by_test_and_handles_a_missing_one(tmp_path) -> None:
+    store = NetworkArchiveStore(str(tmp_path), mode="replay")
+    assert store.path("test_a.py::test_search") == store.path("test_a.py::test_search")
+    assert store.path("test_a.py::test_search") != store.path("test_a.py::test_login")
+    assert store.handler("test_a.py::test_search") is None
+    assert isinstance(NetworkArchiveStore(str(tmp_path), "replay", "abort").handler("x"), ArchiveReplayer)
+    assert isinstance(NetworkArchiveStore(str(tmp_path), "record").handler("x"), ArchiveRecorder)
+    with pytest.raises(ValueError):
+        NetworkArchiveStore(str(tmp_path), mode="replay", fallback="retry")
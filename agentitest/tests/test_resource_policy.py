@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from typing import Any
+
+from resource_policy import LoadedResources, ResourceBlocker, ResourcePolicy
+
+POLICY = ResourcePolicy(
+    blocked_types=frozenset({"image", "font"}),
+    blocked_domains=frozenset({"tracker.test"}),
+    allowed_domains=frozenset({"cdn.site.test"}),
+)
+
+
+class FakeClient:
+    """Records CDP commands and keeps the registered Network event handlers."""
+
+    def __init__(self) -> None:
+        self.sent: list[str] = []
+        self.handlers: dict[str, Any] = {}
+        self.register = self
+        self.send = self
+
+    def __getattr__(self, domain: str) -> Any:
+        client = self
+
+        class Domain:
+            def __getattr__(self, method: str) -> Any:
+                name = f"{domain}.{method}"
+
+                def call(*args: Any, **kwargs: Any) -> Any:
+                    if args:  # register.Domain.event(handler)
+                        client.handlers[name] = args[0]
+                        return None
+                    client.sent.append(name)
+
+                    async def done() -> None:
+                        pass
+
+                    return done()
+
+                return call
+
+        return Domain()
+
+
+def paused(request_id: str, url: str, resource_type: str) -> dict[str, Any]:
+    return {"requestId": request_id, "request": {"url": url}, "resourceType": resource_type}
+
+
+def test_blocks_by_type_and_domain_unless_allowed() -> None:
+    assert POLICY.blocks("https://site.test/logo.png", "image")
+    assert POLICY.blocks("https://a.tracker.test/t.js", "script")
+    assert not POLICY.blocks("https://site.test/app.js", "script")
+    assert not POLICY.blocks("https://cdn.site.test/logo.png", "image")
+    assert not POLICY.allowing(types=["Image"]).blocks("https://site.test/logo.png", "image")
+
+
+async def test_charges_blocked_requests_the_measured_average_of_their_type() -> None:
+    client = FakeClient()
+    blocker = ResourceBlocker(POLICY, LoadedResources())
+    await blocker.watch_tab(client, "tab")
+    assert "Network.enable" in client.sent
+
+    # An allowed image loads and is measured; data: URLs are ignored.
+    for request_id, url, size, seconds in (("1", "https://cdn.site.test/a.png", 20_000, 0.2),
+                                           ("2", "https://cdn.site.test/b.png", 40_000, 0.4),
+                                           ("3", "data:image/png;base64,AAAA", 0, 0.0)):
+        client.handlers["Network.requestWillBeSent"]({"requestId": request_id, "type": "Image", "timestamp": 10.0,
+                                                      "request": {"url": url}})
+        client.handlers["Network.loadingFinished"]({"requestId": request_id, "encodedDataLength": size,
+                                                    "timestamp": 10.0 + seconds})
+
+    assert await blocker.handle(client, paused("4", "https://site.test/logo.png", "Image"), "tab")
+    assert await blocker.handle(client, paused("5", "https://site.test/font.woff2", "Font"), "tab")
+    assert not await blocker.handle(client, paused("6", "https://site.test/app.js", "Script"), "tab")
+
+    stats = blocker.stats.to_dict()
+    assert stats["blocked_requests"] == 2
+    assert stats["blocked_by_type"] == {"image": 1, "font": 1}
+    assert stats["blocked_bytes"] == 30_000
+    assert stats["blocked_seconds"] == 0.3
+    assert stats["unmeasured_requests"] == 1
+    assert "not measured yet" in blocker.stats.summary()
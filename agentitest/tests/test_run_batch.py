@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Any
+
+import pytest
+
+import agent_runner
+from agent_runner import BATCH_LOGIN_TASK, AgentRunResult, run_agent_batch
+from job_queue import current_job
+
+LOGIN_URL = "https://school.test/login"
+SIGNED_IN = {"cookies": [{"name": "sid", "value": "s1"}], "origins": []}
+
+
+class FakeSessionPool:
+    """Hands out numbered sessions and remembers the most held at once."""
+
+    def __init__(self) -> None:
+        self.sessions: list[dict[str, Any]] = []
+        self.held = 0
+        self.most_held = 0
+
+    @asynccontextmanager
+    async def acquire(self, run_info: dict | None = None):
+        session = {"id": len(self.sessions), "state": None, "tasks": []}
+        self.sessions.append(session)
+        self.held += 1
+        self.most_held = max(self.most_held, self.held)
+        try:
+            yield session
+        finally:
+            self.held -= 1
+
+
+class FakeAgent:
+    """Replaces the agent: signs in unless told not to, fails prompts that say "break"."""
+
+    def __init__(self, monkeypatch: pytest.MonkeyPatch, sign_in_works: bool = True) -> None:
+        self.sign_in_works = sign_in_works
+        self.sign_ins = 0
+
+        @asynccontextmanager
+        async def intercept_network(session, resource_policy=None, archive_key=None):
+            yield None
+
+        async def navigate(session, url: str) -> None:
+            pass
+
+        async def capture_storage_state(session) -> dict:
+            return SIGNED_IN
+
+        async def apply_storage_state(session, state: dict) -> None:
+            session["state"] = state
+
+        monkeypatch.setattr(agent_runner, "intercept_network", intercept_network)
+        monkeypatch.setattr(agent_runner, "navigate", navigate)
+        monkeypatch.setattr(agent_runner, "capture_storage_state", capture_storage_state)
+        monkeypatch.setattr(agent_runner, "apply_storage_state", apply_storage_state)
+        monkeypatch.setattr(agent_runner, "execute_agent_task", self.execute)
+
+    async def execute(self, task: str, llm, session, start_url=None, **kwargs) -> AgentRunResult:
+        if BATCH_LOGIN_TASK in task:
+            self.sign_ins += 1
+            return AgentRunResult(text="signed in" if self.sign_in_works else "wrong password", success=self.sign_in_works)
+        assert "already signed in" in task
+        prompt = task.rsplit("Now perform the following task on that page:\n", 1)[1].split("\n")[0]
+        session["tasks"].append(prompt)
+        await asyncio.sleep(0.01 if prompt.endswith("1") else 0)
+        if "break" in prompt:
+            raise RuntimeError("page crashed")
+        return AgentRunResult(text=f"checked {prompt}", success=True)
+
+
+async def run_batch(prompts: list[str], pool: FakeSessionPool, parallel: int = 1) -> tuple[list, list]:
+    streamed: list[dict] = []
+    results = await run_agent_batch(
+        prompts, LOGIN_URL, "teacher", "secret", pool=pool, llm=object(), parallel=parallel, on_result=streamed.append
+    )
+    return results, streamed
+
+
+async def test_runs_prompts_in_the_signed_in_session(monkeypatch: pytest.MonkeyPatch) -> None:
+    agent, pool = FakeAgent(monkeypatch), FakeSessionPool()
+    results, streamed = await run_batch(["grades 1", "break roster", "homework"], pool)
+
+    assert agent.sign_ins == 1
+    assert len(pool.sessions) == 1 and pool.sessions[0]["tasks"] == ["grades 1", "break roster", "homework"]
+    assert [(r["index"], r["status"]) for r in results] == [(0, "success"), (1, "error"), (2, "success")]
+    assert "checked grades 1" in results[0]["result"] and results[1]["result"] == "page crashed"
+    assert streamed == results
+
+
+async def test_parallel_prompts_share_the_sign_in_through_their_own_sessions(monkeypatch: pytest.MonkeyPatch) -> None:
+    agent, pool = FakeAgent(monkeypatch), FakeSessionPool()
+    results, streamed = await run_batch(["grades 1", "roster", "homework"], pool, parallel=2)
+
+    assert agent.sign_ins == 1
+    login_session, *prompt_sessions = pool.sessions
+    assert login_session["tasks"] == [] and len(prompt_sessions) == 3
+    assert all(s["state"] == SIGNED_IN and len(s["tasks"]) == 1 for s in prompt_sessions)
+    assert pool.most_held == 2
+    # Streamed as each finishes (the slow first prompt last), returned in prompt order.
+    assert [r["index"] for r in streamed][-1] == 0
+    assert [r["index"] for r in results] == [0, 1, 2]
+
+
+async def test_a_failed_sign_in_fails_every_prompt(monkeypatch: pytest.MonkeyPatch) -> None:
+    FakeAgent(monkeypatch, sign_in_works=False)
+    results, _ = await run_batch(["grades 1", "roster"], FakeSessionPool(), parallel=2)
+    assert {r["status"] for r in results} == {"error"}
+    assert all(r["result"].startswith("Sign-in failed: Could not sign in as teacher") for r in results)
+
+
+def test_endpoint_streams_each_prompt_result(monkeypatch: pytest.MonkeyPatch) -> None:
+    from fastapi.testclient import TestClient
+
+    import server
+
+    async def run_batch_request(payload: dict, **options: Any) -> dict:
+        for index, prompt in enumerate(payload["prompts"]):
+            current_job().publish({"type": "prompt_result", "index": index, "prompt": prompt, "status": "success"})
+        return {"results": [], "succeeded": len(payload["prompts"]), "failed": 0, "parallel": payload["parallel"]}
+
+    monkeypatch.setenv("BROWSER_POOL_SIZE", "0")
+    monkeypatch.setattr(server, "run_batch_request", run_batch_request)
+    monkeypatch.setattr(server, "BATCH_MAX_PROMPTS", 3)
+    with TestClient(server.app) as client:
+        assert client.post("/run-batch", json={"url": LOGIN_URL, "prompts": []}).status_code == 400
+        assert client.post("/run-batch", json={"url": LOGIN_URL, "prompts": ["a"] * 4}).status_code == 400
+        response = client.post("/run-batch", json={"url": LOGIN_URL, "prompts": ["a", "b"], "parallel": 99})
+        events = [json.loads(line) for line in response.iter_lines() if line]
+
+    assert [e["type"] for e in events] == ["queued", "prompt_result", "prompt_result", "result"]
+    assert [e["prompt"] for e in events[1:3]] == ["a", "b"]
+    assert events[-1]["status"] == "success"
+    assert events[-1]["result"]["parallel"] == server.BATCH_MAX_PARALLEL
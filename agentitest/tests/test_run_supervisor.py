@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+import run_supervisor
+from run_supervisor import RunBudget, RunSupervisor, TimeBudgets
+
+
+class Action:
+    def __init__(self, **fields: Any) -> None:
+        self.fields = fields
+
+    def model_dump(self, exclude_none: bool = False) -> dict[str, Any]:
+        return self.fields
+
+
+def step(url: str, *actions: Action) -> SimpleNamespace:
+    model_output = SimpleNamespace(action=list(actions)) if actions else None
+    return SimpleNamespace(state=SimpleNamespace(url=url), model_output=model_output)
+
+
+class FakeHistory:
+    def __init__(self) -> None:
+        self.history: list[SimpleNamespace] = []
+
+    def is_done(self) -> bool:
+        return False
+
+
+class FakeAgent:
+    def __init__(self) -> None:
+        self.history = FakeHistory()
+        self.browser_session = None
+        self.stopped = False
+
+    def stop(self) -> None:
+        self.stopped = True
+
+
+CLICK_NEXT = Action(click={"index": 7})
+SCROLL = Action(scroll={"down": True})
+
+
+@pytest.fixture
+def supervisor(monkeypatch: pytest.MonkeyPatch) -> RunSupervisor:
+    monkeypatch.setattr(RunSupervisor, "_tokens_used", staticmethod(lambda: 0))
+    return RunSupervisor(RunBudget(max_repeated_actions=3, max_url_cycles=2))
+
+
+def run_steps(supervisor: RunSupervisor, agent: FakeAgent, steps: list, fingerprints: list) -> list:
+    reasons = []
+    for item, fingerprint in zip(steps, fingerprints):
+        agent.history.history.append(item)
+        reasons.append(supervisor.check(agent, fingerprint))
+    return reasons
+
+
+def test_stops_an_action_repeated_on_an_unchanged_page(supervisor: RunSupervisor) -> None:
+    agent = FakeAgent()
+    reasons = run_steps(supervisor, agent, [step("https://a.test/", CLICK_NEXT)] * 3, ["same"] * 3)
+    assert reasons[:2] == [None, None]
+    assert reasons[2].startswith("Repeated the same action 3 times on an unchanged https://a.test/")
+
+
+def test_allows_a_repeated_action_that_changes_the_page(supervisor: RunSupervisor) -> None:
+    agent = FakeAgent()
+    reasons = run_steps(
+        supervisor, agent, [step("https://a.test/", CLICK_NEXT)] * 6, [f"items|{n}" for n in range(6)]
+    )
+    assert reasons == [None] * 6
+
+
+def test_scrolling_neither_counts_nor_resets_repeats(supervisor: RunSupervisor) -> None:
+    agent = FakeAgent()
+    steps = [step("https://a.test/", SCROLL)] * 5 + [
+        step("https://a.test/", CLICK_NEXT),
+        step("https://a.test/", SCROLL),
+        step("https://a.test/", CLICK_NEXT),
+        step("https://a.test/", CLICK_NEXT),
+    ]
+    reasons = run_steps(supervisor, agent, steps, ["same"] * len(steps))
+    assert reasons[:8] == [None] * 8
+    assert reasons[8] is not None
+
+
+def test_without_fingerprint_repeats_on_the_same_url_count(supervisor: RunSupervisor) -> None:
+    agent = FakeAgent()
+    agent.history.history.extend([step("https://a.test/", CLICK_NEXT)] * 3)
+    assert supervisor.check(agent) is not None
+
+
+def test_stops_cycling_between_pages(supervisor: RunSupervisor) -> None:
+    agent = FakeAgent()
+    urls = ["https://a.test/", "https://b.test/"] * 2
+    reasons = run_steps(supervisor, agent, [step(url) for url in urls], [None] * len(urls))
+    assert reasons[:3] == [None] * 3
+    assert reasons[3] == "Cycled 2 times through the same pages: https://a.test/ -> https://b.test/"
+
+
+def test_reads_a_new_agent_history_from_the_start(supervisor: RunSupervisor) -> None:
+    replay_agent = FakeAgent()
+    run_steps(supervisor, replay_agent, [step("https://a.test/")] * 4, [None] * 4)
+    live_agent = FakeAgent()
+    live_agent.history.history.append(step("https://a.test/", CLICK_NEXT))
+    assert supervisor.check(live_agent, "page") is None
+    assert supervisor._next_index == 1
+
+
+def test_stops_over_the_token_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    tokens = iter([100, 1200])
+    monkeypatch.setattr(RunSupervisor, "_tokens_used", staticmethod(lambda: next(tokens)))
+    supervisor = RunSupervisor(RunBudget(max_tokens=1000))
+    assert supervisor.check(FakeAgent()) == "Used 1100 LLM tokens, over the budget of 1000."
+
+
+async def test_hook_stops_the_agent_and_chains(supervisor: RunSupervisor, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def evaluate(session: Any, script: str) -> str:
+        return "title|10|20"
+
+    monkeypatch.setattr(run_supervisor, "evaluate", evaluate)
+    calls = []
+
+    async def on_step_end(agent: FakeAgent) -> None:
+        calls.append(len(agent.history.history))
+
+    supervisor.on_step_end = on_step_end
+    agent = FakeAgent()
+    for _ in range(3):
+        agent.history.history.append(step("https://a.test/", CLICK_NEXT))
+        await supervisor(agent)
+    assert calls == [1, 2, 3]
+    assert agent.stopped
+    assert supervisor.failure_reason is not None
+
+
+# --- TimeBudgets ---
+
+
+@pytest.fixture
+def budgets(tmp_path) -> TimeBudgets:
+    return TimeBudgets(str(tmp_path), factor=2.0, min_seconds=30.0, max_seconds=180.0)
+
+
+def test_budget_defaults_to_max_until_enough_samples(budgets: TimeBudgets) -> None:
+    budgets.record("task", "https://a.test/", 20.0)
+    budgets.record("task", "https://a.test/", 20.0)
+    assert budgets.budget("task", "https://a.test/") == 180.0
+
+
+def test_budget_is_p95_times_factor_within_limits(budgets: TimeBudgets) -> None:
+    for seconds in (20.0, 25.0, 40.0):
+        budgets.record("task", None, seconds)
+    assert budgets.budget("task", None) == 80.0
+
+    for seconds in (1.0, 2.0, 3.0):
+        budgets.record("quick", None, seconds)
+    assert budgets.budget("quick", None) == 30.0
+
+    for seconds in (100.0, 120.0, 150.0):
+        budgets.record("slow", None, seconds)
+    assert budgets.budget("slow", None) == 180.0
+
+
+def test_replayed_runs_are_a_separate_series(budgets: TimeBudgets) -> None:
+    for seconds in (5.0, 6.0, 7.0):
+        budgets.record("task", None, seconds, replayed=True)
+    assert budgets.durations("task", None) == []
+    assert budgets.durations("task", None, replayed=True) == [5.0, 6.0, 7.0]
+    assert budgets.budget("task", None) == 180.0
+    assert budgets.budget("task", None, replayed=True) == 30.0
+
+
+def test_keeps_only_recent_samples_per_task_and_url(budgets: TimeBudgets) -> None:
+    for n in range(25):
+        budgets.record("task", "https://a.test/", float(n))
+    assert budgets.durations("task", "https://a.test/") == [float(n) for n in range(5, 25)]
+    assert budgets.durations("task", "https://b.test/") == []
+
+
+def test_reads_old_and_unreadable_files(budgets: TimeBudgets) -> None:
+    path = budgets._path("task", None)
+    with open(path, "w") as f:
+        json.dump({"durations": [10, 11, 12]}, f)
+    assert budgets.durations("task", None) == [10.0, 11.0, 12.0]
+    assert budgets.durations("task", None, replayed=True) == []
+
+    with open(path, "w") as f:
+        f.write("{")
+    assert budgets.budget("task", None) == 180.0
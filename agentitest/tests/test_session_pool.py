@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+import session_pool
+from memory_monitor import MemoryLimits, MemorySample
+from session_pool import BrowserSessionPool, PooledSession
+
+
+class FakeSession:
+    def __init__(self) -> None:
+        self.killed = False
+
+    async def kill(self) -> None:
+        self.killed = True
+
+
+class FakePool(BrowserSessionPool):
+    """A pool whose sessions are plain objects, so no browser is started."""
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(browser_profile=None, **kwargs)
+        self.launched: list[PooledSession] = []
+        self.discarded: list[PooledSession] = []
+        self.healthy = True
+
+    async def _launch(self) -> PooledSession:
+        pooled = PooledSession(session=FakeSession(), user_data_dir="")
+        self.launched.append(pooled)
+        return pooled
+
+    async def _discard(self, pooled: PooledSession) -> None:
+        self.discarded.append(pooled)
+
+    async def _is_healthy(self, pooled: PooledSession) -> bool:
+        return self.healthy
+
+
+@pytest.fixture(autouse=True)
+def fake_browser(monkeypatch: pytest.MonkeyPatch) -> dict[str, MemorySample]:
+    """Stubs out the page scrub and returns the memory sample the pool will read."""
+    sample = {"memory": MemorySample(rss_mb=100.0, processes=3, pages=1)}
+
+    async def reset_browser_state(session) -> None:
+        pass
+
+    async def sample_session(session, browser_pid=None) -> MemorySample:
+        return sample["memory"]
+
+    monkeypatch.setattr(session_pool, "reset_browser_state", reset_browser_state)
+    monkeypatch.setattr(session_pool, "sample_session", sample_session)
+    return sample
+
+
+async def test_reuses_warm_session() -> None:
+    pool = FakePool(min_size=1, max_size=2)
+    await pool._refill()
+    async with pool.acquire() as first:
+        pass
+    async with pool.acquire() as second:
+        pass
+    assert first is second
+    assert len(pool.launched) == 1
+    await pool.close()
+
+
+async def test_discards_session_after_max_uses() -> None:
+    pool = FakePool(min_size=0, max_size=1, max_uses=2)
+    async with pool.acquire() as first:
+        pass
+    async with pool.acquire():
+        pass
+    assert pool.discarded and pool.discarded[0].session is first
+    async with pool.acquire() as third:
+        pass
+    assert third is not first
+    await pool.close()
+
+
+async def test_replaces_unhealthy_idle_session() -> None:
+    pool = FakePool(min_size=1, max_size=1)
+    await pool._refill()
+    pool.healthy = False
+    async with pool.acquire() as session:
+        pass
+    assert pool.discarded[0].session is not session
+    assert len(pool.launched) == 2
+    await pool.close()
+
+
+async def test_records_memory_sample_in_run_info(fake_browser: dict[str, MemorySample]) -> None:
+    pool = FakePool(min_size=0, max_size=1)
+    run_info: dict = {}
+    async with pool.acquire(run_info):
+        pass
+    assert run_info["browser_memory"] == fake_browser["memory"].to_dict()
+    await pool.close()
+
+
+async def test_recycles_session_over_memory_limit(fake_browser: dict[str, MemorySample]) -> None:
+    pool = FakePool(min_size=0, max_size=1, memory_limits=MemoryLimits(max_rss_mb=50.0, max_pages=10))
+    async with pool.acquire():
+        pass
+    assert len(pool.discarded) == 1
+    assert not pool._idle
+    await pool.close()
+
+
+async def test_never_hands_out_more_than_max_size() -> None:
+    pool = FakePool(min_size=0, max_size=1)
+
+    async def checkout() -> None:
+        async with pool.acquire():
+            pass
+
+    async with pool.acquire():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(checkout(), timeout=0.05)
+    assert len(pool.launched) == 1
+    await pool.close()
+
+
+async def test_health_check_keeps_idle_sessions_counted() -> None:
+    pool = FakePool(min_size=2, max_size=2)
+    await pool._refill()
+    checking = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_health_check(pooled: PooledSession) -> bool:
+        if not checking.is_set():  # Only the maintenance check of the newest session hangs
+            checking.set()
+            await release.wait()
+        return True
+
+    pool._is_healthy = slow_health_check
+    eviction = asyncio.create_task(pool._evict_idle())
+    await checking.wait()
+    # One session is being checked and the other is idle: a checkout takes the
+    # idle one, and a second has to wait instead of launching a third browser.
+    async with pool.acquire():
+        with pytest.raises(asyncio.TimeoutError):
+            async with asyncio.timeout(0.05):
+                async with pool.acquire():
+                    pass
+    release.set()
+    await eviction
+    assert len(pool.launched) == 2
+    assert len(pool._idle) == 2
+    await pool.close()
+
+
+async def test_evicts_expired_sessions_above_min_size() -> None:
+    pool = FakePool(min_size=1, max_size=3, idle_timeout=0.0)
+    pool.min_size = 3
+    await pool._refill()
+    newest = pool._idle[-1]
+    pool.min_size = 1
+    await pool._evict_idle()
+    assert pool._idle == [newest]
+    assert len(pool.discarded) == 2
+    await pool.close()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+from suite_scheduler import HISTORY_KEY, HistoryScheduler, order_by_history
+
+
+class FakeCache:
+    def __init__(self) -> None:
+        self.data: dict[str, Any] = {}
+
+    def get(self, key: str, default: Any) -> Any:
+        return self.data.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        self.data[key] = value
+
+
+def report(nodeid: str, duration: float, outcome: str = "passed") -> SimpleNamespace:
+    return SimpleNamespace(
+        nodeid=nodeid,
+        duration=duration,
+        failed=outcome == "failed",
+        skipped=outcome == "skipped",
+    )
+
+
+def test_orders_last_failures_first_then_longest() -> None:
+    history = {
+        "short": {"avg_duration_seconds": 5.0, "recent": ["passed"]},
+        "long": {"avg_duration_seconds": 50.0, "recent": ["passed"]},
+        "flaky": {"avg_duration_seconds": 1.0, "recent": ["passed", "failed"]},
+        "broken": {"avg_duration_seconds": 1.0, "recent": ["failed"]},
+        "recovered": {"avg_duration_seconds": 1.0, "recent": ["failed", "passed"]},
+    }
+    order = order_by_history(["short", "recovered", "flaky", "long", "broken", "new"], history)
+    # "new" is assumed to take the average duration (~12s).
+    assert order == ["broken", "flaky", "long", "new", "short", "recovered"]
+
+
+def test_keeps_collection_order_without_history() -> None:
+    assert order_by_history(["b", "a", "c"], {}) == ["b", "a", "c"]
+
+
+def test_records_runs_in_the_cache() -> None:
+    config = SimpleNamespace(cache=FakeCache())
+    scheduler = HistoryScheduler(config)
+    # Setup, call and teardown each report a duration; they add up.
+    scheduler.pytest_runtest_logreport(report("t::a", 1.0))
+    scheduler.pytest_runtest_logreport(report("t::a", 9.0, "failed"))
+    scheduler.pytest_runtest_logreport(report("t::b", 2.0))
+    scheduler.pytest_runtest_logreport(report("t::skipped", 0.1, "skipped"))
+    scheduler.pytest_sessionfinish()
+
+    history = config.cache.data[HISTORY_KEY]
+    assert history["t::a"]["avg_duration_seconds"] == 10.0
+    assert history["t::a"]["recent"] == ["failed"]
+    assert history["t::b"]["recent"] == ["passed"]
+    assert "t::skipped" not in history
+
+    scheduler = HistoryScheduler(config)
+    scheduler.pytest_runtest_logreport(report("t::a", 20.0))
+    scheduler.pytest_sessionfinish()
+    entry = config.cache.data[HISTORY_KEY]["t::a"]
+    assert entry["avg_duration_seconds"] == 13.0
+    assert (entry["runs"], entry["failures"], entry["recent"]) == (2, 1, ["failed", "passed"])
+
+
+def test_reorders_collected_items() -> None:
+    cache = FakeCache()
+    cache.set(HISTORY_KEY, {"t::fast": {"avg_duration_seconds": 1.0}, "t::slow": {"avg_duration_seconds": 9.0}})
+    config = SimpleNamespace(cache=cache, getoption=lambda name: "history")
+    items = [SimpleNamespace(nodeid="t::fast"), SimpleNamespace(nodeid="t::slow")]
+    HistoryScheduler(config).pytest_collection_modifyitems(items)
+    assert [item.nodeid for item in items] == ["t::slow", "t::fast"]
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+import trajectory_store
+from trajectory_store import TrajectoryStore, continuation_task, merge_histories, replay_trajectory
+
+
+@dataclass
+class Action:
+    params: dict[str, Any]
+
+    def model_dump(self, exclude_unset: bool = False) -> dict[str, Any]:
+        return self.params
+
+
+@dataclass
+class History:
+    """The parts of AgentHistoryList that recording and replay use."""
+
+    history: list[Any] = field(default_factory=list)
+
+    def save_to_file(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({"steps": len(self.history)}, f)
+
+
+def step(url: str, **action: Any) -> SimpleNamespace:
+    return SimpleNamespace(state=SimpleNamespace(url=url), model_output=SimpleNamespace(action=[Action(action)]))
+
+
+RECORDING = History(
+    [
+        step("https://shop.test/", click_element_by_index={"index": 3}),
+        step("https://shop.test/cart", input_text={"index": 1, "text": "2"}),
+        step("https://shop.test/cart", done={"text": "ordered", "success": True}),
+    ]
+)
+
+
+class ReplayAgent:
+    """Replays steps by moving a fake page to the URL given for each step index."""
+
+    def __init__(self, urls_after_step: list[str], error: str | None = None) -> None:
+        self.browser_session = SimpleNamespace(url="https://shop.test/")
+        self.urls_after_step = urls_after_step
+        self.error = error
+        self.replayed: list[Any] = []
+
+    async def _execute_history_step(self, item: Any, delay: float = 0) -> list[Any]:
+        self.browser_session.url = self.urls_after_step[len(self.replayed)]
+        self.replayed.append(item)
+        return [SimpleNamespace(error=self.error)]
+
+
+@pytest.fixture(autouse=True)
+def page_url(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def evaluate(session: SimpleNamespace, expression: str) -> str:
+        assert expression == "location.href"
+        return session.url
+
+    monkeypatch.setattr(trajectory_store, "evaluate", evaluate)
+
+
+def test_recordings_are_keyed_by_task_and_start_url(tmp_path) -> None:
+    store = TrajectoryStore(str(tmp_path / "trajectories"))
+    store.save("buy two", "https://shop.test/", RECORDING)
+    store.save("buy two", "https://staging.shop.test/", History(RECORDING.history[:1]))
+    with open(store._path("buy two", "https://shop.test/")) as f:
+        assert json.load(f) == {"steps": 3}
+    with open(store._path("buy two", "https://staging.shop.test/")) as f:
+        assert json.load(f) == {"steps": 1}
+    with pytest.raises(ValueError):
+        TrajectoryStore(str(tmp_path), mode="replay-everything")
+
+
+async def test_replays_a_recording_to_its_result() -> None:
+    agent = ReplayAgent(["https://shop.test/cart", "https://shop.test/cart"])
+    outcome = await replay_trajectory(agent, RECORDING)
+    assert outcome.completed and outcome.steps_replayed == 2
+    assert agent.replayed == RECORDING.history[:2]
+
+
+async def test_hands_over_to_the_agent_where_the_page_diverges() -> None:
+    agent = ReplayAgent(["https://shop.test/login"])
+    outcome = await replay_trajectory(agent, RECORDING)
+    assert not outcome.completed
+    assert outcome.steps_replayed == 1
+    assert "led to https://shop.test/login" in outcome.reason
+
+    task = continuation_task("buy two", RECORDING, outcome.steps_replayed)
+    assert task.startswith("buy two\n")
+    assert "click_element_by_index" in task and "input_text" not in task
+    live = History([step("https://shop.test/cart", done={"text": "ordered"})])
+    assert merge_histories(RECORDING, outcome.steps_replayed, live).history == RECORDING.history[:1] + live.history
+
+
+async def test_stops_on_a_step_that_fails() -> None:
+    outcome = await replay_trajectory(ReplayAgent(["https://shop.test/"], error="element 3 not found"), RECORDING)
+    assert (outcome.steps_replayed, outcome.completed) == (0, False)
+    assert continuation_task("buy two", RECORDING, 0) == "buy two"
+
+
+async def test_does_not_replay_without_the_private_browser_use_method() -> None:
+    agent = SimpleNamespace(browser_session=SimpleNamespace(url="https://shop.test/"))
+    outcome = await replay_trajectory(agent, RECORDING)
+    assert (outcome.steps_replayed, outcome.completed) == (0, False)
+    assert "_execute_history_step" in outcome.reason
@@ -0,0 +1,186 @@
+"""Record and replay of agent trajectories.
+
+A successful run's ``AgentHistoryList`` is stored on disk, keyed by the task
+text and start URL. In replay mode the recorded actions are executed directly
+against the browser without asking the LLM. Replay stops at the first step
+whose element can't be found or whose outcome differs from the recording, and
+the live agent takes over from there.
+
+Replay drives ``Agent._execute_history_step``, a private browser_use method;
+requirements.txt pins the browser_use version it was written against, and
+replay is skipped with an error if the method is missing.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from browser_utils import evaluate
+
+if TYPE_CHECKING:
+    from browser_use import Agent
+    from browser_use.agent.views import AgentHistoryList
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+TRAJECTORY_MODES = ("off", "record", "replay")
+# Checked before replaying, as it is private API (see the module docstring).
+REPLAY_METHOD = "_execute_history_step"
+
+
+@dataclass
+class ReplayOutcome:
+    """How far a recorded trajectory could be replayed."""
+
+    steps_replayed: int
+    completed: bool
+    reason: str | None = None
+
+
+class TrajectoryStore:
+    """Stores one history JSON file per (task, start URL) pair."""
+
+    def __init__(self, directory: str, mode: str = "record") -> None:
+        if mode not in TRAJECTORY_MODES:
+            raise ValueError(f"Unknown trajectory mode {mode!r}; expected one of {TRAJECTORY_MODES}")
+        self.directory = directory
+        self.mode = mode
+
+    @classmethod
+    def from_env(cls) -> TrajectoryStore | None:
+        """Returns the store selected by ``AGENT_TRAJECTORY_MODE``, or ``None`` when off."""
+        mode = os.getenv("AGENT_TRAJECTORY_MODE", "off").lower()
+        if mode == "off":
+            return None
+        return cls(
+            directory=os.getenv("AGENT_TRAJECTORY_DIR", os.path.join(PROJECT_ROOT, "trajectories")),
+            mode=mode,
+        )
+
+    @property
+    def replay_enabled(self) -> bool:
+        return self.mode == "replay"
+
+    def _path(self, task: str, start_url: str | None) -> str:
+        key = hashlib.sha256(f"{task}\n{start_url or ''}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, task: str, start_url: str | None, output_model: Any) -> AgentHistoryList | None:
+        """Loads the recorded history, or ``None`` if there is no usable recording."""
+        from browser_use.agent.views import AgentHistoryList
+
+        path = self._path(task, start_url)
+        if not os.path.exists(path):
+            return None
+        try:
+            return AgentHistoryList.load_from_file(path, output_model)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable trajectory {path}: {e}")
+            return None
+
+    def save(self, task: str, start_url: str | None, history: AgentHistoryList) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(task, start_url)
+        history.save_to_file(path)
+        logger.info(f"Recorded trajectory with {len(history.history)} step(s) to {path}")
+
+
+def _is_done_step(history_item: Any) -> bool:
+    model_output = getattr(history_item, "model_output", None)
+    for action in getattr(model_output, "action", None) or []:
+        dumped = action.model_dump(exclude_unset=True)
+        if "done" in dumped:
+            return True
+    return False
+
+
+def _recorded_url(history_item: Any) -> str | None:
+    state = getattr(history_item, "state", None)
+    return getattr(state, "url", None)
+
+
+async def replay_trajectory(
+    agent: Agent, recorded: AgentHistoryList, time_limit: float | None = None
+) -> ReplayOutcome:
+    """Re-executes recorded actions until the trajectory ends or diverges.
+
+    After each step the page URL is compared with the URL the recording saw
+    before its next step; a mismatch means the outcome differed. The recorded
+    result is only reused if the page is also where the recording finished.
+    Replay also stops before a step once it has taken ``time_limit`` seconds.
+    """
+    started = time.perf_counter()
+    execute_history_step = getattr(agent, REPLAY_METHOD, None)
+    if execute_history_step is None:
+        logger.error(
+            f"This browser_use version has no Agent.{REPLAY_METHOD}; trajectories can't be replayed. "
+            "Install the browser_use version pinned in requirements.txt."
+        )
+        return ReplayOutcome(0, completed=False, reason=f"Agent.{REPLAY_METHOD} is not available")
+
+    items = recorded.history
+    for index, item in enumerate(items):
+        if _is_done_step(item):
+            expected_url = _recorded_url(item)
+            current_url = await evaluate(agent.browser_session, "location.href")
+            if expected_url and current_url != expected_url:
+                return ReplayOutcome(
+                    index,
+                    completed=False,
+                    reason=f"finished on {current_url}, recording finished on {expected_url}",
+                )
+            return ReplayOutcome(steps_replayed=index, completed=True)
+        if item.model_output is None:
+            continue
+        if time_limit is not None and time.perf_counter() - started > time_limit:
+            return ReplayOutcome(index, completed=False, reason=f"replay took longer than {time_limit:.0f}s")
+
+        try:
+            results = await execute_history_step(item, delay=0)
+        except Exception as e:
+            return ReplayOutcome(index, completed=False, reason=f"step {index + 1} could not be replayed: {e}")
+        errors = [r.error for r in results if getattr(r, "error", None)]
+        if errors:
+            return ReplayOutcome(index, completed=False, reason=f"step {index + 1} failed: {errors[0]}")
+
+        if index + 1 < len(items):
+            expected_url = _recorded_url(items[index + 1])
+            current_url = await evaluate(agent.browser_session, "location.href")
+            if expected_url and current_url != expected_url:
+                return ReplayOutcome(
+                    index + 1,
+                    completed=False,
+                    reason=f"step {index + 1} led to {current_url}, recording expected {expected_url}",
+                )
+
+    # The recording never reached a 'done' step, so there is no result to reuse.
+    return ReplayOutcome(len(items), completed=False, reason="recording has no final result")
+
+
+def continuation_task(task: str, recorded: AgentHistoryList, steps_replayed: int) -> str:
+    """Task text for the live agent that picks up where replay stopped."""
+    if steps_replayed == 0:
+        return task
+    done_actions = [
+        action
+        for item in recorded.history[:steps_replayed]
+        if item.model_output is not None
+        for action in (a.model_dump(exclude_unset=True) for a in item.model_output.action)
+    ]
+    summary = "\n".join(f"- {action}" for action in done_actions)
+    return (
+        f"{task}\n\nThese actions have already been performed in the open browser:\n"
+        f"{summary}\nContinue the task from the current page state."
+    )
+
+
+def merge_histories(prefix: AgentHistoryList, steps: int, tail: AgentHistoryList) -> AgentHistoryList:
+    """Joins the replayed part of a recording with the live agent's history."""
+    return type(tail)(history=list(prefix.history[:steps]) + list(tail.history))
@@ -0,0 +1,226 @@
+"""Agent worker for the shared job queue (``JOB_QUEUE=sqlite``).
+
+Each worker claims queued ``/run-test`` and ``/run-batch`` jobs, runs them
+through ``run_agent_on_task`` or ``run_agent_batch`` on its own browser pool,
+heartbeats while they run, and writes their step events and results back to
+the queue. Workers keep no state of their own, so throughput scales by
+starting more of them. The bundled SQLite queue is single-host (see
+job_store.py), so with it they all run on the server's machine. On shutdown, the jobs it interrupts are handed back to the queue once they have
+stopped.
+
+Usage (from ``agentitest/``)::
+
+    JOB_QUEUE=sqlite uvicorn server:app --port 8000
+    python worker.py --concurrency 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import time
+from typing import Any
+
+from agent_runner import build_browser_profile, run_batch_request, run_test_request
+from dotenv import load_dotenv
+from job_queue import Job, JobScheduler, JobStatus
+from job_store import JobStore, SQLiteJobStore, new_worker_id
+from login_cache import LoginStateCache
+from resource_policy import ResourcePolicy
+from session_pool import BrowserSessionPool
+
+logger = logging.getLogger(__name__)
+
+
+class JobWorker:
+    """Feeds jobs claimed from a ``JobStore`` to a local ``JobScheduler``."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        scheduler: JobScheduler,
+        worker_id: str | None = None,
+        poll_interval: float = 1.0,
+        heartbeat_interval: float = 5.0,
+        heartbeat_timeout: float = 30.0,
+        max_attempts: int = 3,
+    ) -> None:
+        self.store = store
+        self.scheduler = scheduler
+        self.worker_id = worker_id or new_worker_id()
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self._active: dict[str, Job] = {}
+        self._events_sent: dict[str, int] = {}
+        self._cancel_requested: set[str] = set()  # Jobs cancelled through the store, not by a shutdown
+        self._flush_lock = asyncio.Lock()
+        self._reporters: set[asyncio.Task] = set()
+
+    async def run(self) -> None:
+        """Claims and runs jobs until cancelled."""
+        slots = asyncio.Semaphore(self.scheduler.max_concurrency)
+        await self.scheduler.start()
+        sync_task = asyncio.create_task(self._sync_loop(), name="job-worker-sync")
+        logger.info(f"Worker {self.worker_id} running up to {self.scheduler.max_concurrency} job(s) at once.")
+        try:
+            while True:
+                await slots.acquire()
+                try:
+                    claimed = await asyncio.to_thread(self.store.claim, self.worker_id)
+                except Exception as e:
+                    logger.warning(f"Could not claim a job: {e}")
+                    claimed = None
+                if claimed is None:
+                    slots.release()
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                job = self.scheduler.submit(claimed.payload, job_id=claimed.id)
+                logger.info(f"Claimed job {job.id}.")
+                self._active[job.id] = job
+                self._events_sent[job.id] = 0
+                reporter = asyncio.create_task(self._report(job, slots))
+                self._reporters.add(reporter)
+                reporter.add_done_callback(self._reporters.discard)
+        finally:
+            sync_task.cancel()
+            await asyncio.gather(sync_task, return_exceptions=True)
+            # Cancelled reporters forget their jobs, so keep what is left to report.
+            active, events_sent = dict(self._active), dict(self._events_sent)
+            cancel_requested = set(self._cancel_requested)
+            for reporter in list(self._reporters):
+                reporter.cancel()
+            await self._shut_down(active, events_sent, cancel_requested)
+
+    async def _shut_down(
+        self, active: dict[str, Job], events_sent: dict[str, int], cancel_requested: set[str]
+    ) -> None:
+        """Stops the local runs, reports them, and hands the ones it interrupted back to the queue.
+
+        The scheduler is closed first, so no job is still running here once it is
+        released and another worker may claim it. Jobs that finished meanwhile,
+        or were cancelled on request, are stored as finished instead.
+        """
+        await self.scheduler.close()
+        interrupted = [
+            job_id
+            for job_id, job in active.items()
+            if job.status is JobStatus.CANCELLED and job_id not in cancel_requested
+        ]
+        try:
+            await self._flush_events(active, events_sent)
+            for job_id, job in active.items():
+                if job_id not in interrupted:
+                    await asyncio.to_thread(self.store.finish, self.worker_id, job)
+            if interrupted:
+                logger.info(f"Handing {len(interrupted)} interrupted job(s) back to the queue.")
+                await asyncio.to_thread(self.store.release, self.worker_id, interrupted)
+        except Exception as e:
+            logger.warning(f"Could not hand jobs back to the queue: {e}")
+
+    async def _report(self, job: Job, slots: asyncio.Semaphore) -> None:
+        try:
+            await job.wait()
+            await self._flush_events()
+            if await asyncio.to_thread(self.store.finish, self.worker_id, job):
+                logger.info(f"Job {job.id} {job.status.value}.")
+            else:
+                logger.warning(f"Job {job.id} was re-queued while it ran here; dropping its result.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Could not report job {job.id}: {e}", exc_info=True)
+        finally:
+            self._active.pop(job.id, None)
+            self._events_sent.pop(job.id, None)
+            self._cancel_requested.discard(job.id)
+            slots.release()
+
+    async def _sync_loop(self) -> None:
+        """Forwards step events, heartbeats, applies cancellations and re-queues lost jobs."""
+        last_heartbeat = 0.0
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._flush_events()
+                if time.monotonic() - last_heartbeat < self.heartbeat_interval:
+                    continue
+                last_heartbeat = time.monotonic()
+                for job_id in await asyncio.to_thread(self.store.heartbeat, self.worker_id):
+                    if self.scheduler.cancel(job_id):
+                        self._cancel_requested.add(job_id)
+                        logger.info(f"Cancelled job {job_id} on request.")
+                await asyncio.to_thread(self.store.requeue_lost, self.heartbeat_timeout, self.max_attempts)
+            except Exception as e:
+                logger.warning(f"Could not sync with the job queue: {e}")
+
+    async def _flush_events(
+        self, active: dict[str, Job] | None = None, events_sent: dict[str, int] | None = None
+    ) -> None:
+        """Writes the jobs' new step events to the store (by default, those of the running jobs)."""
+        active = self._active if active is None else active
+        events_sent = self._events_sent if events_sent is None else events_sent
+        async with self._flush_lock:
+            for job_id, job in list(active.items()):
+                sent = events_sent.get(job_id, 0)
+                events = job.events[sent:]
+                if events:
+                    await asyncio.to_thread(self.store.add_events, job_id, events)
+                    events_sent[job_id] = sent + len(events)
+
+
+async def main(args: argparse.Namespace) -> None:
+    pool_size = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+    browser_pool = BrowserSessionPool.from_env(build_browser_profile()) if pool_size > 0 else None
+    login_cache = LoginStateCache.from_env()
+    resource_policy = ResourcePolicy.from_env()
+
+    async def run_job(payload: dict[str, Any]) -> Any:
+        run_request = run_batch_request if "prompts" in payload else run_test_request
+        return await run_request(
+            payload, pool=browser_pool, login_cache=login_cache, resource_policy=resource_policy
+        )
+
+    worker = JobWorker(
+        SQLiteJobStore.from_env(),
+        JobScheduler(run_job, max_concurrency=args.concurrency, max_queued=args.concurrency),
+        worker_id=args.worker_id,
+        heartbeat_interval=float(os.getenv("JOB_HEARTBEAT_SECONDS", "5")),
+        heartbeat_timeout=float(os.getenv("JOB_HEARTBEAT_TIMEOUT_SECONDS", "30")),
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+    )
+    if browser_pool is not None:
+        await browser_pool.start()
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await worker.run()
+    except asyncio.CancelledError:
+        logger.info(f"Worker {worker.worker_id} stopped.")
+    finally:
+        if browser_pool is not None:
+            await browser_pool.close()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("MAX_CONCURRENT_RUNS", "2")),
+        help="Jobs this worker runs at once (default: MAX_CONCURRENT_RUNS or 2).",
+    )
+    parser.add_argument("--worker-id", help="Name shown in the queue (default: host, pid and a random suffix).")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parse_args()))
@@ -64,7 +64,7 @@ chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
     } else if (message.action === 'getTestFiles') {
         fetch(`${SERVER_URL}/get-tests`)
             .then(response => response.json())
-            .then(data => sendResponse({ files: data.files }))
+            .then(data => sendResponse({ files: data.files, tests: data.tests || [] }))
             .catch(error => {
                 console.error('Error fetching test files:', error);
                 sendResponse({ files: [] });
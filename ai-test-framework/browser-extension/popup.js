@@ -103,10 +103,13 @@ document.addEventListener('DOMContentLoaded', () => {
         chrome.runtime.sendMessage({ action: 'getTestFiles' }, (response) => {
             testFilesList.innerHTML = ''; // Clear existing options
             if (response && response.files) {
+                const lastStatus = {};
+                (response.tests || []).forEach(test => { lastStatus[test.file] = test.last_status; });
+                const icons = { passed: '✅ ', failed: '❌ ' };
                 response.files.forEach(file => {
                     const option = document.createElement('option');
                     option.value = file;
-                    option.textContent = file;
+                    option.textContent = (icons[lastStatus[file]] || '') + file;
                     testFilesList.appendChild(option);
                 });
             }
@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Selectors healed by the runners, shared across all runner processes. A heal
+# is keyed by (page url, step name, old selector), so the LLM is asked once per
+# broken selector. Saved scripts are only updated where the same step on the
+# same site uses that selector: generic selectors like `#search` break for
+# different reasons on different sites.
+
+CACHE_FILE = os.path.join(os.path.dirname(__file__), '.cache', 'healing.json')
+
+
+def write_json_atomic(path: str, data) -> None:
+    """Writes JSON to a temporary file next to `path` and renames it into place."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class HealingCache:
+    """Healed selectors, persisted as one JSON file."""
+
+    def __init__(self, path: str = CACHE_FILE):
+        self.path = path
+        # Held for every read-modify-write of the cache and of the scripts it updates.
+        self.lock = threading.Lock()
+        self._entries: dict[str, dict] | None = None
+
+    @staticmethod
+    def key(url: str | None, step_name: str | None, selector: str) -> str:
+        return f"{url or ''}\n{step_name or ''}\n{selector}"
+
+    def _load(self) -> dict[str, dict]:
+        if self._entries is None:
+            try:
+                with open(self.path) as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                self._entries = {}
+            except ValueError:
+                logging.warning(f"Ignoring unreadable healing cache {self.path}")
+                self._entries = {}
+        return self._entries
+
+    def lookup(self, url: str | None, step_name: str | None, selector: str) -> dict | None:
+        with self.lock:
+            return self._load().get(self.key(url, step_name, selector))
+
+    def record(self, url: str | None, step_name: str | None, old_selector: str, new_selector: str) -> dict:
+        """Stores a heal. The caller must hold `lock`."""
+        entries = self._load()
+        entry = {
+            "url": url,
+            "stepName": step_name,
+            "oldSelector": old_selector,
+            "newSelector": new_selector,
+            "healedAt": time.time(),
+        }
+        entries[self.key(url, step_name, old_selector)] = entry
+        write_json_atomic(self.path, entries)
+        return entry
+
+
+def origin(url: str | None) -> str | None:
+    """scheme://host[:port] of a URL, or None if it has none."""
+    if not url:
+        return None
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return None
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def script_origin(script: dict) -> str | None:
+    """The origin of the first step that records a URL, normally the opening `goto`."""
+    for step in script.get("steps") or []:
+        step_origin = origin(step.get("url"))
+        if step_origin:
+            return step_origin
+    return None
+
+
+def apply_to_scripts(
+    tests_folder: str,
+    url: str | None,
+    step_name: str | None,
+    old_selector: str,
+    new_selector: str,
+) -> list[str]:
+    """Applies a heal to the saved scripts that share its step. Returns the paths that changed.
+
+    A step is rewritten only if it uses `old_selector`, has the same `stepName`
+    and runs on the heal's origin (its own URL, or else the script's). A heal
+    without a URL or step name changes nothing; the runner saves its own script.
+
+    The caller must hold the healing cache's lock so concurrent heals don't
+    overwrite each other's edits.
+    """
+    updated = []
+    heal_origin = origin(url)
+    if not os.path.isdir(tests_folder) or heal_origin is None or not step_name:
+        return updated
+    for filename in sorted(os.listdir(tests_folder)):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(tests_folder, filename)
+        try:
+            with open(path) as f:
+                script = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Skipping unreadable script {path}: {e}")
+            continue
+        changed = False
+        default_origin = script_origin(script)
+        for step in script.get("steps") or []:
+            if step.get("selector") != old_selector or step.get("stepName") != step_name:
+                continue
+            if (origin(step.get("url")) or default_origin) != heal_origin:
+                continue
+            step["selector"] = new_selector
+            changed = True
+        if changed:
+            write_json_atomic(path, script)
+            updated.append(os.path.abspath(path))
+    return updated
@@ -0,0 +1,39 @@
+from prometheus_client import Counter, Histogram
+
+# Prometheus histograms for the recorder server, exposed on /metrics.
+
+REQUEST_DURATION = Histogram(
+    "recorder_request_duration_seconds",
+    "HTTP request duration.",
+    ["method", "path", "status"],
+    buckets=(0.05, 0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600),
+)
+QUEUE_WAIT = Histogram(
+    "recorder_queue_wait_seconds",
+    "Time a test file waited for an idle runner worker.",
+    buckets=(0.01, 0.1, 0.5, 1, 5, 15, 30, 60, 120, 300),
+)
+STEPS_PER_TASK = Histogram(
+    "recorder_steps_per_test",
+    "Steps executed per test file.",
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+LLM_CALL_LATENCY = Histogram(
+    "recorder_llm_call_seconds",
+    "Latency of a self-healing LLM call.",
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60),
+)
+BLOCKED_REQUESTS = Counter(
+    "recorder_blocked_requests_total",
+    "Requests aborted by the runner's resource-blocking policy.",
+)
+WORKER_RSS = Histogram(
+    "recorder_worker_rss_megabytes",
+    "Resident memory of a runner worker and its browser, sampled after each test.",
+    buckets=(100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000),
+)
+WORKER_RECYCLES = Counter(
+    "recorder_worker_recycles_total",
+    "Runner workers restarted because they crossed a memory limit.",
+    ["reason"],
+)
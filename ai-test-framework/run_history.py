@@ -0,0 +1,82 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from healing_cache import write_json_atomic
+
+# Per-test durations and recent outcomes, used to order suite runs: tests whose
+# last run failed go first, then the rest longest-first, so parallel workers
+# finish together instead of waiting on one long test picked up last.
+# src/scheduler.js reads and writes the same file.
+
+HISTORY_FILE = os.path.join(os.path.dirname(__file__), '.cache', 'history.json')
+RECENT_RUNS = 10 # Outcomes kept per test for its failure rate
+DEFAULT_DURATION_SECONDS = 30.0 # Assumed for tests that never ran
+
+
+class RunHistory:
+    """Durations and outcomes of past runs, keyed by test file name."""
+
+    def __init__(self, path: str = HISTORY_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.path) as f:
+                return json.load(f).get("tests", {})
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logging.warning(f"Ignoring unreadable run history {self.path}")
+            return {}
+
+    def record(self, test: str, passed: bool, duration_seconds: float):
+        # Re-read before writing: the Node suite runner updates the same file.
+        with self.lock:
+            tests = self._load()
+            entry = tests.setdefault(test, {"runs": 0, "failures": 0, "avg_duration_seconds": None, "recent": []})
+            entry["runs"] += 1
+            entry["failures"] += 0 if passed else 1
+            previous = entry["avg_duration_seconds"]
+            # Exponential moving average, so a test that got slower is rescheduled soon.
+            entry["avg_duration_seconds"] = duration_seconds if previous is None else 0.7 * previous + 0.3 * duration_seconds
+            entry["last_duration_seconds"] = duration_seconds
+            entry["recent"] = (entry["recent"] + ["passed" if passed else "failed"])[-RECENT_RUNS:]
+            entry["last_run_at"] = time.time()
+            write_json_atomic(self.path, {"tests": tests})
+
+    def order(self, tests: list[str]) -> list[str]:
+        """Tests whose last run failed first (highest failure rate first), then longest-first."""
+        with self.lock:
+            history = self._load()
+        known = [e["avg_duration_seconds"] for e in history.values() if e.get("avg_duration_seconds")]
+        unknown_duration = sum(known) / len(known) if known else DEFAULT_DURATION_SECONDS
+
+        def key(test: str):
+            entry = history.get(test) or {}
+            recent = entry.get("recent") or []
+            last_failed = bool(recent) and recent[-1] == "failed"
+            failure_rate = recent.count("failed") / len(recent) if recent else 0.0
+            duration = entry.get("avg_duration_seconds") or unknown_duration
+            return (not last_failed, -failure_rate if last_failed else 0.0, -duration)
+
+        return sorted(tests, key=key)
+
+
+class FailureBudget:
+    """Stops a run once `max_failures` tests have failed (None means never)."""
+
+    def __init__(self, max_failures: int | None):
+        self.max_failures = max_failures
+        self.failures = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.max_failures is not None and self.failures >= self.max_failures
+
+    def record(self, passed: bool):
+        if not passed:
+            self.failures += 1
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+import psutil
+from metrics import BLOCKED_REQUESTS, LLM_CALL_LATENCY, QUEUE_WAIT, STEPS_PER_TASK, WORKER_RECYCLES, WORKER_RSS
+
+# A small pool of long-lived `node src/worker.js` processes. Each worker keeps one
+# browser open and runs every test in a new context, so a test run no longer pays
+# for a Node startup and a browser launch. Browsers leak renderer memory on heavy
+# pages, so after every test the worker's process tree (Node plus Chromium) is
+# measured and the worker is restarted between tests once it crosses
+# RUNNER_MAX_RSS_MB or leaves more than RUNNER_MAX_OPEN_PAGES pages open.
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), 'src', 'worker.js')
+# Longest reply line read from a worker. Each reply is one line holding the
+# test's full logs, far beyond asyncio's 64 KiB default.
+REPLY_LIMIT_BYTES = 64 * 1024 * 1024
+
+
+def process_tree_rss_mb(pid: int) -> float | None:
+    """Resident memory of a process and all its children, in MB."""
+    try:
+        process = psutil.Process(pid)
+        processes = [process, *process.children(recursive=True)]
+    except psutil.NoSuchProcess:
+        return None
+    total = 0
+    for p in processes:
+        try:
+            total += p.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total / (1024 * 1024)
+
+
+class RunnerWorker:
+    """One Node worker process, spoken to over newline-delimited JSON on stdio."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.process: asyncio.subprocess.Process | None = None
+        self._stderr_task: asyncio.Task | None = None
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            'node', WORKER_SCRIPT,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=REPLY_LIMIT_BYTES,
+        )
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
+        logging.info(f"Started runner worker {self.name} (pid {self.process.pid}).")
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def run(self, test_file_path: str, timeout: float) -> dict:
+        """Runs one test file and returns the worker's reply."""
+        request_id = uuid.uuid4().hex
+        request = json.dumps({"id": request_id, "file": test_file_path}) + "\n"
+        self.process.stdin.write(request.encode())
+        await self.process.stdin.drain()
+        return await asyncio.wait_for(self._read_reply(request_id), timeout=timeout)
+
+    async def _read_reply(self, request_id: str) -> dict:
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Runner worker {self.name} exited unexpectedly.")
+            try:
+                reply = json.loads(line)
+            except ValueError:
+                logging.warning(f"[{self.name}] Ignoring non-protocol output: {line.decode(errors='replace').rstrip()}")
+                continue
+            if reply.get("id") == request_id:
+                return reply
+
+    async def _drain_stderr(self):
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                return
+            logging.info(f"[{self.name}] {line.decode(errors='replace').rstrip()}")
+
+    async def stop(self):
+        if self.alive:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        if self._stderr_task:
+            self._stderr_task.cancel()
+
+
+class RunnerPool:
+    """Hands test files to idle workers, replacing any worker that crashes or hangs."""
+
+    def __init__(self, size: int, max_rss_mb: float = 0, max_open_pages: int = 0):
+        self.size = max(1, size)
+        # Zero turns a limit off.
+        self.max_rss_mb = max_rss_mb
+        self.max_open_pages = max_open_pages
+        self._idle: asyncio.Queue[RunnerWorker] = asyncio.Queue()
+        self._workers: list[RunnerWorker] = []
+
+    async def start(self):
+        for i in range(self.size):
+            worker = RunnerWorker(f"worker-{i}")
+            await worker.start()
+            self._workers.append(worker)
+            self._idle.put_nowait(worker)
+
+    async def close(self):
+        await asyncio.gather(*(worker.stop() for worker in self._workers), return_exceptions=True)
+        self._workers = []
+
+    async def run(self, test_file_path: str, timeout: float) -> dict:
+        """Runs a test on the next idle worker. Returns passed, duration_seconds and logs."""
+        queued_at = time.monotonic()
+        worker = await self._idle.get()
+        start = time.monotonic()
+        QUEUE_WAIT.observe(start - queued_at)
+        try:
+            if not worker.alive:
+                worker = await self._replace(worker)
+                if not worker.alive:
+                    # The worker goes back idle and the next run tries to start it again.
+                    message = f"🛑 Runner worker {worker.name} could not be started."
+                    return {"passed": False, "duration_seconds": round(time.monotonic() - start, 3), "logs": message}
+            reply = await worker.run(test_file_path, timeout)
+            stats = reply.get("stats") or {}
+            STEPS_PER_TASK.observe(stats.get("steps", 0))
+            for duration_ms in stats.get("llmCallsMs", []):
+                LLM_CALL_LATENCY.observe(duration_ms / 1000)
+            BLOCKED_REQUESTS.inc(stats.get("blockedRequests", 0))
+            memory = await self._check_memory(worker, reply.get("openPages", 0))
+            if memory["recycled"]:
+                worker = await self._recycle(worker)
+            return {
+                "passed": bool(reply.get("passed")),
+                "duration_seconds": round(reply.get("durationMs", 0) / 1000, 3),
+                "logs": reply.get("logs", ""),
+                "resources_blocked": {
+                    "requests": stats.get("blockedRequests", 0),
+                    "by_type": stats.get("blockedByType", {}),
+                    # At the measured average of each type; see src/resource-policy.js.
+                    "bytes": round(stats.get("blockedBytes", 0)),
+                    "request_seconds": round(stats.get("blockedSeconds", 0), 2),
+                    "unmeasured": stats.get("unmeasuredRequests", 0),
+                },
+                "memory": memory,
+            }
+        except Exception as e:
+            # A timeout, crash or unreadable reply leaves the worker's browser and its
+            # stdout in an unknown state; start over with a new one.
+            message = f"⏱️ Timed out after {timeout:.0f}s." if isinstance(e, asyncio.TimeoutError) else f"🛑 {e}"
+            expected = isinstance(e, (asyncio.TimeoutError, RuntimeError, OSError))
+            logging.error(f"Runner worker {worker.name} failed on {test_file_path}: {message}", exc_info=not expected)
+            worker = await self._replace(worker)
+            return {"passed": False, "duration_seconds": round(time.monotonic() - start, 3), "logs": message}
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def _check_memory(self, worker: RunnerWorker, open_pages: int) -> dict:
+        """Samples the worker after a test and decides whether it must be recycled."""
+        rss_mb = await asyncio.to_thread(process_tree_rss_mb, worker.process.pid)
+        if rss_mb is not None:
+            WORKER_RSS.observe(rss_mb)
+        reason = None
+        if self.max_rss_mb and rss_mb is not None and rss_mb > self.max_rss_mb:
+            reason = "rss"
+        elif self.max_open_pages and open_pages > self.max_open_pages:
+            reason = "pages"
+        if reason:
+            WORKER_RECYCLES.labels(reason=reason).inc()
+            logging.info(
+                f"Recycling runner worker {worker.name}: {rss_mb or 0:.0f} MB, {open_pages} open page(s) "
+                f"(limits {self.max_rss_mb:.0f} MB, {self.max_open_pages} pages)."
+            )
+        return {
+            "rss_mb": round(rss_mb, 1) if rss_mb is not None else None,
+            "open_pages": open_pages,
+            "recycled": reason is not None,
+        }
+
+    async def _recycle(self, worker: RunnerWorker) -> RunnerWorker:
+        """Lets the worker close its browser and exit, then starts a fresh one in its place."""
+        await worker.stop()
+        return await self._start_replacement(worker)
+
+    async def _replace(self, worker: RunnerWorker) -> RunnerWorker:
+        if worker.alive:
+            worker.process.kill()
+            await worker.process.wait()
+        await worker.stop()
+        return await self._start_replacement(worker)
+
+    async def _start_replacement(self, worker: RunnerWorker) -> RunnerWorker:
+        """Starts a new worker in place of `worker`. Never raises: a replacement that fails
+        to start is returned dead, and the next run() tries to start it again."""
+        replacement = RunnerWorker(worker.name)
+        try:
+            await replacement.start()
+        except Exception as e:
+            logging.error(f"Could not start runner worker {worker.name}: {e}", exc_info=True)
+        self._workers[self._workers.index(worker)] = replacement
+        return replacement
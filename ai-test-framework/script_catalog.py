@@ -0,0 +1,157 @@
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+from healing_cache import write_json_atomic
+
+# An incremental index of the saved test scripts. A script is only parsed again
+# when its mtime or size changes, and the folder is only rescanned when its own
+# mtime changes (scripts are written by rename, which always touches it).
+
+CATALOG_FILE = os.path.join(os.path.dirname(__file__), '.cache', 'catalog.json')
+# Rescan at least this often anyway, to notice scripts edited in place.
+RESCAN_SECONDS = 30
+
+SORT_KEYS = {
+    "name": lambda entry: entry["name"].lower(),
+    "steps": lambda entry: entry["steps"],
+    "last_run": lambda entry: entry["last_run_at"] or 0,
+    "duration": lambda entry: entry["last_duration_seconds"] or 0,
+}
+
+
+def _script_domains(steps: list[dict]) -> list[str]:
+    domains = set()
+    for step in steps:
+        for value in (step.get("url"), step.get("value") if step.get("action") == "goto" else None):
+            if value:
+                host = urlparse(value).hostname
+                if host:
+                    domains.add(host)
+    return sorted(domains)
+
+
+class ScriptCatalog:
+    """Name, step count, domains and last result of every script in `tests_folder`."""
+
+    def __init__(self, tests_folder: str, path: str = CATALOG_FILE):
+        self.tests_folder = tests_folder
+        self.path = path
+        self.lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._folder_mtime_ns: int | None = None
+        self._scanned_at = 0.0
+        self._loaded = False
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logging.warning(f"Ignoring unreadable test catalog {self.path}")
+            return
+        # A catalog built for another tests folder is of no use.
+        if data.get("tests_folder") == os.path.abspath(self.tests_folder):
+            self._entries = data.get("entries", {})
+
+    def _save(self):
+        write_json_atomic(self.path, {"tests_folder": os.path.abspath(self.tests_folder), "entries": self._entries})
+
+    def _index(self, filename: str, stat: os.stat_result, previous: dict | None) -> dict:
+        entry = {
+            "file": filename,
+            "name": os.path.splitext(filename)[0],
+            "steps": 0,
+            "domains": [],
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "last_status": None,
+            "last_duration_seconds": None,
+            "last_run_at": None,
+        }
+        if previous:
+            for key in ("last_status", "last_duration_seconds", "last_run_at"):
+                entry[key] = previous.get(key)
+        try:
+            with open(os.path.join(self.tests_folder, filename)) as f:
+                script = json.load(f)
+            steps = script.get("steps") or []
+            entry.update(name=script.get("name") or entry["name"], steps=len(steps), domains=_script_domains(steps))
+        except (OSError, ValueError, AttributeError) as e:
+            logging.warning(f"Could not index {filename}: {e}")
+        return entry
+
+    def refresh(self) -> dict[str, dict]:
+        """Brings the catalog up to date with the folder and returns its entries."""
+        with self.lock:
+            if not self._loaded:
+                self._load()
+            try:
+                folder_mtime_ns = os.stat(self.tests_folder).st_mtime_ns
+            except FileNotFoundError:
+                self._entries, self._folder_mtime_ns = {}, None
+                return {}
+            if folder_mtime_ns == self._folder_mtime_ns and time.monotonic() - self._scanned_at < RESCAN_SECONDS:
+                return self._entries
+
+            entries, changed = {}, False
+            with os.scandir(self.tests_folder) as scan:
+                for item in scan:
+                    if not item.name.endswith('.json') or item.name.startswith('.') or not item.is_file():
+                        continue
+                    stat = item.stat()
+                    previous = self._entries.get(item.name)
+                    if previous and previous["mtime_ns"] == stat.st_mtime_ns and previous["size"] == stat.st_size:
+                        entries[item.name] = previous
+                    else:
+                        entries[item.name] = self._index(item.name, stat, previous)
+                        changed = True
+            changed = changed or entries.keys() != self._entries.keys()
+            self._entries, self._folder_mtime_ns = entries, folder_mtime_ns
+            self._scanned_at = time.monotonic()
+            if changed:
+                self._save()
+            return self._entries
+
+    def record_result(self, filename: str, status: str, duration_seconds: float):
+        """Stores the outcome of a run of `filename`."""
+        self.refresh()
+        with self.lock:
+            entry = self._entries.get(filename)
+            if entry is None:
+                return
+            entry.update(last_status=status, last_duration_seconds=duration_seconds, last_run_at=time.time())
+            self._save()
+
+    def query(
+        self,
+        domain: str | None = None,
+        status: str | None = None,
+        sort: str = "name",
+        page: int = 1,
+        page_size: int | None = None,
+    ) -> tuple[list[dict], int]:
+        """Filters, sorts and pages the catalog. Returns the page and the total match count.
+
+        `status` is "passed", "failed" or "never" (not run yet); `sort` is a key
+        of SORT_KEYS, prefixed with "-" for descending order.
+        """
+        entries = list(self.refresh().values())
+        if domain:
+            entries = [e for e in entries if any(d == domain or d.endswith("." + domain) for d in e["domains"])]
+        if status:
+            wanted = None if status == "never" else status
+            entries = [e for e in entries if e["last_status"] == wanted]
+        descending = sort.startswith("-")
+        entries.sort(key=SORT_KEYS[sort.lstrip("-")], reverse=descending)
+        total = len(entries)
+        if page_size:
+            start = (page - 1) * page_size
+            entries = entries[start:start + page_size]
+        return entries, total
@@ -1,12 +1,49 @@
+import asyncio
+import hashlib
 import json
 import os
 import logging
-import subprocess
-from fastapi import FastAPI, HTTPException
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
+from healing_cache import HealingCache, apply_to_scripts, write_json_atomic
+from metrics import REQUEST_DURATION
+from run_history import FailureBudget, RunHistory
+from runner_pool import RunnerPool
+from script_catalog import SORT_KEYS, ScriptCatalog
 
-app = FastAPI()
+# --- Runner Configuration ---
+# How many test files run in parallel, and how long a single file may take.
+RUNNER_WORKERS = int(os.getenv("RUNNER_WORKERS", "2"))
+RUNNER_TIMEOUT_SECONDS = float(os.getenv("RUNNER_TIMEOUT_SECONDS", "600"))
+# A worker is restarted between tests once its Node process and browser use more
+# memory than this, or it has pages left open after a test (0 turns a limit off).
+RUNNER_MAX_RSS_MB = float(os.getenv("RUNNER_MAX_RSS_MB", "1500"))
+RUNNER_MAX_OPEN_PAGES = int(os.getenv("RUNNER_MAX_OPEN_PAGES", "5"))
+# Where test scripts are saved and read from.
+TESTS_FOLDER = os.getenv("TESTS_DIR", os.path.join(os.path.dirname(__file__), 'tests'))
+
+# Long-lived Node workers (src/worker.js), each keeping one browser open.
+runner_pool = RunnerPool(RUNNER_WORKERS, max_rss_mb=RUNNER_MAX_RSS_MB, max_open_pages=RUNNER_MAX_OPEN_PAGES)
+# Selectors healed by any runner, reused before asking the LLM again.
+healing_cache = HealingCache()
+# Incremental index of the saved scripts and their last results, behind /get-tests.
+catalog = ScriptCatalog(TESTS_FOLDER)
+# Past durations and outcomes, used to order /run-tests (shared with src/run-suite.js).
+run_history = RunHistory()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await runner_pool.start()
+    try:
+        yield
+    finally:
+        await runner_pool.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # --- CORS Middleware ---
 # Allow the browser extension to communicate with this server
@@ -18,6 +55,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_DURATION.labels(
+            method=request.method,
+            path=getattr(route, "path", "unmatched"),
+            status=str(status),
+        ).observe(time.perf_counter() - start)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -35,10 +88,25 @@ class ScriptData(BaseModel):
     variables: dict
     steps: list[Step]
 
+class HealedStep(BaseModel):
+    url: str | None = None # Page URL where the step failed
+    stepName: str | None = None
+    oldSelector: str
+    newSelector: str
+
 class RunTestsRequest(BaseModel):
     files: list[str]
+    workers: int | None = None # Caps parallelism for this run (at most RUNNER_WORKERS)
+    order: str = "history" # "history": last failures first, then longest first; "given": as listed
+    max_failures: int | None = None # Skip the remaining tests after this many failures
+    fail_fast: bool = False # Same as max_failures=1
 
 # --- API Endpoints ---
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: request duration, queue wait, steps per test, LLM latency."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/save-script")
 async def save_script(script_data: ScriptData):
     """
@@ -46,10 +114,8 @@ async def save_script(script_data: ScriptData):
     """
     logging.info("Received request to /save-script endpoint.")
     try:
-        # Ensure the 'tests' directory exists relative to this script file.
-        server_dir = os.path.dirname(__file__)
-        tests_folder = os.path.join(server_dir, 'tests')
-        logging.info(f"Server directory is: {os.path.abspath(server_dir)}")
+        # Ensure the 'tests' directory exists.
+        tests_folder = TESTS_FOLDER
         logging.info(f"Ensuring 'tests' folder exists at: {os.path.abspath(tests_folder)}")
         os.makedirs(tests_folder, exist_ok=True)
 
@@ -58,8 +124,8 @@ async def save_script(script_data: ScriptData):
         filepath = os.path.join(tests_folder, filename)
         logging.info(f"Attempting to save script to: {os.path.abspath(filepath)}")
 
-        with open(filepath, "w") as f:
-            json.dump(script_data.dict(), f, indent=2)
+        with healing_cache.lock:
+            write_json_atomic(filepath, script_data.dict())
 
         logging.info(f"✅ Script saved successfully to {os.path.abspath(filepath)}")
         return {"message": "Script saved successfully", "filepath": filepath}
@@ -68,76 +134,153 @@ async def save_script(script_data: ScriptData):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get-tests")
-async def get_tests():
-    """Returns a list of all .json test files in the tests directory."""
+async def get_tests(
+    request: Request,
+    domain: str | None = None,
+    status: str | None = None,
+    sort: str = "name",
+    page: int = 1,
+    page_size: int | None = None,
+):
+    """
+    Returns the saved test files from the catalog. `files` lists the file names,
+    `tests` their catalog entries (name, steps, domains, last status and duration).
+    Supports filtering by domain or status (passed/failed/never), sorting,
+    pagination and If-None-Match.
+    """
     logging.info("Received request to /get-tests endpoint.")
+    if status not in (None, "passed", "failed", "never"):
+        raise HTTPException(status_code=400, detail="status must be passed, failed or never.")
+    if sort.lstrip("-") not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(SORT_KEYS)}.")
+    if page < 1 or (page_size is not None and page_size < 1):
+        raise HTTPException(status_code=400, detail="page and page_size must be positive.")
     try:
-        server_dir = os.path.dirname(__file__)
-        tests_folder = os.path.join(server_dir, 'tests')
-        if not os.path.isdir(tests_folder):
-            return {"files": []}
-        
-        files = [f for f in os.listdir(tests_folder) if f.endswith('.json')]
-        logging.info(f"Found {len(files)} test files.")
-        return {"files": files}
+        tests, total = await asyncio.to_thread(catalog.query, domain, status, sort, page, page_size)
     except Exception as e:
         logging.error(f"Error getting test list: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+    body = {
+        "files": [t["file"] for t in tests],
+        "tests": tests,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+    }
+    content = json.dumps(body).encode()
+    etag = '"' + hashlib.sha1(content).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content, media_type="application/json", headers=headers)
+
+@app.get("/healing")
+async def get_healed_selector(selector: str, url: str | None = None, stepName: str | None = None):
+    """Returns the selector a runner already healed for this step, if any."""
+    entry = await asyncio.to_thread(healing_cache.lookup, url, stepName, selector)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="No healed selector for this step.")
+    logging.info(f"♻️ Healing cache hit: {selector} -> {entry['newSelector']}")
+    return entry
+
+@app.post("/healing")
+async def record_healed_selector(healed: HealedStep):
+    """Stores a healed selector and applies it to the same step of the saved scripts for that site."""
+    def record():
+        with healing_cache.lock:
+            entry = healing_cache.record(healed.url, healed.stepName, healed.oldSelector, healed.newSelector)
+            updated = apply_to_scripts(
+                TESTS_FOLDER, healed.url, healed.stepName, healed.oldSelector, healed.newSelector
+            )
+        return entry, updated
+
+    try:
+        entry, updated = await asyncio.to_thread(record)
+    except Exception as e:
+        logging.error(f"Error recording healed selector: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    logging.info(f"🩹 Healed {healed.oldSelector} -> {healed.newSelector}; updated {len(updated)} script(s).")
+    return {**entry, "updatedFiles": updated}
+
+async def run_test_file(filename: str, tests_folder: str, slots: asyncio.Semaphore, budget: FailureBudget) -> dict:
+    """Runs one test file on a pooled runner worker and returns its result."""
+    result = {"file": filename, "status": "skipped", "duration_seconds": 0.0, "logs": ""}
+
+    # Security: Basic sanitization to prevent path traversal
+    if '..' in filename or not filename.endswith('.json'):
+        result["logs"] = f"⚠️ Skipping invalid or malicious filename: {filename}"
+        logging.warning(result["logs"])
+        return result
+
+    test_file_path = os.path.join(tests_folder, filename)
+    if not os.path.exists(test_file_path):
+        result["logs"] = f"⚠️ Test file not found, skipping: {test_file_path}"
+        logging.warning(result["logs"])
+        return result
+
+    async with slots:
+        if budget.exhausted:
+            result["logs"] = f"⏭️ Skipped after {budget.failures} failure(s)."
+            return result
+        logging.info(f"Executing on runner pool: {test_file_path}")
+        outcome = await runner_pool.run(os.path.abspath(test_file_path), timeout=RUNNER_TIMEOUT_SECONDS)
+        budget.record(outcome["passed"])
+
+    result["status"] = "passed" if outcome["passed"] else "failed"
+    result["duration_seconds"] = outcome["duration_seconds"]
+    await asyncio.to_thread(catalog.record_result, filename, result["status"], result["duration_seconds"])
+    await asyncio.to_thread(run_history.record, filename, outcome["passed"], result["duration_seconds"])
+    result["logs"] = outcome["logs"]
+    result["resources_blocked"] = outcome.get("resources_blocked")
+    result["memory"] = outcome.get("memory")
+    logging.info(f"{'✅' if outcome['passed'] else '❌'} {filename} {result['status']} in {result['duration_seconds']}s")
+    return result
+
 @app.post("/run-tests")
 async def run_tests(request_data: RunTestsRequest):
-    """Runs the selected test files using the Playwright runner."""
+    """Runs the selected test files on the pool of Playwright runner workers."""
     files_to_run = request_data.files
     if not files_to_run:
         raise HTTPException(status_code=400, detail="No test files selected.")
 
     logging.info(f"Received request to run tests: {', '.join(files_to_run)}")
-    
-    server_dir = os.path.dirname(__file__)
-    tests_folder = os.path.join(server_dir, 'tests')
-    runner_script = os.path.join(server_dir, 'src', 'runner.js')
-    all_logs = []
+
+    if request_data.order not in ("history", "given"):
+        raise HTTPException(status_code=400, detail="order must be 'history' or 'given'.")
+
+    tests_folder = TESTS_FOLDER
+    slots = asyncio.Semaphore(max(1, request_data.workers or RUNNER_WORKERS))
+    budget = FailureBudget(1 if request_data.fail_fast else request_data.max_failures)
+    # The semaphore admits waiters in order, so this is the order tests reach the workers.
+    if request_data.order == "history":
+        files_to_run = await asyncio.to_thread(run_history.order, files_to_run)
+        logging.info(f"Scheduled order: {', '.join(files_to_run)}")
 
     try:
-        for filename in files_to_run:
-            # Security: Basic sanitization to prevent path traversal
-            if '..' in filename or not filename.endswith('.json'):
-                log_line = f"⚠️ Skipping invalid or malicious filename: {filename}"
-                logging.warning(log_line)
-                all_logs.append(log_line)
-                continue
-            
-            test_file_path = os.path.join(tests_folder, filename)
-            if not os.path.exists(test_file_path):
-                log_line = f"⚠️ Test file not found, skipping: {test_file_path}"
-                logging.warning(log_line)
-                all_logs.append(log_line)
-                continue
-
-            logging.info(f"Executing: node {runner_script} {test_file_path}")
-            # The `check=True` will raise CalledProcessError if the node script exits with a non-zero code (i.e., a test fails)
-            result = subprocess.run(['node', runner_script, test_file_path], capture_output=True, text=True)
-            all_logs.append(result.stdout)
-            if result.stderr:
-                all_logs.append(f"--- STDERR ---\n{result.stderr}")
-            result.check_returncode() # Manually check and raise error if failed
-
-        message = f"🎉 Successfully ran {len(files_to_run)} test(s)."
-        logging.info(message)
-        return {"success": True, "message": message, "logs": "\n".join(all_logs)}
-    except subprocess.CalledProcessError as e:
-        message = f"❌ A test failed during execution. See server console for details."
-        all_logs.append(e.stdout)
-        all_logs.append(f"--- STDERR ---\n{e.stderr}")
-        logging.error(f"{message}\nRunner output:\n{''.join(all_logs)}")
-        raise HTTPException(status_code=500, detail=message, headers={"X-Logs": "\n".join(all_logs)})
+        results = await asyncio.gather(
+            *(run_test_file(filename, tests_folder, slots, budget) for filename in files_to_run)
+        )
     except Exception as e:
         message = f"❌ An unexpected error occurred: {e}"
         logging.error(message, exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e), headers={"X-Logs": "\n".join(all_logs)})
+        raise HTTPException(status_code=500, detail=str(e))
+
+    passed = sum(1 for r in results if r["status"] == "passed")
+    failed = sum(1 for r in results if r["status"] == "failed")
+    skipped = len(results) - passed - failed
+    if failed:
+        message = f"❌ {failed} of {len(results)} test(s) failed."
+    else:
+        message = f"🎉 Successfully ran {passed} test(s)."
+    if skipped:
+        message += f" {skipped} skipped."
+    logging.info(message)
+
+    all_logs = "\n".join(f"===== {r['file']} ({r['status']}) =====\n{r['logs']}" for r in results)
+    return {"success": failed == 0 and passed > 0, "message": message, "logs": all_logs, "results": results}
 
 if __name__ == '__main__':
     import uvicorn
-    tests_folder = os.path.join(os.path.dirname(__file__), 'tests')
-    logging.info(f"Recorder server starting. Scripts will be saved to: {tests_folder}")
+    logging.info(f"Recorder server starting. Scripts will be saved to: {TESTS_FOLDER}")
     uvicorn.run(app, host="0.0.0.0", port=5001)
@@ -0,0 +1,88 @@
+// src/healing-client.js
+// Talks to the recorder server's selector-healing cache (see healing_cache.py),
+// so a broken selector is healed through the LLM once and reused everywhere.
+const { readFileSync, writeFileSync, renameSync, unlinkSync } = require('fs');
+const { dirname, basename, join, resolve } = require('path');
+
+const HEALING_SERVER_URL = process.env.HEALING_SERVER_URL || 'http://localhost:5001';
+const REQUEST_TIMEOUT_MS = 3000;
+
+/**
+ * Asks the server whether this step's selector was already healed.
+ * @returns {Promise<object|null>} The step with the cached selector, or null on a miss or error.
+ */
+async function lookupHealedStep(pageUrl, step) {
+    const params = new URLSearchParams({ selector: step.selector || '', url: pageUrl || '', stepName: step.stepName || '' });
+    try {
+        const response = await fetch(`${HEALING_SERVER_URL}/healing?${params}`, {
+            signal: AbortSignal.timeout(REQUEST_TIMEOUT_MS),
+        });
+        if (!response.ok) return null;
+        const entry = await response.json();
+        return { ...step, selector: entry.newSelector };
+    } catch (e) {
+        return null; // No server (e.g. a CLI run): heal through the LLM as before.
+    }
+}
+
+/**
+ * Records a heal on the server, which rewrites the steps of saved scripts that have the same
+ * stepName and old selector on the same origin as `pageUrl`.
+ * @returns {Promise<string[]|null>} Absolute paths of the scripts the server updated, or null if unreachable.
+ */
+async function reportHealedStep(pageUrl, failedStep, recoveredStep) {
+    try {
+        const response = await fetch(`${HEALING_SERVER_URL}/healing`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                url: pageUrl || null,
+                stepName: failedStep.stepName || null,
+                oldSelector: failedStep.selector,
+                newSelector: recoveredStep.selector,
+            }),
+            signal: AbortSignal.timeout(REQUEST_TIMEOUT_MS),
+        });
+        if (!response.ok) return null;
+        return (await response.json()).updatedFiles || [];
+    } catch (e) {
+        return null;
+    }
+}
+
+/** Writes the script to a temporary file and renames it into place, so readers never see half a file. */
+function writeScriptAtomic(filePath, data) {
+    const tmpPath = join(dirname(filePath), `.tmp-${process.pid}-${Date.now()}-${basename(filePath)}`);
+    try {
+        writeFileSync(tmpPath, JSON.stringify(data, null, 2));
+        renameSync(tmpPath, filePath);
+    } catch (e) {
+        try { unlinkSync(tmpPath); } catch (_) { /* already gone */ }
+        throw e;
+    }
+}
+
+/**
+ * Persists a healed step: through the server when it is running, otherwise
+ * (or if the server did not cover this file) in the script itself. The local
+ * write re-reads the script and changes only that step, if it still has the
+ * failed selector, so edits saved since the run started are kept; the file is
+ * replaced atomically.
+ */
+async function persistHealedStep(testFilePath, stepIndex, pageUrl, failedStep, recoveredStep, log = console) {
+    const updatedFiles = await reportHealedStep(pageUrl, failedStep, recoveredStep);
+    if (updatedFiles && updatedFiles.includes(resolve(testFilePath))) {
+        log.log(`    💾 Healed selector saved; ${updatedFiles.length} script(s) updated.`);
+        return;
+    }
+    const script = JSON.parse(readFileSync(testFilePath, 'utf-8'));
+    const saved = (script.steps || [])[stepIndex];
+    if (!saved || saved.stepName !== failedStep.stepName || saved.selector !== failedStep.selector) {
+        log.warn('    ⚠️ The script changed during the run; the healed selector was not saved.');
+        return;
+    }
+    script.steps[stepIndex] = { ...saved, selector: recoveredStep.selector };
+    writeScriptAtomic(testFilePath, script);
+}
+
+module.exports = { lookupHealedStep, reportHealedStep, persistHealedStep, writeScriptAtomic };
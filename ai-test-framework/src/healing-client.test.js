@@ -0,0 +1,42 @@
+// src/healing-client.test.js
+// Run with `npm run test:unit`.
+const { test } = require('node:test');
+const assert = require('node:assert');
+const { mkdtempSync, readFileSync, readdirSync, writeFileSync } = require('fs');
+const { tmpdir } = require('os');
+const { dirname, join } = require('path');
+
+// Nothing listens here, so every heal takes the local fallback.
+process.env.HEALING_SERVER_URL = 'http://127.0.0.1:9';
+const { persistHealedStep } = require('./healing-client');
+
+const quiet = { log() {}, warn() {} };
+const failed = { stepName: 'Click login', action: 'click', selector: '#login' };
+const recovered = { ...failed, selector: 'button[type=submit]' };
+
+function writeScript(steps) {
+    const path = join(mkdtempSync(join(tmpdir(), 'healing-')), 'login.json');
+    writeFileSync(path, JSON.stringify({ name: 'Login', steps }, null, 2));
+    return path;
+}
+
+test('saves only the healed step and keeps edits made during the run', async () => {
+    const path = writeScript([{ stepName: 'Open', action: 'goto', value: 'https://a.test' }, failed]);
+    // Someone edits another step while the test runs.
+    const edited = JSON.parse(readFileSync(path, 'utf-8'));
+    edited.steps[0].value = 'https://a.test/login';
+    writeFileSync(path, JSON.stringify(edited));
+
+    await persistHealedStep(path, 1, 'https://a.test/login', failed, recovered, quiet);
+
+    const saved = JSON.parse(readFileSync(path, 'utf-8'));
+    assert.strictEqual(saved.steps[0].value, 'https://a.test/login');
+    assert.strictEqual(saved.steps[1].selector, 'button[type=submit]');
+    assert.deepStrictEqual(readdirSync(dirname(path)), ['login.json']);
+});
+
+test('leaves a step alone that was changed during the run', async () => {
+    const path = writeScript([{ ...failed, selector: '#sign-in' }]);
+    await persistHealedStep(path, 0, 'https://a.test/login', failed, recovered, quiet);
+    assert.strictEqual(JSON.parse(readFileSync(path, 'utf-8')).steps[0].selector, '#sign-in');
+});
@@ -0,0 +1,43 @@
+// src/network-archive.js
+// Records a test's network traffic to a HAR file, or replays it from one, so
+// reruns and benchmarks don't depend on the live site:
+//   NETWORK_ARCHIVE_MODE=off|record|replay (default off)
+//   NETWORK_ARCHIVE_DIR (default ./network_archives), one <test name>.har per script
+//   NETWORK_ARCHIVE_FALLBACK=network|abort: what a replayed request missing from the HAR does
+const { existsSync, mkdirSync } = require('fs');
+const { basename, join, resolve } = require('path');
+
+const MODES = ['off', 'record', 'replay'];
+
+/**
+ * Routes the context's requests through the test's HAR archive, per NETWORK_ARCHIVE_MODE.
+ * Call it before any other context.route(): later routes run first and fall back to it.
+ * @returns {Promise<string|null>} The HAR path in use, or null when the network is live.
+ */
+async function applyNetworkArchive(context, testFilePath, log = console, env = process.env) {
+    const mode = (env.NETWORK_ARCHIVE_MODE || 'off').toLowerCase();
+    if (!MODES.includes(mode)) throw new Error(`Unknown NETWORK_ARCHIVE_MODE: ${mode}`);
+    if (mode === 'off') return null;
+
+    const directory = resolve(env.NETWORK_ARCHIVE_DIR || join(__dirname, '../network_archives'));
+    const harPath = join(directory, `${basename(testFilePath, '.json')}.har`);
+    if (mode === 'record') {
+        mkdirSync(directory, { recursive: true });
+        // The HAR is written when the context closes.
+        await context.routeFromHAR(harPath, { update: true, updateContent: 'embed', updateMode: 'minimal' });
+        log.log(`    📼 Recording network traffic to ${harPath}`);
+        return harPath;
+    }
+
+    const fallback = (env.NETWORK_ARCHIVE_FALLBACK || 'network').toLowerCase();
+    if (!existsSync(harPath)) {
+        if (fallback === 'abort') throw new Error(`No network archive to replay at ${harPath}`);
+        log.log(`    📼 No network archive at ${harPath} yet; using the live network.`);
+        return null;
+    }
+    await context.routeFromHAR(harPath, { notFound: fallback === 'abort' ? 'abort' : 'fallback' });
+    log.log(`    📼 Replaying network traffic from ${harPath}`);
+    return harPath;
+}
+
+module.exports = { applyNetworkArchive };
@@ -0,0 +1,53 @@
+// src/network-archive.test.js
+// Run with `npm run test:unit`.
+const { test } = require('node:test');
+const assert = require('node:assert');
+const { mkdtempSync, writeFileSync } = require('fs');
+const { tmpdir } = require('os');
+const { join } = require('path');
+const { applyNetworkArchive } = require('./network-archive');
+
+const quiet = { log() {} };
+
+/** A browser context that only records how it was asked to use a HAR file. */
+function harContext() {
+    return {
+        routes: [],
+        async routeFromHAR(path, options) { this.routes.push({ path, options }); },
+    };
+}
+
+test('records each script to its own HAR in the archive directory', async () => {
+    const dir = mkdtempSync(join(tmpdir(), 'archive-'));
+    const context = harContext();
+    const harPath = await applyNetworkArchive(context, 'tests/login.json', quiet,
+        { NETWORK_ARCHIVE_MODE: 'record', NETWORK_ARCHIVE_DIR: dir });
+    assert.strictEqual(harPath, join(dir, 'login.har'));
+    assert.deepStrictEqual(context.routes, [
+        { path: harPath, options: { update: true, updateContent: 'embed', updateMode: 'minimal' } },
+    ]);
+});
+
+test('replays a recorded HAR, sending requests it lacks to the network or aborting them', async () => {
+    const dir = mkdtempSync(join(tmpdir(), 'archive-'));
+    writeFileSync(join(dir, 'login.har'), JSON.stringify({ log: { entries: [] } }));
+    for (const [fallback, notFound] of [[undefined, 'fallback'], ['abort', 'abort']]) {
+        const context = harContext();
+        await applyNetworkArchive(context, 'tests/login.json', quiet,
+            { NETWORK_ARCHIVE_MODE: 'replay', NETWORK_ARCHIVE_DIR: dir, NETWORK_ARCHIVE_FALLBACK: fallback });
+        assert.deepStrictEqual(context.routes, [{ path: join(dir, 'login.har'), options: { notFound } }]);
+    }
+});
+
+test('without a recording, replay uses the live network unless told to abort', async () => {
+    const env = { NETWORK_ARCHIVE_MODE: 'replay', NETWORK_ARCHIVE_DIR: mkdtempSync(join(tmpdir(), 'archive-')) };
+    const context = harContext();
+    assert.strictEqual(await applyNetworkArchive(context, 'tests/search.json', quiet, env), null);
+    assert.deepStrictEqual(context.routes, []);
+    await assert.rejects(
+        applyNetworkArchive(context, 'tests/search.json', quiet, { ...env, NETWORK_ARCHIVE_FALLBACK: 'abort' }),
+        /No network archive to replay/,
+    );
+    await assert.rejects(applyNetworkArchive(context, 'tests/search.json', quiet, { NETWORK_ARCHIVE_MODE: 'replay-all' }));
+    assert.strictEqual(await applyNetworkArchive(context, 'tests/search.json', quiet, {}), null);
+});
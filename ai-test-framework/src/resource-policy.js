@@ -0,0 +1,124 @@
+// src/resource-policy.js
+// Blocks images, fonts, media, ads and analytics while a recorded test runs;
+// the steps only need the DOM. Configured with the same RESOURCE_* variables
+// as agentitest's resource_policy.py. A test script can let some through:
+//   "resourcePolicy": { "allowTypes": ["image"], "allowDomains": ["cdn.example.com"] }
+// Blocking is off unless RESOURCE_BLOCKING is set, so tests see the page as recorded.
+// A blocked request never loads, so it is charged the measured average size and
+// load time of the requests of its type that did load in this process; types
+// not loaded yet are counted as unmeasured.
+
+const DEFAULT_BLOCKED_TYPES = 'image,media,font';
+const DEFAULT_BLOCKED_DOMAINS = 'google-analytics.com,googletagmanager.com,doubleclick.net,googlesyndication.com,'
+    + 'googleadservices.com,facebook.net,hotjar.com,clarity.ms,segment.io,mixpanel.com,nr-data.net,fullstory.com';
+
+const split = (value) => value.split(',').map(item => item.trim().toLowerCase()).filter(Boolean);
+const matchesDomain = (host, domains) => domains.some(domain => host === domain || host.endsWith(`.${domain}`));
+
+// resource type -> { requests, bytes, seconds } of the requests that loaded.
+const loadedResources = new Map();
+
+function observeLoaded(resourceType, bytes, seconds) {
+    const totals = loadedResources.get(resourceType) || { requests: 0, bytes: 0, seconds: 0 };
+    totals.requests++;
+    totals.bytes += bytes;
+    totals.seconds += Math.max(seconds, 0);
+    loadedResources.set(resourceType, totals);
+}
+
+/** Mean { bytes, seconds } of a loaded request of this type, or null if none loaded. */
+function averageLoaded(resourceType) {
+    const totals = loadedResources.get(resourceType);
+    return totals ? { bytes: totals.bytes / totals.requests, seconds: totals.seconds / totals.requests } : null;
+}
+
+async function measureLoaded(request) {
+    if (!/^https?:/.test(request.url())) return; // data: and blob: URLs cost no transfer
+    try {
+        const sizes = await request.sizes();
+        const { responseEnd } = request.timing(); // ms after the request started, -1 if unknown
+        if (responseEnd < 0) return;
+        observeLoaded(request.resourceType(), sizes.responseHeadersSize + sizes.responseBodySize, responseEnd / 1000);
+    } catch (e) {
+        // The page or context closed first.
+    }
+}
+
+/** The policy from the RESOURCE_* variables, or null unless RESOURCE_BLOCKING is on. */
+function policyFromEnv(env = process.env) {
+    if (!['true', '1', 't'].includes((env.RESOURCE_BLOCKING || 'false').toLowerCase())) return null;
+    return {
+        blockedTypes: split(env.RESOURCE_BLOCK_TYPES ?? DEFAULT_BLOCKED_TYPES),
+        blockedDomains: split(env.RESOURCE_BLOCK_DOMAINS ?? DEFAULT_BLOCKED_DOMAINS),
+        allowedDomains: split(env.RESOURCE_ALLOW_DOMAINS ?? ''),
+    };
+}
+
+/** A copy of the policy that also lets a test's `resourcePolicy` allowlist through. */
+function allowing(policy, { allowTypes = [], allowDomains = [] } = {}) {
+    const types = allowTypes.map(t => t.toLowerCase());
+    return {
+        ...policy,
+        blockedTypes: policy.blockedTypes.filter(t => !types.includes(t)),
+        allowedDomains: [...policy.allowedDomains, ...allowDomains.map(d => d.toLowerCase())],
+    };
+}
+
+function blocks(policy, url, resourceType) {
+    let host;
+    try {
+        host = new URL(url).hostname.toLowerCase();
+    } catch (e) {
+        return false;
+    }
+    if (!host || matchesDomain(host, policy.allowedDomains)) return false;
+    return policy.blockedTypes.includes(resourceType) || matchesDomain(host, policy.blockedDomains);
+}
+
+/**
+ * Aborts the requests the policy blocks in every page of `context` and counts them in `stats`:
+ * `blockedRequests`, `blockedByType`, and `blockedBytes` / `blockedSeconds` (request time, at
+ * the measured average of each type) plus `unmeasuredRequests` for types not loaded yet.
+ */
+async function applyResourcePolicy(context, policy, stats = {}) {
+    stats.blockedRequests = 0;
+    stats.blockedByType = {};
+    stats.blockedBytes = 0;
+    stats.blockedSeconds = 0;
+    stats.unmeasuredRequests = 0;
+    if (!policy || (policy.blockedTypes.length === 0 && policy.blockedDomains.length === 0)) return stats;
+
+    context.on('requestfinished', measureLoaded);
+    await context.route('**/*', (route) => {
+        const request = route.request();
+        const resourceType = request.resourceType();
+        if (!blocks(policy, request.url(), resourceType)) {
+            return route.fallback();
+        }
+        stats.blockedRequests++;
+        stats.blockedByType[resourceType] = (stats.blockedByType[resourceType] || 0) + 1;
+        const average = averageLoaded(resourceType);
+        if (average) {
+            stats.blockedBytes += average.bytes;
+            stats.blockedSeconds += average.seconds;
+        } else {
+            stats.unmeasuredRequests++;
+        }
+        return route.abort('blockedbyclient');
+    });
+    return stats;
+}
+
+/** One line describing what was blocked during a run. */
+function describeBlocking(stats) {
+    const kinds = Object.entries(stats.blockedByType || {}).map(([kind, count]) => `${count} ${kind}`).join(', ');
+    let text = `🚫 Blocked ${stats.blockedRequests || 0} request(s) (${kinds || 'none'})`;
+    if ((stats.blockedRequests || 0) > (stats.unmeasuredRequests || 0)) {
+        text += `, about ${Math.round(stats.blockedBytes / 1024)} KB and ${stats.blockedSeconds.toFixed(1)}s`
+            + ' of request time at the measured average of each type';
+    }
+    if (stats.unmeasuredRequests) text += ` (${stats.unmeasuredRequests} of types not measured yet)`;
+    return `${text}.`;
+}
+
+module.exports = { policyFromEnv, allowing, blocks, applyResourcePolicy, describeBlocking, observeLoaded, averageLoaded };
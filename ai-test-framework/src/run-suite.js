@@ -1,39 +1,81 @@
 const { readdirSync } = require('fs');
 const { join, resolve } = require('path');
-const { runTest } = require('./runner'); // Import the runTest function
+const { runTest, launchBrowser } = require('./runner'); // Import the runTest function
+const { scheduleTests, recordResult } = require('./scheduler');
 
-const TESTS_DIR = resolve(__dirname, '../tests');
+const TESTS_DIR = resolve(process.env.TESTS_DIR || join(__dirname, '../tests'));
+
+// Usage: node src/run-suite.js [--workers N] [--max-failures N | --fail-fast] [--order history|given]
+function parseArgs(argv) {
+    const options = { workers: 1, maxFailures: null, order: 'history' };
+    for (let i = 0; i < argv.length; i++) {
+        switch (argv[i]) {
+            case '--workers': options.workers = Math.max(1, parseInt(argv[++i], 10) || 1); break;
+            case '--max-failures': options.maxFailures = parseInt(argv[++i], 10); break;
+            case '--fail-fast': options.maxFailures = 1; break;
+            case '--order': options.order = argv[++i]; break;
+            default: throw new Error(`Unknown option: ${argv[i]}`);
+        }
+    }
+    return options;
+}
 
 (async () => {
     try {
+        const options = parseArgs(process.argv.slice(2));
         console.log(`🔍 Searching for test files in: ${TESTS_DIR}`);
         const allFiles = readdirSync(TESTS_DIR);
-        const testFiles = allFiles.filter(file => file.endsWith('.json'));
+        let testFiles = allFiles.filter(file => file.endsWith('.json'));
 
         if (testFiles.length === 0) {
             console.log('No test files found in the /tests directory.');
             return;
         }
+        if (options.order === 'history') {
+            // Last failures first, then longest first: workers take the next test as they free up.
+            testFiles = scheduleTests(testFiles);
+        }
 
-        console.log(`🚀 Found ${testFiles.length} test(s) to run.`);
+        console.log(`🚀 Found ${testFiles.length} test(s) to run on ${options.workers} worker(s).`);
         console.log('==================================================');
 
+        const queue = [...testFiles];
         let failedTests = 0;
+        let skippedTests = 0;
 
-        for (const testFile of testFiles) {
-            const testFilePath = join(TESTS_DIR, testFile);
-            console.log(`\n▶️  Running test: ${testFile}`);
+        const worker = async () => {
+            const browser = await launchBrowser();
             try {
-                // Call the runTest function directly
-                const success = await runTest(testFilePath);
-                if (!success) throw new Error('Test failed');
-            } catch (error) {
-                failedTests++;
+                while (queue.length > 0) {
+                    const testFile = queue.shift();
+                    if (options.maxFailures != null && failedTests >= options.maxFailures) {
+                        skippedTests++;
+                        continue;
+                    }
+                    const testFilePath = join(TESTS_DIR, testFile);
+                    console.log(`\n▶️  Running test: ${testFile}`);
+                    const start = Date.now();
+                    let success = false;
+                    try {
+                        // Call the runTest function directly
+                        success = await runTest(testFilePath, { browser });
+                    } catch (error) {
+                        console.error(`🛑 ${testFile}: ${error.message}`);
+                    }
+                    if (!success) failedTests++;
+                    recordResult(testFile, success, (Date.now() - start) / 1000);
+                    console.log('==================================================');
+                }
+            } finally {
+                await browser.close();
             }
-            console.log('==================================================');
-        }
+        };
+        await Promise.all(Array.from({ length: Math.min(options.workers, testFiles.length) }, worker));
 
-        console.log(failedTests > 0 ? `\n🛑 Finished suite. ${failedTests} of ${testFiles.length} tests failed.` : `\n🎉 All ${testFiles.length} tests passed!`);
+        const skippedNote = skippedTests > 0 ? ` ${skippedTests} skipped after ${failedTests} failure(s).` : '';
+        console.log(failedTests > 0
+            ? `\n🛑 Finished suite. ${failedTests} of ${testFiles.length} tests failed.${skippedNote}`
+            : `\n🎉 All ${testFiles.length} tests passed!`);
         process.exit(failedTests > 0 ? 1 : 0);
     } catch (error) {
         console.error('An unexpected error occurred while running the test suite:', error);
@@ -1,11 +1,15 @@
 // src/runner.js
 const { chromium, expect } = require('playwright/test');
-const { readFileSync, writeFileSync } = require('fs');
+const { readFileSync } = require('fs');
 const { join } = require('path');
 const { recoverStep } = require('./recovery-agent');
-const VISUAL_DELAY = 500; // Delay in ms to make execution visible
-async function executeStep(page, step) {
-    console.log(`  ▶️ Executing: ${step.stepName}`);
+const { lookupHealedStep, persistHealedStep } = require('./healing-client');
+const { policyFromEnv, allowing, applyResourcePolicy, describeBlocking } = require('./resource-policy');
+const { applyNetworkArchive } = require('./network-archive');
+// Delay in ms to make execution visible; RUNNER_VISUAL_DELAY_MS=0 runs at full speed.
+const VISUAL_DELAY = parseInt(process.env.RUNNER_VISUAL_DELAY_MS || '500', 10);
+async function executeStep(page, step, log = console) {
+    log.log(`  ▶️ Executing: ${step.stepName}`);
     const timeout = 5000; // 5 second timeout per step
 
     switch (step.action) {
@@ -22,7 +26,7 @@ async function executeStep(page, step) {
             await page.locator(step.selector).press(step.value, { timeout });
             break;
         case 'wait':
-            console.log(`    ...waiting for ${step.value}ms`);
+            log.log(`    ...waiting for ${step.value}ms`);
             await page.waitForTimeout(parseInt(step.value, 10));
             break;
         case 'expect':
@@ -37,57 +41,107 @@ async function executeStep(page, step) {
     }
 }
 
-async function runTest(testFilePath) {
+function launchBrowser() {
+    return chromium.launch({ 
+        headless: ['true', '1', 't'].includes((process.env.HEADLESS || 'false').toLowerCase()),
+        slowMo: VISUAL_DELAY, // Adds a delay before each Playwright action
+    });
+}
+
+/**
+ * Runs one JSON test file.
+ * @param {string} testFilePath Path to the test JSON file.
+ * @param {object} [options]
+ * @param {import('playwright').Browser} [options.browser] A shared browser. The test then runs in
+ *     a fresh context of it, which is closed afterwards; otherwise a browser is launched and closed.
+ * @param {Console} [options.log] Where progress messages go (defaults to the console).
+ * @param {object} [options.stats] Filled in with `steps` (steps executed), `llmCallsMs`
+ *     (duration of each self-healing LLM call) and the resource-blocking counts from
+ *     resource-policy.js (`blockedRequests`, `blockedByType`, `blockedBytes`, `blockedSeconds`,
+ *     `unmeasuredRequests`) for the caller's metrics.
+ * @returns {Promise<boolean>} Whether every step passed.
+ */
+async function runTest(testFilePath, { browser: sharedBrowser, log = console, stats = {} } = {}) {
+    stats.steps = 0;
+    stats.llmCallsMs = [];
     let browser;
+    let context;
     try {
-        browser = await chromium.launch({ 
-            headless: false,
-            slowMo: VISUAL_DELAY, // Adds a delay before each Playwright action
-        });
-        const page = await browser.newPage();
+        if (sharedBrowser) {
+            context = await sharedBrowser.newContext();
+        } else {
+            browser = await launchBrowser();
+            context = await browser.newContext();
+        }
         const testData = JSON.parse(readFileSync(testFilePath, 'utf-8'));
+        // Record or replay the test's traffic (NETWORK_ARCHIVE_MODE); blocked requests never reach it.
+        await applyNetworkArchive(context, testFilePath, log);
+        // Images, fonts, media and trackers are blocked unless the script allows them.
+        const policy = policyFromEnv();
+        await applyResourcePolicy(context, policy && allowing(policy, testData.resourcePolicy), stats);
+        const page = await context.newPage();
         const testSteps = testData.steps || []; // Handle cases where steps might be missing
         let testFailed = false;
 
         for (let i = 0; i < testSteps.length; i++) {
             let step = testSteps[i];
-            
+            stats.steps++;
+
             try {
-                await executeStep(page, step);
+                await executeStep(page, step, log);
                 await page.waitForTimeout(VISUAL_DELAY / 2); // Wait after the step to see the result
-                console.log('    ✅ Success\n');
+                log.log('    ✅ Success\n');
             } catch (error) {
-                console.warn(`    ⚠️ Step failed: ${error.message.split('\n')[0]}`);
-                console.log('    🤔 Attempting self-healing recovery...');
+                log.warn(`    ⚠️ Step failed: ${error.message.split('\n')[0]}`);
+                log.log('    🤔 Attempting self-healing recovery...');
+
+                const pageUrl = page.url();
+                let healed = false;
+                // A selector another run already healed is tried first; the LLM only if that misses or fails.
+                for (const source of ['cache', 'llm']) {
+                    let recoveredStep;
+                    if (source === 'cache') {
+                        recoveredStep = await lookupHealedStep(pageUrl, step);
+                    } else {
+                        const recoveryStart = Date.now();
+                        recoveredStep = await recoverStep(page, step, testSteps.slice(0, i));
+                        stats.llmCallsMs.push(Date.now() - recoveryStart);
+                    }
+                    if (!recoveredStep) continue;
 
-                const recoveredStep = await recoverStep(page, step, testSteps.slice(0, i));
-                
-                if (recoveredStep) {
-                    console.log(`    ✨ Recovery successful! New selector: "${recoveredStep.selector}"`);
+                    log.log(source === 'cache'
+                        ? `    ♻️ Reusing healed selector: "${recoveredStep.selector}"`
+                        : `    ✨ Recovery successful! New selector: "${recoveredStep.selector}"`);
                     try {
-                        await executeStep(page, recoveredStep); // Retry with the new step
+                        await executeStep(page, recoveredStep, log); // Retry with the new step
                         await page.waitForTimeout(VISUAL_DELAY / 2); // Wait after the step to see the result
-                        console.log('    ✅ Success on retry!\n');
-                        // Persist the fix for future runs
-                        testSteps[i] = recoveredStep;
-                        writeFileSync(testFilePath, JSON.stringify(testData, null, 2));
+                        log.log('    ✅ Success on retry!\n');
                     } catch (retryError) {
-                        console.error(`    ❌ Recovery attempt failed: ${retryError.message.split('\n')[0]}`);
-                        testFailed = true;
-                        break;
+                        log.error(`    ❌ Recovery attempt failed: ${retryError.message.split('\n')[0]}`);
+                        continue;
                     }
-                } else {
-                    console.error('    ❌ Recovery failed. Could not find a new selector. Aborting.');
+                    // Persist the fix for future runs
+                    testSteps[i] = recoveredStep;
+                    await persistHealedStep(testFilePath, i, pageUrl, step, recoveredStep, log);
+                    healed = true;
+                    break;
+                }
+
+                if (!healed) {
+                    log.error('    ❌ Recovery failed. Could not find a working selector. Aborting.');
                     testFailed = true;
                     break;
                 }
             }
         }
 
-        console.log(testFailed ? '🛑 Test finished with errors.' : '🎉 Test completed successfully!');
-        if (testFailed) process.exit(1);
+        if (stats.blockedRequests > 0) log.log(describeBlocking(stats));
+        log.log(testFailed ? '🛑 Test finished with errors.' : '🎉 Test completed successfully!');
         return !testFailed; // Return success status
     } finally {
+        if (context) {
+            await context.close().catch(() => {});
+        }
         if (browser) {
             await browser.close();
         }
@@ -103,8 +157,9 @@ if (require.main === module) {
             console.log('Usage: node src/runner.js <path/to/your/test.json>');
             process.exit(1);
         }
-        await runTest(testFilePath);
+        const success = await runTest(testFilePath);
+        if (!success) process.exit(1);
     })();
 }
 
-module.exports = { runTest };
+module.exports = { runTest, launchBrowser };
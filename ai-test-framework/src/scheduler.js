@@ -0,0 +1,61 @@
+// src/scheduler.js
+// Orders suite runs from past results: tests whose last run failed go first,
+// then the rest longest-first, so parallel workers finish together.
+// Shares .cache/history.json (and its format) with run_history.py.
+const { readFileSync, writeFileSync, renameSync, mkdirSync } = require('fs');
+const { dirname, join, resolve } = require('path');
+
+const HISTORY_FILE = resolve(__dirname, '../.cache/history.json');
+const RECENT_RUNS = 10; // Outcomes kept per test for its failure rate
+const DEFAULT_DURATION_SECONDS = 30; // Assumed for tests that never ran
+
+function loadHistory(historyFile = HISTORY_FILE) {
+    try {
+        return JSON.parse(readFileSync(historyFile, 'utf-8')).tests || {};
+    } catch (e) {
+        return {};
+    }
+}
+
+/** Orders test file names: last run failed first (highest failure rate first), then longest first. */
+function scheduleTests(testFiles, history = loadHistory()) {
+    const known = Object.values(history).map(e => e.avg_duration_seconds).filter(Boolean);
+    const unknownDuration = known.length ? known.reduce((a, b) => a + b, 0) / known.length : DEFAULT_DURATION_SECONDS;
+
+    const rank = (test) => {
+        const entry = history[test] || {};
+        const recent = entry.recent || [];
+        const lastFailed = recent.length > 0 && recent[recent.length - 1] === 'failed';
+        const failureRate = recent.length ? recent.filter(r => r === 'failed').length / recent.length : 0;
+        return { lastFailed, failureRate, duration: entry.avg_duration_seconds || unknownDuration };
+    };
+    const ranks = new Map(testFiles.map(test => [test, rank(test)]));
+    return [...testFiles].sort((a, b) => {
+        const ra = ranks.get(a);
+        const rb = ranks.get(b);
+        if (ra.lastFailed !== rb.lastFailed) return ra.lastFailed ? -1 : 1;
+        if (ra.lastFailed && ra.failureRate !== rb.failureRate) return rb.failureRate - ra.failureRate;
+        return rb.duration - ra.duration;
+    });
+}
+
+/** Adds one run to the history file. Re-reads it first, since the recorder server writes it too. */
+function recordResult(test, passed, durationSeconds, historyFile = HISTORY_FILE) {
+    const tests = loadHistory(historyFile);
+    const entry = tests[test] || { runs: 0, failures: 0, avg_duration_seconds: null, recent: [] };
+    entry.runs += 1;
+    entry.failures += passed ? 0 : 1;
+    const previous = entry.avg_duration_seconds;
+    entry.avg_duration_seconds = previous == null ? durationSeconds : 0.7 * previous + 0.3 * durationSeconds;
+    entry.last_duration_seconds = durationSeconds;
+    entry.recent = [...(entry.recent || []), passed ? 'passed' : 'failed'].slice(-RECENT_RUNS);
+    entry.last_run_at = Date.now() / 1000;
+    tests[test] = entry;
+
+    mkdirSync(dirname(historyFile), { recursive: true });
+    const tmpPath = join(dirname(historyFile), `.tmp-${process.pid}-history.json`);
+    writeFileSync(tmpPath, JSON.stringify({ tests }, null, 2));
+    renameSync(tmpPath, historyFile);
+}
+
+module.exports = { scheduleTests, recordResult, loadHistory, HISTORY_FILE };
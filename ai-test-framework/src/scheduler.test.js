@@ -0,0 +1,48 @@
+// src/scheduler.test.js
+// Run with `npm run test:unit`.
+const { test } = require('node:test');
+const assert = require('node:assert');
+const { mkdtempSync } = require('fs');
+const { tmpdir } = require('os');
+const { join } = require('path');
+const { scheduleTests, recordResult, loadHistory } = require('./scheduler');
+
+const tempHistory = () => join(mkdtempSync(join(tmpdir(), 'scheduler-')), 'history.json');
+
+test('puts last failures first, then the longest tests', () => {
+    const history = {
+        'short.json': { avg_duration_seconds: 5, recent: ['passed'] },
+        'long.json': { avg_duration_seconds: 50, recent: ['passed'] },
+        'flaky.json': { avg_duration_seconds: 1, recent: ['passed', 'failed'] },
+        'broken.json': { avg_duration_seconds: 1, recent: ['failed'] },
+        'recovered.json': { avg_duration_seconds: 1, recent: ['failed', 'passed'] },
+    };
+    const order = scheduleTests(['short.json', 'recovered.json', 'flaky.json', 'long.json', 'broken.json', 'new.json'], history);
+    // new.json is assumed to take the average duration (~12s).
+    assert.deepStrictEqual(order, ['broken.json', 'flaky.json', 'long.json', 'new.json', 'short.json', 'recovered.json']);
+});
+
+test('keeps the given order without history', () => {
+    assert.deepStrictEqual(scheduleTests(['b.json', 'a.json'], {}), ['b.json', 'a.json']);
+});
+
+test('records runs in the format run_history.py reads', () => {
+    const historyFile = tempHistory();
+    recordResult('a.json', true, 10, historyFile);
+    recordResult('a.json', false, 20, historyFile);
+    const entry = loadHistory(historyFile)['a.json'];
+    assert.strictEqual(entry.runs, 2);
+    assert.strictEqual(entry.failures, 1);
+    assert.strictEqual(entry.avg_duration_seconds, 13);
+    assert.deepStrictEqual(entry.recent, ['passed', 'failed']);
+});
+
+test('keeps only the recent outcomes', () => {
+    const historyFile = tempHistory();
+    for (let i = 0; i < 12; i++) recordResult('a.json', true, 1, historyFile);
+    assert.strictEqual(loadHistory(historyFile)['a.json'].recent.length, 10);
+});
+
+test('treats a missing history file as empty', () => {
+    assert.deepStrictEqual(loadHistory(tempHistory()), {});
+});
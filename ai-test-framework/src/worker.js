@@ -0,0 +1,70 @@
+// src/worker.js
+// Long-lived test runner. Keeps one browser open and runs each requested test
+// in a fresh browser context, so a test only pays for context creation.
+//
+// Protocol: one JSON object per line.
+//   stdin:  {"id": "<request id>", "file": "<path/to/test.json>"}
+//   stdout: {"id": "<request id>", "passed": true|false, "durationMs": 1234, "logs": "...", "error": null,
+//            "stats": {"steps": 5, "llmCallsMs": [850]}, "openPages": 0}
+// Anything else the worker prints goes to stderr, so stdout only carries replies.
+const { createInterface } = require('readline');
+const { format } = require('util');
+const { runTest, launchBrowser } = require('./runner');
+
+// Keep stray console.log calls (ours or a library's) off the protocol channel.
+console.log = (...args) => process.stderr.write(format(...args) + '\n');
+
+let browser = null;
+
+async function getBrowser() {
+    if (!browser || !browser.isConnected()) {
+        browser = await launchBrowser();
+    }
+    return browser;
+}
+
+function createLogCollector() {
+    const lines = [];
+    const collect = (...args) => lines.push(format(...args));
+    return { log: { log: collect, warn: collect, error: collect, info: collect }, lines };
+}
+
+async function handleRequest(request) {
+    const { log, lines } = createLogCollector();
+    const start = Date.now();
+    let passed = false;
+    let error = null;
+    const stats = {};
+    try {
+        passed = await runTest(request.file, { browser: await getBrowser(), log, stats });
+    } catch (e) {
+        error = e.message;
+        lines.push(`🛑 Runner error: ${e.message}`);
+    }
+    // Pages left open after the test's context closed point at a leak; the pool recycles the worker.
+    const openPages = browser ? browser.contexts().reduce((count, context) => count + context.pages().length, 0) : 0;
+    return { id: request.id, passed, durationMs: Date.now() - start, logs: lines.join('\n'), error, stats, openPages };
+}
+
+async function main() {
+    const input = createInterface({ input: process.stdin, crlfDelay: Infinity });
+    // Requests are handled one at a time; run several workers for parallelism.
+    for await (const line of input) {
+        if (!line.trim()) continue;
+        let request;
+        try {
+            request = JSON.parse(line);
+        } catch (e) {
+            console.error(`Ignoring malformed request: ${line}`);
+            continue;
+        }
+        const reply = await handleRequest(request);
+        process.stdout.write(JSON.stringify(reply) + '\n');
+    }
+    if (browser) await browser.close();
+}
+
+main().catch((e) => {
+    console.error('Worker crashed:', e);
+    process.exit(1);
+});
@@ -0,0 +1,81 @@
+import json
+
+from healing_cache import HealingCache, apply_to_scripts, origin, script_origin
+
+
+def write_script(folder, name, steps):
+    path = folder / name
+    path.write_text(json.dumps({"name": name, "steps": steps}))
+    return path
+
+
+def selectors(path):
+    return [step.get("selector") for step in json.loads(path.read_text())["steps"]]
+
+
+def test_cache_persists_heals(tmp_path):
+    path = tmp_path / "healing.json"
+    cache = HealingCache(str(path))
+    with cache.lock:
+        cache.record("https://a.test/login", "Submit", "#old", "#new")
+
+    reloaded = HealingCache(str(path))
+    assert reloaded.lookup("https://a.test/login", "Submit", "#old")["newSelector"] == "#new"
+    assert reloaded.lookup("https://a.test/login", "Other step", "#old") is None
+
+
+def test_cache_ignores_unreadable_file(tmp_path):
+    path = tmp_path / "healing.json"
+    path.write_text("{not json")
+    assert HealingCache(str(path)).lookup(None, None, "#old") is None
+
+
+def test_origin():
+    assert origin("HTTPS://A.test:8080/path?q=1") == "https://a.test:8080"
+    assert origin("about:blank") is None
+    assert origin(None) is None
+    assert script_origin({"steps": [{"action": "click"}, {"url": "https://a.test/x"}]}) == "https://a.test"
+
+
+def test_apply_rewrites_same_step_on_same_site(tmp_path):
+    same = write_script(tmp_path, "same.json", [
+        {"action": "goto", "url": "https://a.test/"},
+        {"stepName": "Submit", "selector": "#old"},
+        {"stepName": "Search", "selector": "#old"},
+    ])
+    other_site = write_script(tmp_path, "other-site.json", [
+        {"action": "goto", "url": "https://b.test/"},
+        {"stepName": "Submit", "selector": "#old"},
+    ])
+
+    updated = apply_to_scripts(str(tmp_path), "https://a.test/login", "Submit", "#old", "#new")
+
+    assert updated == [str(same.resolve())]
+    assert selectors(same) == [None, "#new", "#old"]
+    assert selectors(other_site) == [None, "#old"]
+
+
+def test_apply_prefers_the_step_url_over_the_script_origin(tmp_path):
+    script = write_script(tmp_path, "cross.json", [
+        {"action": "goto", "url": "https://b.test/"},
+        {"stepName": "Submit", "selector": "#old", "url": "https://a.test/login"},
+    ])
+    apply_to_scripts(str(tmp_path), "https://a.test/other", "Submit", "#old", "#new")
+    assert selectors(script) == [None, "#new"]
+
+
+def test_apply_needs_url_and_step_name(tmp_path):
+    script = write_script(tmp_path, "s.json", [
+        {"action": "goto", "url": "https://a.test/"},
+        {"stepName": "Submit", "selector": "#old"},
+    ])
+    assert apply_to_scripts(str(tmp_path), None, "Submit", "#old", "#new") == []
+    assert apply_to_scripts(str(tmp_path), "https://a.test/", None, "#old", "#new") == []
+    assert selectors(script) == [None, "#old"]
+
+
+def test_apply_skips_unreadable_scripts(tmp_path):
+    (tmp_path / "broken.json").write_text("{")
+    (tmp_path / "notes.txt").write_text("not a script")
+    assert apply_to_scripts(str(tmp_path), "https://a.test/", "Submit", "#old", "#new") == []
+    assert apply_to_scripts(str(tmp_path / "missing"), "https://a.test/", "Submit", "#old", "#new") == []
@@ -0,0 +1,61 @@
+from run_history import FailureBudget, RunHistory
+
+
+def test_record_keeps_average_and_recent_outcomes(tmp_path):
+    history = RunHistory(str(tmp_path / "history.json"))
+    history.record("a.json", True, 10.0)
+    history.record("a.json", False, 20.0)
+
+    entry = history._load()["a.json"]
+    assert (entry["runs"], entry["failures"]) == (2, 1)
+    assert entry["avg_duration_seconds"] == 13.0
+    assert entry["last_duration_seconds"] == 20.0
+    assert entry["recent"] == ["passed", "failed"]
+
+
+def test_record_keeps_only_recent_runs(tmp_path):
+    history = RunHistory(str(tmp_path / "history.json"))
+    for _ in range(12):
+        history.record("a.json", True, 1.0)
+    assert len(history._load()["a.json"]["recent"]) == 10
+
+
+def test_order_puts_last_failures_first_then_longest(tmp_path):
+    history = RunHistory(str(tmp_path / "history.json"))
+    history.record("short.json", True, 5.0)
+    history.record("long.json", True, 50.0)
+    history.record("flaky.json", True, 1.0)
+    history.record("flaky.json", False, 1.0)
+    history.record("broken.json", False, 1.0)
+    history.record("recovered.json", False, 1.0)
+    history.record("recovered.json", True, 1.0)
+
+    order = history.order(["short.json", "recovered.json", "flaky.json", "long.json", "broken.json", "new.json"])
+
+    # Failure rate orders the failures; new.json is assumed to take the average (~12s).
+    assert order == ["broken.json", "flaky.json", "long.json", "new.json", "short.json", "recovered.json"]
+
+
+def test_order_without_history_keeps_given_order(tmp_path):
+    history = RunHistory(str(tmp_path / "missing" / "history.json"))
+    assert history.order(["b.json", "a.json"]) == ["b.json", "a.json"]
+
+
+def test_unreadable_history_is_ignored(tmp_path):
+    path = tmp_path / "history.json"
+    path.write_text("{")
+    assert RunHistory(str(path)).order(["a.json"]) == ["a.json"]
+
+
+def test_failure_budget():
+    unlimited = FailureBudget(None)
+    for _ in range(5):
+        unlimited.record(False)
+    assert not unlimited.exhausted
+
+    budget = FailureBudget(2)
+    budget.record(False)
+    budget.record(True)
+    assert not budget.exhausted
+    budget.record(False)
+    assert budget.exhausted
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+import script_catalog
+from script_catalog import ScriptCatalog
+
+
+def write_script(folder, filename, steps, name=None):
+    script = {"steps": steps}
+    if name:
+        script["name"] = name
+    (folder / filename).write_text(json.dumps(script))
+
+
+@pytest.fixture
+def tests_folder(tmp_path):
+    folder = tmp_path / "tests"
+    folder.mkdir()
+    write_script(folder, "login.json", [
+        {"action": "goto", "value": "https://app.example.com/login"},
+        {"action": "click", "selector": "#submit"},
+    ], name="Login")
+    write_script(folder, "search.json", [
+        {"action": "goto", "value": "https://search.test/"},
+        {"action": "fill", "selector": "#q", "url": "https://search.test/"},
+        {"action": "click", "selector": "#go"},
+    ])
+    return folder
+
+
+@pytest.fixture
+def catalog(tmp_path, tests_folder, monkeypatch):
+    # Rescan on every call; tests write files faster than the folder mtime may tick.
+    monkeypatch.setattr(script_catalog, "RESCAN_SECONDS", 0)
+    return ScriptCatalog(str(tests_folder), str(tmp_path / "catalog.json"))
+
+
+def test_indexes_scripts(catalog):
+    entries = catalog.refresh()
+    assert entries["login.json"]["name"] == "Login"
+    assert entries["login.json"]["domains"] == ["app.example.com"]
+    assert entries["search.json"]["name"] == "search"
+    assert entries["search.json"]["steps"] == 3
+
+
+def test_parses_only_changed_scripts(catalog, tests_folder, monkeypatch):
+    catalog.refresh()
+    indexed = []
+    index = catalog._index
+    monkeypatch.setattr(catalog, "_index", lambda filename, *args: indexed.append(filename) or index(filename, *args))
+
+    catalog.refresh()
+    assert indexed == []
+
+    write_script(tests_folder, "search.json", [{"action": "goto", "value": "https://search.test/"}])
+    (tests_folder / "login.json").unlink()
+    entries = catalog.refresh()
+    assert indexed == ["search.json"]
+    assert entries["search.json"]["steps"] == 1
+    assert "login.json" not in entries
+
+
+def test_keeps_results_across_edits_and_restarts(catalog, tests_folder, tmp_path):
+    catalog.record_result("login.json", "passed", 4.5)
+    write_script(tests_folder, "login.json", [{"action": "goto", "value": "https://app.example.com/"}])
+
+    reloaded = ScriptCatalog(str(tests_folder), str(tmp_path / "catalog.json"))
+    entry = reloaded.refresh()["login.json"]
+    assert entry["steps"] == 1
+    assert (entry["last_status"], entry["last_duration_seconds"]) == ("passed", 4.5)
+
+
+def test_ignores_catalog_of_another_folder(catalog, tests_folder, tmp_path):
+    catalog.record_result("login.json", "failed", 1.0)
+    other = tmp_path / "other"
+    other.mkdir()
+    write_script(other, "login.json", [])
+    entry = ScriptCatalog(str(other), str(tmp_path / "catalog.json")).refresh()["login.json"]
+    assert entry["last_status"] is None
+
+
+def test_skips_unreadable_and_hidden_files(catalog, tests_folder):
+    (tests_folder / "broken.json").write_text("{")
+    (tests_folder / ".draft.json").write_text("{}")
+    entries = catalog.refresh()
+    assert entries["broken.json"]["steps"] == 0
+    assert ".draft.json" not in entries
+
+
+def test_missing_folder_is_empty(tmp_path):
+    assert ScriptCatalog(str(tmp_path / "missing"), str(tmp_path / "catalog.json")).refresh() == {}
+
+
+def test_query_filters_sorts_and_pages(catalog):
+    catalog.record_result("search.json", "failed", 9.0)
+
+    entries, total = catalog.query(domain="example.com")
+    assert total == 1 and entries[0]["file"] == "login.json"
+
+    entries, total = catalog.query(status="never")
+    assert [e["file"] for e in entries] == ["login.json"]
+
+    entries, total = catalog.query(sort="-steps", page=2, page_size=1)
+    assert total == 2 and [e["file"] for e in entries] == ["login.json"]
+
+    entries, _ = catalog.query(sort="-duration")
+    assert entries[0]["file"] == "search.json"